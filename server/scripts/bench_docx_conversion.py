@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+DOCX正文转换的规模基准
+- 生成指定段落数的合成文档（每20段一个标题，每50段一个3x4表格，段落含粗体/斜体），保存后重新打开
+- 分别计时 docx_to_html / docx_to_markdown 的正文遍历（convert_body，不含图片提取和写文件）
+- 每段耗时（µs）在各规模下应大致不变，即耗时随段落数线性增长
+- 原有的逐个扫描 doc.paragraphs / doc.tables 查找元素的方式为 O(n²)，
+  只在不超过 --legacy-max 段（默认1000）的文档上计时作对比
+
+用法:
+    python3 bench_docx_conversion.py [--sizes=1000,5000,20000] [--legacy-max=N] [--json]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+from docx import Document
+from script_args import split_args, int_option
+import docx_to_html
+import docx_to_markdown
+
+DEFAULT_SIZES = (1000, 5000, 20000)
+DEFAULT_LEGACY_MAX = 1000
+
+HEADING_EVERY = 20
+TABLE_EVERY = 50
+
+
+def build_document(paragraphs, path):
+    """生成合成文档并保存"""
+    doc = Document()
+    for i in range(paragraphs):
+        if i % HEADING_EVERY == 0:
+            doc.add_heading(f"{i // HEADING_EVERY + 1} 章节标题 {i}", level=2)
+            continue
+        para = doc.add_paragraph(f"第 {i} 段正文，用于测试转换速度。")
+        para.add_run(" 粗体文字").bold = True
+        para.add_run(" 斜体文字").italic = True
+        if i % TABLE_EVERY == 0:
+            table = doc.add_table(rows=3, cols=4)
+            for row_idx, row in enumerate(table.rows):
+                for col_idx, cell in enumerate(row.cells):
+                    cell.text = f"R{row_idx}C{col_idx}"
+    doc.save(path)
+
+
+def legacy_body_lookups(doc):
+    """原有的元素查找：每个正文元素都重新扫描 doc.paragraphs / doc.tables"""
+    found = 0
+    for element in doc.element.body:
+        if element.tag.endswith('p'):
+            for p in doc.paragraphs:
+                if p._element == element:
+                    found += 1
+                    break
+        elif element.tag.endswith('tbl'):
+            for t in doc.tables:
+                if t._element == element:
+                    found += 1
+                    break
+    return found
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - started) * 1000
+
+
+def run_benchmark(sizes, legacy_max=DEFAULT_LEGACY_MAX):
+    """
+    Returns:
+        [{'paragraphs', 'html_ms', 'markdown_ms', 'html_us_per_para', 'markdown_us_per_para', 'legacy_lookup_ms'}]
+    """
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            path = os.path.join(tmp_dir, f'bench_{size}.docx')
+            build_document(size, path)
+            doc = Document(path)
+
+            html_ms = timed(docx_to_html.convert_body, doc, {}.get)
+            markdown_ms = timed(docx_to_markdown.convert_body, doc, {}.get)
+            legacy_ms = timed(legacy_body_lookups, doc) if size <= legacy_max else None
+
+            results.append({
+                'paragraphs': size,
+                'html_ms': round(html_ms, 1),
+                'markdown_ms': round(markdown_ms, 1),
+                'html_us_per_para': round(html_ms * 1000 / size, 1),
+                'markdown_us_per_para': round(markdown_ms * 1000 / size, 1),
+                'legacy_lookup_ms': round(legacy_ms, 1) if legacy_ms is not None else None,
+            })
+            print(f"      {size} 段完成", file=sys.stderr)
+
+    return results
+
+
+def print_report(results):
+    print(f"{'段落数':>8}{'HTML(ms)':>12}{'µs/段':>10}{'Markdown(ms)':>14}{'µs/段':>10}{'原查找(ms)':>14}")
+    for r in results:
+        legacy = f"{r['legacy_lookup_ms']:.1f}" if r['legacy_lookup_ms'] is not None else '跳过'
+        print(f"{r['paragraphs']:>8}{r['html_ms']:>12.1f}{r['html_us_per_para']:>10.1f}"
+              f"{r['markdown_ms']:>14.1f}{r['markdown_us_per_para']:>10.1f}{legacy:>14}")
+
+
+def main():
+    args, options = split_args(sys.argv[1:])
+
+    sizes = DEFAULT_SIZES
+    if options.get('sizes') and options['sizes'] is not True:
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            print("Usage: python3 bench_docx_conversion.py [--sizes=1000,5000,20000] [--legacy-max=N] [--json]")
+            sys.exit(1)
+
+    results = run_benchmark(sizes, int_option(options, 'legacy-max', DEFAULT_LEGACY_MAX))
+
+    if options.get('json'):
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
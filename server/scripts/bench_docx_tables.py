@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+DOCX表格渲染基准
+- 对比原来逐行遍历 python-docx row.cells 的渲染与直接读取 w:tc / gridSpan / vMerge 的渲染（docx_stream.read_table）
+- 分别计时 HTML / Markdown 两种输出，统计原方式重复输出的合并单元格数
+- 不指定文档时生成合成的规格表文档：首行合并表头，首列每5行纵向合并一组，每10行一行跨两列的说明，
+  部分分组末行以 gridBefore 空出首列（同维修手册中的大型规格表）
+- 指定文档（如维修手册）时对其中的全部正文表格计时
+
+用法:
+    python3 bench_docx_tables.py [manual.docx ...] [--tables=20] [--rows=300] [--cols=8] [--json]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+from html import escape
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.table import CT_Tbl
+from docx.table import Table
+from script_args import split_args, int_option
+from docx_stream import read_table
+import docx_to_html
+import docx_to_markdown
+
+DEFAULT_TABLES = 20
+DEFAULT_ROWS = 300
+DEFAULT_COLS = 8
+
+GROUP_ROWS = 5
+NOTE_EVERY = 10
+GRID_BEFORE_EVERY = 7
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def _tc(text, span=1, v_merge=None, bold=False):
+    props = ''
+    if span > 1:
+        props += f'<w:gridSpan w:val="{span}"/>'
+    if v_merge:
+        props += f'<w:vMerge w:val="{v_merge}"/>' if v_merge == 'restart' else '<w:vMerge/>'
+    run_props = '<w:rPr><w:b/></w:rPr>' if bold else ''
+    return (f'<w:tc><w:tcPr>{props}</w:tcPr>'
+            f'<w:p><w:r>{run_props}<w:t>{escape(text)}</w:t></w:r></w:p></w:tc>')
+
+
+def spec_table_xml(index, rows, cols):
+    """一个合成规格表的 w:tbl"""
+    grid = ''.join('<w:gridCol w:w="1000"/>' for _ in range(cols))
+    trs = ['<w:tr>' + _tc(f'规格表 {index}', span=cols - 1, bold=True) + _tc('备注', bold=True) + '</w:tr>']
+    for r in range(1, rows):
+        # 分组从第1行开始，每 GROUP_ROWS 行一组
+        group_merge = 'restart' if (r - 1) % GROUP_ROWS == 0 else 'continue'
+        if r % NOTE_EVERY == 0:
+            cells = _tc(f'分组 {(r - 1) // GROUP_ROWS + 1}', v_merge=group_merge)
+            cells += _tc(f'说明 {r}：本行跨两列', span=2)
+            cells += ''.join(_tc(f'{r}-{c}') for c in range(3, cols))
+            trs.append(f'<w:tr>{cells}</w:tr>')
+        elif r % GRID_BEFORE_EVERY == 0 and r % GROUP_ROWS == 0:
+            # 放在分组的最后一行，下一行重新开始纵向合并（python-docx 找不到上方单元格时会报错）
+            trs.append('<w:tr><w:trPr><w:gridBefore w:val="1"/></w:trPr>'
+                       + ''.join(_tc(f'{r}-{c}') for c in range(1, cols)) + '</w:tr>')
+        else:
+            first = _tc(f'分组 {(r - 1) // GROUP_ROWS + 1}', v_merge=group_merge)
+            trs.append('<w:tr>' + first + ''.join(_tc(f'参数 {r}-{c} mm') for c in range(1, cols)) + '</w:tr>')
+    return (f'<w:tbl xmlns:w="{W_NS}"><w:tblPr/><w:tblGrid>{grid}</w:tblGrid>'
+            + ''.join(trs) + '</w:tbl>')
+
+
+def build_document(tables, rows, cols, path):
+    """生成合成规格表文档并保存"""
+    doc = Document()
+    for index in range(tables):
+        doc.add_heading(f'{index + 1} 技术规格', level=2)
+        doc.element.body.insert(len(doc.element.body) - 1, parse_xml(spec_table_xml(index + 1, rows, cols)))
+        doc.add_paragraph('')
+    doc.save(path)
+
+
+def legacy_table_to_html(table):
+    """原来的HTML渲染：逐行遍历 row.cells，合并单元格按跨越的网格数重复输出"""
+    if not table.rows:
+        return ''
+    html_lines = ['<table class="wiki-table">']
+    for row_idx, row in enumerate(table.rows):
+        html_lines.append('  <tr>')
+        for cell in row.cells:
+            cell_content = ''
+            for para in cell.paragraphs:
+                para_text = ''
+                for run in para.runs:
+                    para_text += docx_to_html.process_run_formatting(run)
+                if para_text.strip():
+                    cell_content += para_text + '<br>'
+            cell_content = cell_content.rstrip('<br>')
+            tag = 'th' if row_idx == 0 else 'td'
+            html_lines.append(f'    <{tag}>{cell_content}</{tag}>')
+        html_lines.append('  </tr>')
+    html_lines.append('</table>')
+    return '\n'.join(html_lines)
+
+
+def legacy_table_to_markdown(table):
+    """原来的Markdown渲染：逐行遍历 row.cells"""
+    if not table.rows:
+        return ''
+    rows_data = [[cell.text.strip().replace('\n', ' ') for cell in row.cells] for row in table.rows]
+    max_cols = max(len(row) for row in rows_data)
+    for row in rows_data:
+        row.extend([''] * (max_cols - len(row)))
+    md_lines = ['| ' + ' | '.join(rows_data[0]) + ' |',
+                '| ' + ' | '.join(['---'] * max_cols) + ' |']
+    md_lines.extend('| ' + ' | '.join(row) + ' |' for row in rows_data[1:])
+    return '\n'.join(md_lines)
+
+
+def timed(func, items):
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - started) * 1000
+
+
+def bench_document(path):
+    """
+    Returns:
+        {'document', 'tables', 'rows', 'tc', 'legacy_cells', 'grid_cells', 'legacy_html_ms', 'html_ms',
+         'legacy_markdown_ms', 'markdown_ms'}
+    """
+    doc = Document(path)
+    elements = [element for element in doc.element.body if isinstance(element, CT_Tbl)]
+    tables = [Table(element, doc) for element in elements]
+
+    grids = [read_table(element) for element in elements]
+    legacy_cells = sum(len(row.cells) for table in tables for row in table.rows)
+
+    return {
+        'document': os.path.basename(path),
+        'tables': len(elements),
+        'rows': sum(len(grid.rows) for grid in grids),
+        'tc': sum(len(element.xpath('./w:tr/w:tc')) for element in elements),
+        'legacy_cells': legacy_cells,
+        'grid_cells': sum(len(row.cells) for grid in grids for row in grid.rows),
+        'legacy_html_ms': round(timed(legacy_table_to_html, tables), 1),
+        'html_ms': round(timed(lambda element: docx_to_html.table_to_html(read_table(element)), elements), 1),
+        'legacy_markdown_ms': round(timed(legacy_table_to_markdown, tables), 1),
+        'markdown_ms': round(timed(lambda element: docx_to_markdown.table_to_markdown(read_table(element)),
+                                   elements), 1),
+    }
+
+
+def run_benchmark(paths, tables=DEFAULT_TABLES, rows=DEFAULT_ROWS, cols=DEFAULT_COLS):
+    if paths:
+        return [bench_document(path) for path in paths]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f'spec_{tables}x{rows}x{cols}.docx')
+        build_document(tables, rows, cols, path)
+        print(f"      已生成 {tables} 个 {rows} 行 x {cols} 列的规格表", file=sys.stderr)
+        return [bench_document(path)]
+
+
+def print_report(results):
+    for r in results:
+        print(f"{r['document']}: 表格 {r['tables']} 个，{r['rows']} 行，w:tc {r['tc']} 个")
+        print(f"   单元格输出: 原方式 {r['legacy_cells']} 个（合并单元格重复 {r['legacy_cells'] - r['grid_cells']} 个），"
+              f"新方式 {r['grid_cells']} 个")
+        print(f"   HTML: 原方式 {r['legacy_html_ms']:.1f}ms，新方式 {r['html_ms']:.1f}ms"
+              f"（{r['legacy_html_ms'] / max(r['html_ms'], 0.1):.1f}x）")
+        print(f"   Markdown: 原方式 {r['legacy_markdown_ms']:.1f}ms，新方式 {r['markdown_ms']:.1f}ms"
+              f"（{r['legacy_markdown_ms'] / max(r['markdown_ms'], 0.1):.1f}x）")
+
+
+def main():
+    args, options = split_args(sys.argv[1:])
+
+    for path in args:
+        if not os.path.exists(path):
+            print(f"❌ 文件不存在: {path}")
+            print("Usage: python3 bench_docx_tables.py [manual.docx ...] [--tables=N] [--rows=N] [--cols=N] [--json]")
+            sys.exit(1)
+
+    results = run_benchmark(args,
+                            int_option(options, 'tables', DEFAULT_TABLES),
+                            int_option(options, 'rows', DEFAULT_ROWS),
+                            max(3, int_option(options, 'cols', DEFAULT_COLS)))
+
+    if options.get('json'):
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+章节标题检测基准与黄金样本校验
+- 对每份手册（PDF / DOCX / Markdown / 纯文本）分别用原有的逐行正则和 headings 检测器切分标题
+- 纯文本（.txt，页之间以换页符分隔）没有字体信息，同 pdfplumber 提取的文本，用 detect_text_headings 判断
+- 统计耗时、标题数，以及只被正则识别（通常是编号列表项）或只被检测器识别的标题
+- --golden[=path]: 与黄金样本（JSON）比较检测器结果，不一致时以非0退出；
+  不指定路径时用 heading_samples/golden.json（其中的标题为人工逐条确认，样本文件在同一目录）
+- --update-golden: 用本次结果覆盖黄金样本（人工确认标题正确后使用）
+
+用法:
+    python3 bench_headings.py <manual> [<manual> ...] [--golden[=path]] [--update-golden] [--json]
+    python3 bench_headings.py heading_samples/*.txt --golden
+"""
+
+import sys
+import json
+import time
+from pathlib import Path
+from headings import (NUMBERED_HEADING, MAX_HEADING_LENGTH, HeadingDetector, detect_pdf_headings,
+                      detect_text_headings, markdown_heading)
+from script_args import split_args
+
+GOLDEN_PATH = Path(__file__).parent / 'heading_samples' / 'golden.json'
+
+
+def regex_heading(line):
+    """原有各脚本使用的逐行正则"""
+    match = NUMBERED_HEADING.match(line)
+    if match and len(line) < MAX_HEADING_LENGTH:
+        return match.group(1), match.group(2).strip()
+    return None
+
+
+def pdf_headings(path):
+    import fitz  # PyMuPDF，仅PDF样本需要
+
+    with fitz.open(path) as pdf_doc:
+        started = time.perf_counter()
+        regex = []
+        for page_num, page in enumerate(pdf_doc, start=1):
+            for line in page.get_text().split('\n'):
+                heading = regex_heading(line.strip())
+                if heading:
+                    regex.append([page_num, *heading])
+        regex_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        detected = [[page_num, *heading] for page_num, _, heading in detect_pdf_headings(pdf_doc) if heading]
+        detector_ms = (time.perf_counter() - started) * 1000
+
+    return regex, regex_ms, detected, detector_ms
+
+
+def docx_headings(path):
+    from docx import Document  # python-docx，仅DOCX样本需要
+    from headings import docx_body_size, docx_paragraph_font
+
+    doc = Document(path)
+
+    started = time.perf_counter()
+    regex = [[0, *heading] for heading in (regex_heading(p.text.strip()) for p in doc.paragraphs) if heading]
+    regex_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    detector = HeadingDetector(docx_body_size(doc))
+    detected = []
+    for paragraph in doc.paragraphs:
+        size, bold = docx_paragraph_font(paragraph)
+        heading = detector.match(paragraph.text, size, bold, heading_style=paragraph.style.name.startswith('Heading'))
+        if heading:
+            detected.append([0, *heading])
+    detector_ms = (time.perf_counter() - started) * 1000
+
+    return regex, regex_ms, detected, detector_ms
+
+
+def markdown_headings(path):
+    lines = Path(path).read_text(encoding='utf-8').split('\n')
+
+    started = time.perf_counter()
+    regex = [[0, *heading] for heading in map(regex_heading, lines) if heading]
+    regex_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    detected = [[level, title] for level, title in filter(None, map(markdown_heading, lines))]
+    detector_ms = (time.perf_counter() - started) * 1000
+
+    return regex, regex_ms, detected, detector_ms
+
+
+def text_headings(path):
+    pages = Path(path).read_text(encoding='utf-8').split('\f')
+    lines = [(page_num, line.strip()) for page_num, page in enumerate(pages, start=1)
+             for line in page.split('\n') if line.strip()]
+
+    started = time.perf_counter()
+    regex = [[page_num, *heading] for page_num, heading in ((n, regex_heading(line)) for n, line in lines) if heading]
+    regex_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    detected = [[page_num, *heading] for page_num, _, heading in detect_text_headings(lines) if heading]
+    detector_ms = (time.perf_counter() - started) * 1000
+
+    return regex, regex_ms, detected, detector_ms
+
+
+READERS = {'.pdf': pdf_headings, '.docx': docx_headings, '.md': markdown_headings, '.txt': text_headings}
+
+
+def run_benchmark(paths):
+    """
+    Returns:
+        {name: {'regex_ms', 'detector_ms', 'regex', 'headings', 'regex_only', 'detector_only'}}
+    """
+    results = {}
+
+    for path in paths:
+        reader = READERS.get(Path(path).suffix.lower())
+        if reader is None:
+            print(f"⚠ 跳过不支持的文件 {path}", file=sys.stderr)
+            continue
+
+        regex, regex_ms, detected, detector_ms = reader(path)
+        regex_keys = {tuple(h) for h in regex}
+        detected_keys = {tuple(h) for h in detected}
+
+        results[Path(path).name] = {
+            'regex_ms': round(regex_ms, 1),
+            'detector_ms': round(detector_ms, 1),
+            'regex': len(regex),
+            'headings': detected,
+            'regex_only': [h for h in regex if tuple(h) not in detected_keys],
+            'detector_only': [h for h in detected if tuple(h) not in regex_keys],
+        }
+
+    return results
+
+
+def print_report(results):
+    print(f"{'文件':<40}{'正则标题':>10}{'检测器标题':>12}{'仅正则':>8}{'仅检测器':>10}{'正则(ms)':>10}{'检测器(ms)':>12}")
+    for name, r in results.items():
+        print(f"{name[:38]:<40}{r['regex']:>10}{len(r['headings']):>12}{len(r['regex_only']):>8}"
+              f"{len(r['detector_only']):>10}{r['regex_ms']:>10.1f}{r['detector_ms']:>12.1f}")
+        for page_num, *heading in r['regex_only'][:10]:
+            print(f"    仅正则: p{page_num} {' '.join(heading)}")
+
+
+def check_golden(results, golden_path):
+    """与黄金样本比较，返回不一致的文件名列表"""
+    golden = json.loads(Path(golden_path).read_text(encoding='utf-8'))
+    mismatched = []
+
+    for name, r in results.items():
+        if name not in golden:
+            print(f"⚠ 黄金样本中没有 {name}", file=sys.stderr)
+            continue
+        expected = golden[name]
+        if r['headings'] != expected:
+            mismatched.append(name)
+            missing = [h for h in expected if h not in r['headings']]
+            extra = [h for h in r['headings'] if h not in expected]
+            print(f"❌ {name}: 缺少 {len(missing)} 个标题，多出 {len(extra)} 个标题", file=sys.stderr)
+            for h in missing[:10]:
+                print(f"    - {h}", file=sys.stderr)
+            for h in extra[:10]:
+                print(f"    + {h}", file=sys.stderr)
+        else:
+            print(f"✓ {name}: {len(expected)} 个标题与黄金样本一致", file=sys.stderr)
+
+    return mismatched
+
+
+def main():
+    args, options = split_args(sys.argv[1:])
+    golden_path = options.get('golden')
+    if golden_path is True:
+        golden_path = GOLDEN_PATH
+
+    if not args:
+        print("Usage: python3 bench_headings.py <manual.pdf|.docx|.md|.txt> [...] [--golden[=path]] [--update-golden] [--json]")
+        sys.exit(1)
+
+    results = run_benchmark(args)
+    if not results:
+        print("❌ 没有可处理的文件")
+        sys.exit(1)
+
+    if options.get('json'):
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+    if golden_path and options.get('update-golden'):
+        golden = {}
+        if Path(golden_path).exists():
+            golden = json.loads(Path(golden_path).read_text(encoding='utf-8'))
+        golden.update({name: r['headings'] for name, r in results.items()})
+        Path(golden_path).write_text(json.dumps(golden, ensure_ascii=False, indent=1), encoding='utf-8')
+        print(f"已更新黄金样本 {golden_path}", file=sys.stderr)
+    elif golden_path and check_golden(results, golden_path):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
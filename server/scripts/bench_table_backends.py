@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+表格提取后端对比
+- 对每份PDF逐页分别用 pdfplumber 和 PyMuPDF find_tables 提取表格
+- 统计每个后端的耗时(ms)、表格数，以及经 table_to_markdown 渲染后Markdown不一致的页
+- --diff 打印不一致页面的 unified diff，用于切换后端前人工核对
+
+用法:
+    python3 bench_table_backends.py <pdf> [<pdf> ...] [--limit=N] [--diff] [--json]
+"""
+
+import sys
+import json
+import time
+import difflib
+import fitz  # PyMuPDF
+import pdfplumber
+from pathlib import Path
+from extract_pdf_with_toc import table_to_markdown
+from pdf_tables import pdfplumber_tables, pymupdf_tables, pymupdf_tables_available
+from script_args import split_args, int_option
+
+
+def render_tables(tables):
+    """按提取脚本的方式渲染一页的表格"""
+    return ''.join(md + '\n' for md in map(table_to_markdown, tables) if md)
+
+
+def compare_pdf(pdf_path, limit=0):
+    """
+    逐页对比两个后端
+
+    Returns:
+        {'pages', 'backends': {name: {'total_ms', 'tables'}}, 'differences': [(page_num, plumber_md, pymupdf_md)]}
+    """
+    backends = {name: {'total_ms': 0.0, 'tables': 0} for name in ('pdfplumber', 'pymupdf')}
+    differences = []
+    pages = 0
+
+    with pdfplumber.open(pdf_path) as pdf, fitz.open(pdf_path) as pdf_doc:
+        page_count = len(pdf.pages) if not limit else min(limit, len(pdf.pages))
+
+        for page_num in range(1, page_count + 1):
+            plumber_page = pdf.pages[page_num - 1]
+
+            started = time.perf_counter()
+            plumber_result = pdfplumber_tables(plumber_page)
+            backends['pdfplumber']['total_ms'] += (time.perf_counter() - started) * 1000
+            plumber_page.close()
+
+            started = time.perf_counter()
+            pymupdf_result = pymupdf_tables(pdf_doc[page_num - 1])
+            backends['pymupdf']['total_ms'] += (time.perf_counter() - started) * 1000
+
+            backends['pdfplumber']['tables'] += len(plumber_result)
+            backends['pymupdf']['tables'] += len(pymupdf_result)
+            pages += 1
+
+            plumber_md = render_tables(plumber_result)
+            pymupdf_md = render_tables(pymupdf_result)
+            if plumber_md != pymupdf_md:
+                differences.append((page_num, plumber_md, pymupdf_md))
+
+    for r in backends.values():
+        r['total_ms'] = round(r['total_ms'], 1)
+
+    return {'pages': pages, 'backends': backends, 'differences': differences}
+
+
+def print_report(pdf_path, result, show_diff):
+    pages = result['pages']
+    print(f"\n{Path(pdf_path).name}: {pages} 页，Markdown不一致 {len(result['differences'])} 页")
+    print(f"{'后端':<12}{'表格数':>8}{'ms/页':>10}{'总耗时(s)':>12}")
+    for name, r in result['backends'].items():
+        print(f"{name:<12}{r['tables']:>8}{r['total_ms'] / pages if pages else 0:>10.2f}{r['total_ms'] / 1000:>12.2f}")
+
+    plumber_ms = result['backends']['pdfplumber']['total_ms']
+    pymupdf_ms = result['backends']['pymupdf']['total_ms']
+    if pymupdf_ms:
+        print(f"pymupdf 相对 pdfplumber: {plumber_ms / pymupdf_ms:.1f}x")
+
+    if show_diff:
+        for page_num, plumber_md, pymupdf_md in result['differences']:
+            print(f"\n--- 第 {page_num} 页 ---")
+            sys.stdout.writelines(difflib.unified_diff(
+                plumber_md.splitlines(keepends=True), pymupdf_md.splitlines(keepends=True),
+                fromfile='pdfplumber', tofile='pymupdf'))
+    elif result['differences']:
+        pages_text = ', '.join(str(page_num) for page_num, _, _ in result['differences'][:20])
+        print(f"不一致的页: {pages_text}{' ...' if len(result['differences']) > 20 else ''}（--diff 查看差异）")
+
+
+def main():
+    args, options = split_args(sys.argv[1:])
+    limit = int_option(options, 'limit')
+
+    if not args:
+        print("Usage: python3 bench_table_backends.py <pdf> [...] [--limit=N] [--diff] [--json]")
+        sys.exit(1)
+
+    if not pymupdf_tables_available():
+        print(f"❌ 当前 PyMuPDF {fitz.VersionBind} 不支持 find_tables，请升级到 1.23 以上")
+        sys.exit(1)
+
+    results = {}
+    for pdf_path in args:
+        print(f"对比 {pdf_path} ...", file=sys.stderr)
+        results[pdf_path] = compare_pdf(pdf_path, limit)
+
+    if options.get('json'):
+        print(json.dumps({
+            pdf_path: {
+                'pages': r['pages'],
+                'backends': r['backends'],
+                'different_pages': [page_num for page_num, _, _ in r['differences']],
+            }
+            for pdf_path, r in results.items()
+        }, ensure_ascii=False, indent=2))
+    else:
+        for pdf_path, r in results.items():
+            print_report(pdf_path, r, bool(options.get('diff')))
+
+
+if __name__ == '__main__':
+    main()
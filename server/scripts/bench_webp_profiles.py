@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+WebP编码档位基准测试
+- 对样本图片分别用每个编码档位（fast / balanced / max）编码
+- 统计每张耗时(ms)、输出体积、相对源文件与相对max档位节省的字节
+- 样本可以是图片文件、图片目录或PDF（提取其中的图片）
+
+用法:
+    python3 bench_webp_profiles.py <path> [<path> ...] [--limit=N] [--json]
+"""
+
+import io
+import sys
+import json
+import time
+from pathlib import Path
+from PIL import Image
+from image_encoding import WEBP_PROFILES, save_encoded
+from script_args import split_args, int_option
+
+IMAGE_EXTS = {'.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif', '.tif', '.tiff'}
+
+
+def load_pdf_images(pdf_path, limit):
+    """提取PDF中的图片字节（与提取脚本使用相同的预过滤）"""
+    import fitz  # PyMuPDF，仅PDF样本需要
+    from pdf_images import candidate_images, new_scan_stats
+
+    samples = []
+    seen_xrefs = set()
+    stats = new_scan_stats()
+
+    with fitz.open(pdf_path) as pdf_doc:
+        for page in pdf_doc:
+            for img_info in candidate_images(page, seen_xrefs, stats):
+                try:
+                    samples.append((f"{Path(pdf_path).name}#xref{img_info[0]}",
+                                    pdf_doc.extract_image(img_info[0])["image"]))
+                except Exception:
+                    continue
+                if len(samples) >= limit:
+                    return samples
+
+    return samples
+
+
+def load_samples(paths, limit):
+    """收集样本图片：[(名称, 源字节)]"""
+    samples = []
+
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files = sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTS)
+            samples.extend((str(p), p.read_bytes()) for p in files)
+        elif path.suffix.lower() == '.pdf':
+            samples.extend(load_pdf_images(str(path), limit - len(samples)))
+        elif path.suffix.lower() in IMAGE_EXTS:
+            samples.append((str(path), path.read_bytes()))
+
+        if len(samples) >= limit:
+            break
+
+    return samples[:limit]
+
+
+def run_benchmark(samples):
+    """
+    逐档位编码全部样本
+
+    Returns:
+        {profile: {'images', 'total_ms', 'ms_per_image', 'source_bytes', 'output_bytes'}}
+    """
+    # 预先解码，只计编码时间
+    decoded = []
+    for name, data in samples:
+        try:
+            img = Image.open(io.BytesIO(data))
+            img.load()
+            decoded.append((img, len(data)))
+        except Exception as e:
+            print(f"⚠ 跳过无法解码的样本 {name}: {e}", file=sys.stderr)
+
+    results = {}
+    for name, encoder in WEBP_PROFILES.items():
+        output_bytes = 0
+        started = time.perf_counter()
+        for img, _ in decoded:
+            buf = io.BytesIO()
+            save_encoded(img, buf, encoder)
+            output_bytes += buf.tell()
+        total_ms = (time.perf_counter() - started) * 1000
+
+        results[name] = {
+            'images': len(decoded),
+            'total_ms': round(total_ms, 1),
+            'ms_per_image': round(total_ms / len(decoded), 2) if decoded else 0,
+            'source_bytes': sum(size for _, size in decoded),
+            'output_bytes': output_bytes,
+        }
+
+    return results
+
+
+def print_report(results):
+    baseline = results.get('max', {}).get('output_bytes') or 0
+
+    print(f"{'档位':<10}{'图片数':>8}{'ms/张':>10}{'总耗时(s)':>12}{'输出(KB)':>12}{'较源文件':>10}{'较max':>10}")
+    for name, r in results.items():
+        saved_source = (1 - r['output_bytes'] / r['source_bytes']) * 100 if r['source_bytes'] else 0
+        vs_max = (r['output_bytes'] / baseline - 1) * 100 if baseline else 0
+        print(f"{name:<10}{r['images']:>8}{r['ms_per_image']:>10.2f}{r['total_ms'] / 1000:>12.2f}"
+              f"{r['output_bytes'] / 1024:>12.1f}{saved_source:>9.1f}%{vs_max:>+9.1f}%")
+
+
+def main():
+    args, options = split_args(sys.argv[1:])
+    limit = int_option(options, 'limit', 200)
+
+    if not args:
+        print("Usage: python3 bench_webp_profiles.py <images_dir|image|pdf> [...] [--limit=N] [--json]")
+        sys.exit(1)
+
+    samples = load_samples(args, limit)
+    if not samples:
+        print("❌ 没有找到样本图片")
+        sys.exit(1)
+
+    print(f"样本: {len(samples)} 张，{sum(len(d) for _, d in samples) / 1024 / 1024:.1f}MB", file=sys.stderr)
+    results = run_benchmark(samples)
+
+    if options.get('json'):
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+长文档提取的断点续传
+- 定期写入检查点：已完成的页数、图片映射和去重状态、已产出的章节
+- 状态写入 JSON（先写临时文件再原子替换），章节逐条追加到旁边的 NDJSON 文件，
+  不必在内存中保留全部章节，也不会每次重写已完成的章节
+- --resume 时从检查点继续；PDF（路径、大小、修改时间）或影响输出的参数变化时检查点作废
+- 提取完成后删除检查点，续传后的最终输出与一次跑完的输出一致
+"""
+
+import os
+import sys
+import json
+import hashlib
+
+CHECKPOINT_PREFIX = '.checkpoint_'
+
+# 格式变化时递增，使旧检查点失效
+CHECKPOINT_VERSION = 3
+
+# 每完成多少页/章节写一次检查点
+CHECKPOINT_EVERY = 25
+
+
+def pdf_signature(pdf_path):
+    """PDF的身份：绝对路径、大小、修改时间"""
+    st = os.stat(pdf_path)
+    return {'path': os.path.abspath(pdf_path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _json_default(value):
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f'无法序列化 {type(value).__name__}')
+
+
+class Checkpoint:
+    """
+    单次提取运行的检查点
+
+    用法:
+        checkpoint = Checkpoint(path, signature, resume=True)
+        done = checkpoint.get('pages_done', 0)
+        ...
+        checkpoint.update(pages_done=page_num + 1, images_by_page=images_by_page)
+        checkpoint.add_section(section)
+        checkpoint.complete()
+
+    update() 保存的是对象引用，写检查点时才序列化（集合按列表保存，恢复时由调用方转换）
+    """
+
+    def __init__(self, path, signature, resume=False):
+        self.path = path
+        self.sections_path = path + '.sections.ndjson'
+        self.signature = signature
+        self.state = {'sections_done': 0}
+        self.resumed = False
+        self._pending = 0
+
+        if resume:
+            self._load()
+
+        if self.resumed and not self._truncate_sections():
+            print("⚠ 检查点的章节文件不完整，从头开始提取", file=sys.stderr)
+            self.state = {'sections_done': 0}
+            self.resumed = False
+
+        if not self.resumed:
+            # 重新开始：丢弃旧的章节文件
+            open(self.sections_path, 'w', encoding='utf-8').close()
+
+        self._sections_file = open(self.sections_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            print("      没有检查点，从头开始提取", file=sys.stderr)
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠ 检查点无法读取，从头开始提取: {e}", file=sys.stderr)
+            return
+
+        if data.get('version') != CHECKPOINT_VERSION or data.get('signature') != self.signature:
+            print("⚠ PDF或提取参数已变化，检查点作废，从头开始提取", file=sys.stderr)
+            return
+
+        self.state = data['state']
+        self.resumed = True
+
+    def _truncate_sections(self):
+        """只保留检查点记录的章节（崩溃时可能已多写了几行），章节文件缺行时返回 False"""
+        done = self.state.get('sections_done', 0)
+        if not os.path.exists(self.sections_path):
+            return done == 0
+        with open(self.sections_path, 'r+', encoding='utf-8') as f:
+            for _ in range(done):
+                if not f.readline().endswith('\n'):
+                    return False
+            f.truncate(f.tell())
+        return True
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def update(self, force=False, **state):
+        """更新状态，每 CHECKPOINT_EVERY 次（或 force 时）写入检查点"""
+        self.state.update(state)
+        self._pending += 1
+        if force or self._pending >= CHECKPOINT_EVERY:
+            self.save()
+
+    def add_section(self, section):
+        """追加一个已完成的章节"""
+        self._sections_file.write(json.dumps(section, ensure_ascii=False) + '\n')
+        self.update(sections_done=self.state['sections_done'] + 1)
+
+    def saved_sections(self):
+        """检查点中已完成的章节（按产出顺序）"""
+        self._sections_file.flush()
+        with open(self.sections_path, encoding='utf-8') as f:
+            for _ in range(self.state['sections_done']):
+                yield json.loads(f.readline())
+
+    def save(self):
+        # 章节文件先落盘，检查点记录的章节数不会超过文件中的行数
+        self._sections_file.flush()
+        os.fsync(self._sections_file.fileno())
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CHECKPOINT_VERSION, 'signature': self.signature, 'state': self.state},
+                      f, ensure_ascii=False, default=_json_default)
+        os.replace(tmp_path, self.path)
+        self._pending = 0
+
+    def close(self):
+        if self._sections_file is not None:
+            self._sections_file.close()
+            self._sections_file = None
+
+    def complete(self):
+        """提取完成，删除检查点"""
+        self.close()
+        for path in (self.path, self.sections_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def format_stats(self):
+        if not self.resumed:
+            return "检查点: 从头开始"
+        return (f"检查点: 从已完成的 {self.get('pages_done', 0)} 页、"
+                f"{self.state['sections_done']} 个章节继续")
+
+
+def open_checkpoint(options, pdf_path, output_dir, name='extract', **settings):
+    """
+    根据 --checkpoint[=path] / --resume 选项打开检查点，都未指定时返回 None
+
+    默认路径按 name（脚本）和PDF路径区分；settings 为影响输出的参数（编码档位、表格后端等），
+    与检查点记录的不一致时检查点作废
+    """
+    value = options.get('checkpoint')
+    resume = bool(options.get('resume'))
+    if not value and not resume:
+        return None
+
+    if not value or value is True:
+        key = hashlib.blake2b(os.path.abspath(pdf_path).encode(), digest_size=6).hexdigest()
+        value = os.path.join(output_dir, f'{CHECKPOINT_PREFIX}{name}_{key}.json')
+
+    return Checkpoint(value, {**pdf_signature(pdf_path), **settings}, resume)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+常驻转换进程（替代每次请求启动一个 python3）
+- 行分隔的 JSON-RPC：stdin 每行一个请求，stdout 每行一个响应
+    请求: {"id": 1, "method": "docx_to_html", "params": {...}}
+    响应: {"id": 1, "result": {...}, "elapsed_ms": 812.5, "run_ms": 790.1}
+          {"id": 1, "error": {"type": "FileNotFoundError", "message": "..."}, "elapsed_ms": 0.8}
+- 转换在常驻进程池中执行，--workers=N 限制并发数；fitz / PIL / docx 在每个池进程中只导入一次
+- convert_image（网页图片，调用方带超时）使用单独的进程池（--image-workers=N），不会排在长时间的
+  DOCX/PDF 转换之后
+- 每个进程池只在有空闲进程时才提交请求，其余请求在本进程排队；cancel(id) 从队列中移除尚未开始执行的请求
+  （调用方超时后放弃的请求），该请求以 Cancelled 错误响应，不会再执行
+- 响应按完成顺序返回，调用方按 id 对应；elapsed_ms 为收到请求到返回的耗时，run_ms 为执行耗时（差值为排队时间）
+- 转换脚本的进度输出全部转到 stderr，stdout 只用于协议
+- stdin 关闭后等待进行中的请求完成再退出，并在 stderr 输出各方法的调用统计
+
+方法（options 与对应脚本的命令行选项相同，如 {"image-store": true, "webp-profile": "fast"}）:
+    docx_to_html(docx_path, output_html_path, images_dir, options)  → docx_to_html.html_stats()（--chapters 时另有 chapter_count、manifest）
+    extract_pdf_images(pdf_path, output_dir, options)              → {'images': [...]}
+    convert_image(input_path, output_path, webp_profile=None)      → {'width', 'height'}
+    cancel(id)  → {'cancelled': true/false}（已开始执行的请求无法取消）
+    ping()   → {'pid', 'workers'}
+    stats()  → {method: {'calls', 'errors', 'avg_ms', 'max_ms'}}
+
+用法:
+    python3 conversion_worker.py [--workers=N] [--image-workers=N]
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from script_args import split_args, int_option
+
+DEFAULT_WORKERS = 2
+DEFAULT_IMAGE_WORKERS = 1
+
+
+def _docx_to_html(docx_path, output_html_path, images_dir, options=None):
+    from docx_to_html import run_conversion
+    return run_conversion(docx_path, output_html_path, images_dir, options or {})
+
+
+def _extract_pdf_images(pdf_path, output_dir, options=None):
+    from extract_pdf_images import run_extraction
+    return {'images': run_extraction(pdf_path, output_dir, options or {})}
+
+
+def _convert_image(input_path, output_path, webp_profile=None):
+    from image_encoding import webp_profile as profile, convert_image_file
+    # 先写临时文件再原子替换，不会留下写了一半的图片
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        width, height = convert_image_file(input_path, tmp_path, profile(webp_profile))
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {'width': width, 'height': height}
+
+
+METHODS = {
+    'docx_to_html': _docx_to_html,
+    'extract_pdf_images': _extract_pdf_images,
+    'convert_image': _convert_image,
+}
+
+# 使用单独进程池的方法（其余方法使用 'convert' 进程池）
+METHOD_LANES = {'convert_image': 'image'}
+
+
+def _warm_up():
+    """池进程启动时预先导入转换依赖，首个请求不再承担导入耗时"""
+    for module in ('docx_to_html', 'extract_pdf_images'):
+        try:
+            __import__(module)
+        except ImportError as e:
+            print(f"⚠ 预加载 {module} 失败: {e}", file=sys.stderr)
+
+
+def _run(method, params):
+    """在池进程中执行一个方法，返回 (结果, 执行耗时ms)"""
+    started = time.perf_counter()
+    result = METHODS[method](**params)
+    return result, (time.perf_counter() - started) * 1000
+
+
+class ConversionWorker:
+    """
+    请求分发：内置方法直接响应，转换方法提交到进程池
+
+    用法:
+        worker = ConversionWorker(workers, protocol, image_workers=1)
+        for line in sys.stdin:
+            worker.handle(line)
+        worker.close()
+    """
+
+    def __init__(self, workers, protocol, image_workers=DEFAULT_IMAGE_WORKERS):
+        self.workers = workers
+        self.lane_workers = {'convert': workers, 'image': image_workers}
+        self.protocol = protocol
+        self.pools = {lane: self._new_pool(lane) for lane in self.lane_workers}
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.calls = {}
+        self.queued = {lane: deque() for lane in self.lane_workers}  # 等待空闲进程的请求
+        self.running = {lane: 0 for lane in self.lane_workers}
+
+    def _new_pool(self, lane):
+        # 图片进程池只做图片编码，不预加载 DOCX/PDF 依赖
+        initializer = _warm_up if lane == 'convert' else None
+        return ProcessPoolExecutor(max_workers=self.lane_workers[lane], initializer=initializer)
+
+    def respond(self, response):
+        line = json.dumps(response, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.protocol.write(line)
+            self.protocol.flush()
+
+    def record(self, method, elapsed_ms, failed):
+        with self.lock:
+            stats = self.calls.setdefault(method, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['calls'] += 1
+            stats['errors'] += failed
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+    def fail(self, request_id, method, received, error_type, message):
+        elapsed_ms = (time.perf_counter() - received) * 1000
+        if method in METHODS:
+            self.record(method, elapsed_ms, True)
+        self.respond({'id': request_id, 'error': {'type': error_type, 'message': message},
+                      'elapsed_ms': round(elapsed_ms, 1)})
+
+    def handle(self, line):
+        received = time.perf_counter()
+        line = line.strip()
+        if not line:
+            return
+
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            method = request.get('method')
+            params = request.get('params') or {}
+        except (ValueError, AttributeError) as e:
+            self.fail(None, None, received, 'ParseError', f"无效的请求: {e}")
+            return
+
+        if method == 'ping':
+            self.respond({'id': request_id, 'result': {'pid': os.getpid(), 'workers': self.workers}, 'elapsed_ms': 0.0})
+            return
+        if method == 'stats':
+            self.respond({'id': request_id, 'result': self.stats(), 'elapsed_ms': 0.0})
+            return
+        if method == 'cancel':
+            self.respond({'id': request_id, 'result': {'cancelled': self.cancel(params.get('id'))},
+                          'elapsed_ms': 0.0})
+            return
+        if method not in METHODS:
+            self.fail(request_id, None, received, 'MethodNotFound', f"未知的方法: {method}")
+            return
+        if not isinstance(params, dict):
+            self.fail(request_id, method, received, 'InvalidParams', "params 必须是对象")
+            return
+
+        lane = METHOD_LANES.get(method, 'convert')
+        with self.lock:
+            self.queued[lane].append((request_id, method, params, received))
+        self._dispatch(lane)
+
+    def _dispatch(self, lane):
+        """有空闲进程时提交排队的请求（进程池自身的队列中的请求无法取消，所以不提前提交）"""
+        while True:
+            with self.lock:
+                if not self.queued[lane] or self.running[lane] >= self.lane_workers[lane]:
+                    return
+                request_id, method, params, received = self.queued[lane].popleft()
+                self.running[lane] += 1
+
+            try:
+                future = self._submit(lane, method, params)
+            except Exception as e:
+                # 提交失败时请求直接以错误响应，并释放占用的名额（否则调用方只能等到超时，close() 也会一直等待）
+                with self.lock:
+                    self.running[lane] -= 1
+                    self.idle.notify_all()
+                self.fail(request_id, method, received, type(e).__name__, f"提交到进程池失败: {e}")
+                continue
+            future.add_done_callback(
+                lambda f, request=(request_id, method, received): self._finish(f, lane, *request))
+
+    def _submit(self, lane, method, params):
+        try:
+            return self.pools[lane].submit(_run, method, params)
+        except BrokenProcessPool:
+            # 池进程异常退出（如解析PDF时崩溃）后重建进程池
+            print("⚠ 转换进程池已损坏，重新启动", file=sys.stderr)
+            self.pools[lane] = self._new_pool(lane)
+            return self.pools[lane].submit(_run, method, params)
+
+    def cancel(self, request_id):
+        """取消尚未开始执行的请求，返回是否已取消（已提交到进程池的请求无法取消）"""
+        with self.lock:
+            request = next(((queue, request) for queue in self.queued.values()
+                            for request in queue if request[0] == request_id), None)
+            if request is None:
+                return False
+            queue, request = request
+            queue.remove(request)
+
+        _, method, _, received = request
+        self.fail(request_id, method, received, 'Cancelled', "请求已取消")
+        return True
+
+    def _finish(self, future, lane, request_id, method, received):
+        with self.lock:
+            self.running[lane] -= 1
+            self.idle.notify_all()
+        self._dispatch(lane)
+        try:
+            result, run_ms = future.result()
+        except Exception as e:
+            self.fail(request_id, method, received, type(e).__name__, str(e))
+            return
+
+        elapsed_ms = (time.perf_counter() - received) * 1000
+        self.record(method, elapsed_ms, False)
+        self.respond({'id': request_id, 'result': result,
+                      'elapsed_ms': round(elapsed_ms, 1), 'run_ms': round(run_ms, 1)})
+
+    def stats(self):
+        with self.lock:
+            return {method: {'calls': s['calls'], 'errors': s['errors'],
+                             'avg_ms': round(s['total_ms'] / s['calls'], 1), 'max_ms': round(s['max_ms'], 1)}
+                    for method, s in self.calls.items()}
+
+    def close(self):
+        # 先等排队的请求提交并完成，再关闭进程池
+        with self.idle:
+            self.idle.wait_for(lambda: not any(self.queued.values()) and not any(self.running.values()))
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+
+    def format_stats(self):
+        stats = self.stats()
+        if not stats:
+            return "转换进程: 没有处理请求"
+        return "转换进程: " + "，".join(
+            f"{method} {s['calls']} 次（失败 {s['errors']}，平均 {s['avg_ms']}ms，最长 {s['max_ms']}ms）"
+            for method, s in stats.items())
+
+
+def main():
+    args, options = split_args(sys.argv[1:])
+    workers = max(1, int_option(options, 'workers', DEFAULT_WORKERS))
+    image_workers = max(1, int_option(options, 'image-workers', DEFAULT_IMAGE_WORKERS))
+
+    # 协议使用原 stdout 的副本；fd 1 改指向 stderr，池进程和转换脚本的 print 不会混入协议
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    worker = ConversionWorker(workers, protocol, image_workers)
+    print(f"转换进程已启动 (pid {os.getpid()}, {workers} workers, {image_workers} image workers)", file=sys.stderr)
+
+    try:
+        for line in sys.stdin:
+            worker.handle(line)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()
+        print(worker.format_stats(), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+DOCX转HTML时按章节拆分（docx_to_html.py --chapters）
+- 转换过程中在 h1~h3 标题处分章，每章的正文（不含标题）写成一个HTML片段文件，另写 manifest.json，
+  服务端据此直接写入文章，不必再解析整篇HTML、用正则切分
+- 分章规则与原来服务端的 splitHtmlIntoChapters 相同：
+  - 标题去掉文档自带的产品型号前缀（MAVO / Eagle / Terra xxx:）
+  - 正文超过50个字符、含图片、一级标题或以编号开头的标题才成为一章，其余丢弃
+  - 第一个标题之前的内容不属于任何一章；整篇没有 h1~h3 标题时全文作为一章（Untitled Document）
+- 章节号/小节号取自标题开头的编号（如 3.2），没有编号时按标题级别顺延
+- 每章记录：标题路径、章节号、在整篇HTML中的字节位置、图片列表、字符数/图片数/表格数/小标题数
+
+manifest.json:
+    {"version", "html", "chapter_count", "dropped", "preamble": {...} | null,
+     "chapters": [{"index", "level", "title", "heading_path", "chapter_number", "section_number",
+                   "fragment", "heading_offset", "content_offset", "content_end", "bytes", "chars",
+                   "images", "image_count", "table_count", "heading_count"}]}
+    *_offset / content_end 为整篇HTML中的字节位置：heading_offset 为标题开始，
+    content_offset ~ content_end 为标题之后到下一个分章标题之前；片段文件为去掉首尾空行后的这一段
+
+用法:
+    with open(html_path, 'w', encoding='utf-8') as f:
+        writer = CollapsingWriter(f, 2)
+        chapters = ChapterSplitter(chapters_dir, writer, html_path)
+        chapters.heading(1, '1 概述', '<h1>1 概述</h1>\\n')
+        chapters.write('<p>...</p>\\n')
+        manifest = chapters.finish()
+"""
+
+import os
+import re
+import json
+from docx_stream import CollapsingWriter
+
+MANIFEST_NAME = 'manifest.json'
+
+# manifest 格式变化时递增
+MANIFEST_VERSION = 1
+
+# 在 h1 ~ h3 处分章
+SPLIT_LEVEL = 3
+
+UNTITLED = 'Untitled Document'
+
+# 短于此字符数（且无图片、不是一级标题、标题不带编号）的章节丢弃
+MIN_CONTENT_CHARS = 50
+
+MODEL_PREFIX = re.compile(r'^(MAVO\s+[^:]+|Eagle\s+[^:]+|Terra\s+[^:]+):\s*', re.IGNORECASE)
+CHAPTER_NUMBER = re.compile(r'^(\d+)(?:\.(\d+))?(?:[.\s]+|$)')
+NUMBERED_TITLE = re.compile(r'^[\d.]+')
+
+IMG_TAG = re.compile(r'<img ')
+TABLE_TAG = re.compile(r'<table')
+HEADING_TAG = re.compile(r'<h[1-6]>')
+
+
+def chapters_option(options, output_html_path):
+    """读取 --chapters[=dir] 选项，未指定目录时为HTML所在目录下的 chapters/；未启用时为 None"""
+    value = options.get('chapters')
+    if not value:
+        return None
+    if value is True:
+        return os.path.join(os.path.dirname(os.path.abspath(output_html_path)), 'chapters')
+    return value
+
+
+class _Chapter:
+    """写出中的一章"""
+
+    def __init__(self, path, level, title, heading_path, heading_offset, content_offset):
+        self.path = path
+        self.level = level
+        self.title = title
+        self.heading_path = heading_path
+        self.heading_offset = heading_offset
+        self.content_offset = content_offset
+        self.file = open(path, 'w', encoding='utf-8')
+        # 片段去掉开头的空行；结尾的空行留在 pending 中不写出
+        self.writer = CollapsingWriter(self.file, 2)
+        self.images = []
+        self.counts = {'image_count': 0, 'table_count': 0, 'heading_count': 0}
+
+    def write(self, chunk):
+        if self.writer.chars == 0:
+            chunk = chunk.lstrip('\n')
+        self.writer.write(chunk)
+        self.counts['image_count'] += len(IMG_TAG.findall(chunk))
+        self.counts['table_count'] += len(TABLE_TAG.findall(chunk))
+        self.counts['heading_count'] += len(HEADING_TAG.findall(chunk))
+
+    def close(self):
+        self.file.close()
+
+    def keep(self):
+        """同原来服务端的分章规则：正文较长、含图片、一级标题或标题带编号"""
+        return (self.writer.chars > MIN_CONTENT_CHARS or self.counts['image_count'] > 0
+                or self.level == 1 or bool(NUMBERED_TITLE.match(self.title)))
+
+    def to_dict(self, content_end):
+        return {
+            'level': self.level,
+            'title': self.title,
+            'heading_path': self.heading_path,
+            'fragment': os.path.basename(self.path),
+            'heading_offset': self.heading_offset,
+            'content_offset': self.content_offset,
+            'content_end': content_end,
+            'bytes': self.writer.bytes,
+            'chars': self.writer.chars,
+            'images': self.images,
+            **self.counts,
+        }
+
+
+class ChapterSplitter:
+    """
+    边写整篇HTML边按标题分章
+
+    writer 为整篇HTML的 CollapsingWriter：分章标题用 heading() 写出，其余片段用 write() 写出
+    """
+
+    def __init__(self, chapters_dir, writer, html_path=None):
+        self.dir = chapters_dir
+        self.writer = writer
+        self.html_path = html_path
+        self.chapters = []
+        self.dropped = 0
+        self.headings = 0
+        self.stack = []  # 当前标题路径 [(level, title)]
+        self.chapter_number = 0
+        self.section_number = 0
+        self.preamble = None
+        os.makedirs(chapters_dir, exist_ok=True)
+        # 第一个标题之前的内容
+        self.current = _Chapter(os.path.join(chapters_dir, 'preamble.html'), 1, UNTITLED, [], None, 0)
+
+    def image_url(self, image_url):
+        """包装 image_url(embed_id)，把引用的图片记入当前章节"""
+        def chapter_image_url(embed_id):
+            url = image_url(embed_id)
+            if url and url not in self.current.images:
+                self.current.images.append(url)
+            return url
+        return chapter_image_url
+
+    def heading(self, level, title, chunk):
+        """写出一个分章标题（h1~h3）：结束上一章，开始新的一章"""
+        # 先写出上一章结尾的空行，标题开始位置即上一章的结束位置
+        self.writer.flush()
+        heading_offset = self.writer.bytes
+        self.headings += 1
+        self._close(heading_offset)
+
+        title = MODEL_PREFIX.sub('', title)
+        while self.stack and self.stack[-1][0] >= level:
+            self.stack.pop()
+        self.stack.append((level, title))
+
+        self.writer.write(chunk)
+        path = os.path.join(self.dir, f'chapter_{self.headings:04d}.html')
+        self.current = _Chapter(path, level, title, [t for _, t in self.stack], heading_offset, self.writer.bytes)
+
+    def write(self, chunk):
+        self.writer.write(chunk)
+        self.current.write(chunk)
+
+    def _close(self, content_end):
+        chapter = self.current
+        chapter.close()
+        if chapter.heading_offset is None:
+            # 第一个标题之前的内容：整篇没有标题时作为一章（同样要求超过50个字符）
+            if self.headings == 0 and chapter.writer.chars > MIN_CONTENT_CHARS:
+                self._add(chapter, content_end)
+                return
+            if chapter.writer.chars:
+                self.preamble = chapter.to_dict(content_end)
+            else:
+                os.remove(chapter.path)
+            return
+        if chapter.keep():
+            self._add(chapter, content_end)
+        else:
+            self.dropped += 1
+            os.remove(chapter.path)
+
+    def _add(self, chapter, content_end):
+        entry = {'index': len(self.chapters), **chapter.to_dict(content_end)}
+        entry['chapter_number'], entry['section_number'] = self._numbers(chapter.level, chapter.title)
+        self.chapters.append(entry)
+
+    def _numbers(self, level, title):
+        """章节号/小节号：优先取标题开头的编号，否则按级别顺延（三级标题不增加小节号）"""
+        match = CHAPTER_NUMBER.match(title)
+        if match:
+            self.chapter_number = int(match.group(1))
+            self.section_number = int(match.group(2)) if match.group(2) else 0
+        elif level == 1:
+            self.chapter_number += 1
+            self.section_number = 0
+        elif level == 2:
+            self.chapter_number = self.chapter_number or 1
+            self.section_number += 1
+        else:
+            self.chapter_number = self.chapter_number or 1
+            self.section_number = self.section_number or 1
+        return self.chapter_number or None, self.section_number or None
+
+    def finish(self):
+        """结束最后一章并写出 manifest.json，返回 manifest"""
+        self.writer.flush()
+        self._close(self.writer.bytes)
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'html': self.html_path,
+            'chapter_count': len(self.chapters),
+            'dropped': self.dropped,
+            'preamble': self.preamble,
+            'chapters': self.chapters,
+        }
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        return manifest
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.dir, MANIFEST_NAME)
+
+    def format_stats(self):
+        return (f"分章: {len(self.chapters)} 章，丢弃过短的章节 {self.dropped} 个 → {self.manifest_path}")
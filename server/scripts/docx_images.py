@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+DOCX图片按需编码（与正文遍历共用同一个已解析的 Document，不再重复打开DOCX）
+- 正文遍历遇到 a:blip 引用时才读取对应的图片关系；未被正文引用的图片（孤立、未使用的媒体）不解码、不编码
+- 文件名由图片内容哈希决定；引用处在主线程完整解码图片后才给出URL，编码提交到有界线程池（PIL编码时释放GIL），
+  遍历继续进行
+- 同一内容的图片只解码、编码一次；输出中的图片顺序由遍历决定，与编码完成的先后无关
+- 无法解码的图片（WMF/EMF 等格式、数据截断或损坏）当场跳过，不出现在输出中，也不计入图片数
+- 图片库（--image-store）的清单只在主线程读写，线程中只做编码
+- --image-threads=N: 编码线程数（默认 min(4, CPU数)）
+- 图片关系以 rId -> 读取图片内容的函数 传入：python-docx 文档用 document_image_blobs(doc)，
+  流式读取时用 docx_stream.DocxStream.image_blobs
+
+用法:
+    with DocxImages(document_image_blobs(doc), images_dir, store, encoder) as images:
+        url = images.url(embed_id)   # 正文遍历中
+        images.finish()
+    print(images.format_stats())
+"""
+
+import io
+import os
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image, ImageFile
+from image_encoding import WEBP_ENCODER, save_encoded
+from script_args import int_option
+
+IMAGE_URL_PREFIX = '/data/knowledge_images/'
+
+DEFAULT_IMAGE_THREADS = min(4, os.cpu_count() or 1)
+
+# 每个线程最多排队的编码任务数（排队的是已解码的图片），超过时等待最早的任务完成
+QUEUE_PER_THREAD = 2
+
+
+def image_threads_option(options):
+    """读取 --image-threads=N 选项"""
+    return max(1, int_option(options, 'image-threads', DEFAULT_IMAGE_THREADS))
+
+
+def document_image_blobs(doc):
+    """python-docx 文档的图片关系：rId -> 读取图片内容的函数（此时不读取内容）"""
+    return {rel.rId: (lambda part=rel.target_part: part.blob)
+            for rel in doc.part.rels.values()
+            if "image" in rel.target_ref and not rel.is_external}
+
+
+def _encode(img, output_path, encoder):
+    """编码已解码的图片（在线程池中执行），返回 (width, height)"""
+    with img:
+        save_encoded(img, output_path, encoder)
+        return img.size
+
+
+class DocxImages:
+    """
+    按需编码DOCX正文引用的图片
+
+    image_blobs 为 rId -> 读取图片内容的函数；store 为 image_store.ImageStore（可选），encoder 为编码参数
+    """
+
+    def __init__(self, image_blobs, images_dir, store=None, encoder=WEBP_ENCODER, threads=DEFAULT_IMAGE_THREADS):
+        self.images_dir = images_dir
+        self.store = store
+        self.encoder = store.encoder if store is not None else encoder
+        self.rels = image_blobs
+        self.urls = {}  # rId -> URL，无法使用的图片为 None
+        self.filenames = set()
+        self.pending = deque()  # (future, filename, key, source_size)
+        self.max_pending = threads * QUEUE_PER_THREAD
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.stats = {'referenced': 0, 'encoded': 0, 'reused': 0, 'failed': 0}
+        Path(images_dir).mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """关闭线程池（出错退出时取消尚未开始的编码）"""
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def url(self, embed_id):
+        """正文中 r:embed 引用的图片URL，不是图片或图片无法使用时返回 None"""
+        if embed_id in self.urls:
+            return self.urls[embed_id]
+        read_blob = self.rels.get(embed_id)
+        if read_blob is None:
+            return None
+
+        self.stats['referenced'] += 1
+        try:
+            filename = self._submit(read_blob())
+        except Exception as e:
+            print(f"      图片处理失败: {e}")
+            self.stats['failed'] += 1
+            filename = None
+
+        url = f"{IMAGE_URL_PREFIX}{filename}" if filename else None
+        self.urls[embed_id] = url
+        return url
+
+    def _submit(self, image_bytes):
+        """确定文件名，解码图片并提交编码，返回文件名"""
+        # 先读取图片头；WMF/EMF 等只能识别不能解码的格式当场跳过
+        img = Image.open(io.BytesIO(image_bytes))
+        if isinstance(img, ImageFile.StubImageFile):
+            raise ValueError(f"不支持的图片格式 {img.format}")
+
+        key = None
+        if self.store is not None:
+            key, entry = self.store.lookup(image_bytes)
+            if entry is not None:
+                if entry['filename']:
+                    self._reuse(entry['filename'])
+                return entry['filename']
+            filename = self.store.filename_for(key)
+        else:
+            filename = f"img_{hashlib.md5(image_bytes).hexdigest()[:12]}.webp"
+
+        if filename in self.filenames:
+            return filename
+
+        # 给出URL之前完整解码：截断、损坏的图片在此报错并跳过，输出中不会引用未写出的文件
+        img.load()
+        self.filenames.add(filename)
+
+        while len(self.pending) >= self.max_pending:
+            self._collect(self.pending.popleft())
+
+        future = self.pool.submit(_encode, img, os.path.join(self.images_dir, filename), self.encoder)
+        self.pending.append((future, filename, key, len(image_bytes)))
+        print(f"      提取图片: {filename}")
+        return filename
+
+    def _reuse(self, filename):
+        if filename not in self.filenames:
+            self.filenames.add(filename)
+            self.stats['reused'] += 1
+            print(f"      复用图片: {filename}")
+
+    def _collect(self, task):
+        future, filename, key, source_size = task
+        try:
+            width, height = future.result()
+        except Exception as e:
+            print(f"      图片编码失败: {filename}: {e}")
+            self.stats['failed'] += 1
+            return
+        self.stats['encoded'] += 1
+        if self.store is not None:
+            self.store.add_encoded(key, filename, width, height, source_size)
+
+    def finish(self):
+        """等待全部编码完成并记录结果"""
+        while self.pending:
+            self._collect(self.pending.popleft())
+
+    @property
+    def skipped(self):
+        """正文未引用的图片关系数"""
+        return len(self.rels) - len(self.urls)
+
+    def format_stats(self):
+        return (f"图片: 正文引用 {self.stats['referenced']} 个，新编码 {self.stats['encoded']} 张，"
+                f"复用 {self.stats['reused']} 张，失败 {self.stats['failed']} 个，"
+                f"跳过未引用的图片关系 {self.skipped} 个（共 {len(self.rels)} 个）")
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+流式读取DOCX正文（不经 python-docx 建立整份文档的对象树）
+- 从zip中流式读取主文档部件（word/document.xml），用 lxml iterparse 增量解析
+- 正文中的段落和表格逐个以事件（Block）交出，处理完即清除对应的XML元素，
+  内存占用与文档大小基本无关，适合数百页的维修手册
+- 段落带有样式名、文字、run（文字/粗体/斜体）和图片引用（a:blip 的 r:embed）
+- 表格由 read_table 一次读出 w:tc / gridSpan / vMerge：合并单元格只出现一次，带起始网格列、跨列数和跨行数
+  （不经 python-docx 的 row.cells，后者每次调用都重新计算网格，且合并单元格按跨越的网格数重复出现）
+- 文字、样式名的取法与 python-docx 一致，两种读取方式的转换结果相同
+- document_blocks(doc) 从已打开的 python-docx Document 交出同样的事件，转换代码两种方式共用
+- 图片内容只在被引用时从zip读取（image_blobs，交给 docx_images.DocxImages）
+- CollapsingWriter 边转换边写文件，写出时压缩连续空行（代替整篇拼接后的 re.sub）
+
+用法:
+    with DocxStream(docx_path) as stream:
+        for block in stream.blocks():
+            if block.kind == PARAGRAPH:
+                print(block.style_name, block.item.text, block.image_ids)
+            else:
+                for row in block.item.rows:
+                    print([(cell.col, cell.colspan, cell.rowspan, cell.text) for cell in row.cells])
+"""
+
+import re
+import posixpath
+import zipfile
+from collections import namedtuple
+from lxml import etree
+from docx.oxml.text.paragraph import CT_P
+from docx.oxml.table import CT_Tbl
+from docx.text.paragraph import Paragraph
+from docx.styles import BabelFish
+from headings import DocxStyleNames
+
+PARAGRAPH = 'paragraph'
+TABLE = 'table'
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+OFFICE_DOCUMENT_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+STYLES_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles'
+
+
+def _w(tag):
+    return f'{{{W_NS}}}{tag}'
+
+
+W_BODY = _w('body')
+W_P = _w('p')
+W_TBL = _w('tbl')
+W_TR = _w('tr')
+W_TC = _w('tc')
+W_R = _w('r')
+W_HYPERLINK = _w('hyperlink')
+W_VAL = _w('val')
+W_TYPE = _w('type')
+W_RPR = _w('rPr')
+W_B = _w('b')
+W_I = _w('i')
+W_PSTYLE = f"{_w('pPr')}/{_w('pStyle')}"
+W_GRID_SPAN = f"{_w('tcPr')}/{_w('gridSpan')}"
+W_VMERGE = f"{_w('tcPr')}/{_w('vMerge')}"
+W_GRID_BEFORE = f"{_w('trPr')}/{_w('gridBefore')}"
+DRAWING = _w('drawing')
+BLIP = f'{{{A_NS}}}blip'
+R_EMBED = f'{{{R_NS}}}embed'
+
+# run 中按顺序计入文字的子元素（同 python-docx 的 Run.text）
+_RUN_TEXT = {
+    _w('t'): lambda e: e.text or '',
+    _w('tab'): lambda e: '\t',
+    _w('ptab'): lambda e: '\t',
+    _w('cr'): lambda e: '\n',
+    _w('noBreakHyphen'): lambda e: '-',
+    # 只有换行符计为 \n，分栏符、分页符不计
+    _w('br'): lambda e: '\n' if e.get(W_TYPE, 'textWrapping') == 'textWrapping' else '',
+}
+
+# 正文事件：kind 为 PARAGRAPH / TABLE；item 为段落（流式读取时为 StreamParagraph，
+# document_blocks 中为 python-docx 的 Paragraph）或表格（都为 TableGrid）；
+# style_name / image_ids 只对段落有意义
+Block = namedtuple('Block', 'kind item style_name image_ids')
+
+StreamRun = namedtuple('StreamRun', 'text bold italic')
+
+# 表格：rows 为 TableRow 列表，columns 为网格列数（各行 gridBefore + 跨列数之和的最大值）
+TableGrid = namedtuple('TableGrid', 'rows columns')
+
+# 表格行：cells 为本行起始的单元格（被上方单元格纵向合并的位置不出现），grid_before 为行首空出的网格列数
+TableRow = namedtuple('TableRow', 'cells grid_before')
+
+
+class StreamParagraph(namedtuple('StreamParagraph', 'text runs')):
+    """段落：text 含超链接中的文字，runs 只含段落直接包含的 run（同 python-docx）"""
+    __slots__ = ()
+
+
+class GridCell:
+    """表格单元格：起始网格列、跨列数、跨行数和段落（StreamParagraph）"""
+
+    __slots__ = ('col', 'colspan', 'rowspan', 'paragraphs')
+
+    def __init__(self, col, colspan, paragraphs):
+        self.col = col
+        self.colspan = colspan
+        self.rowspan = 1
+        self.paragraphs = paragraphs
+
+    @property
+    def text(self):
+        """同 python-docx 的 cell.text"""
+        return '\n'.join(p.text for p in self.paragraphs)
+
+
+def paragraph_image_ids(p):
+    """段落元素中所有图片引用的 r:embed（按文档顺序），p 可以是 python-docx 的 CT_P"""
+    return [blip.get(R_EMBED)
+            for drawing in p.iter(DRAWING)
+            for blip in drawing.iter(BLIP)]
+
+
+def document_blocks(doc):
+    """从已打开的 python-docx Document 按文档顺序交出正文事件"""
+    # 直接由正文元素构造段落/表格对象（doc.paragraphs / doc.tables 每次访问都重新生成列表，逐个查找为 O(n²)）
+    style_names = DocxStyleNames()
+    for element in doc.element.body:
+        if isinstance(element, CT_P):
+            para = Paragraph(element, doc)
+            yield Block(PARAGRAPH, para, style_names(para), paragraph_image_ids(element))
+        elif isinstance(element, CT_Tbl):
+            yield Block(TABLE, read_table(element), None, ())
+
+
+def _on_off(element, tag):
+    """rPr 中开关属性（w:b / w:i）的值，未设置时为 None"""
+    child = element.find(tag)
+    if child is None:
+        return None
+    return child.get(W_VAL, 'true') in ('1', 'true', 'on')
+
+
+def _run(r):
+    text = ''.join(_RUN_TEXT[child.tag](child) for child in r if child.tag in _RUN_TEXT)
+    rpr = r.find(W_RPR)
+    if rpr is None:
+        return StreamRun(text, None, None)
+    return StreamRun(text, _on_off(rpr, W_B), _on_off(rpr, W_I))
+
+
+def _paragraph(p):
+    runs = []
+    text = []
+    for child in p:
+        if child.tag == W_R:
+            run = _run(child)
+            runs.append(run)
+            text.append(run.text)
+        elif child.tag == W_HYPERLINK:
+            text.extend(_run(r).text for r in child.iterchildren(W_R))
+    return StreamParagraph(''.join(text), runs)
+
+
+def _grid_span(tc):
+    span = tc.find(W_GRID_SPAN)
+    return int(span.get(W_VAL)) if span is not None else 1
+
+
+def _v_merge(tc):
+    merge = tc.find(W_VMERGE)
+    return None if merge is None else merge.get(W_VAL, 'continue')
+
+
+def _grid_before(tr):
+    before = tr.find(W_GRID_BEFORE)
+    return int(before.get(W_VAL)) if before is not None else 0
+
+
+def read_table(tbl):
+    """
+    一次读出表格元素（w:tbl，可以是 python-docx 的 CT_Tbl）的网格
+
+    横向合并（gridSpan）的单元格记为一个 colspan 单元格；纵向合并的后续单元格（vMerge=continue）
+    不单独出现，计入上一行同一网格列单元格的 rowspan。上一行同一位置没有单元格时按普通单元格处理。
+    嵌套表格不展开（同原来的 cell.paragraphs）
+    """
+    rows = []
+    columns = 0
+    above = {}  # 上一行：网格起始列 -> 单元格
+    for tr in tbl.iterchildren(W_TR):
+        cells = []
+        current = {}
+        grid_before = _grid_before(tr)
+        col = grid_before
+        for tc in tr.iterchildren(W_TC):
+            span = _grid_span(tc)
+            cell = above.get(col) if _v_merge(tc) == 'continue' else None
+            if cell is not None:
+                cell.rowspan += 1
+            else:
+                cell = GridCell(col, span, [_paragraph(p) for p in tc.iterchildren(W_P)])
+                cells.append(cell)
+            current[col] = cell
+            col += span
+        rows.append(TableRow(cells, grid_before))
+        columns = max(columns, col)
+        above = current
+    return TableGrid(rows, columns)
+
+
+def _read_rels(archive, part_name):
+    """部件（空字符串为整个包）的关系：rId -> (type, Target原值, 目标部件名, 是否外部)"""
+    rels_name = posixpath.join(posixpath.dirname(part_name), '_rels', posixpath.basename(part_name) + '.rels')
+    try:
+        root = etree.fromstring(archive.read(rels_name))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in root.iter(f'{{{PKG_REL_NS}}}Relationship'):
+        target = rel.get('Target')
+        external = rel.get('TargetMode') == 'External'
+        if not external:
+            if target.startswith('/'):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join(posixpath.dirname(part_name), target))
+        rels[rel.get('Id')] = (rel.get('Type'), rel.get('Target'), target, external)
+    return rels
+
+
+def _style_names(styles_xml):
+    """
+    段落样式ID -> 样式名，以及默认段落样式名
+
+    与 python-docx 的 paragraph.style.name 相同：找不到的ID或不是段落样式时用默认段落样式，
+    样式名经 BabelFish 转为界面名（如 heading 1 -> Heading 1）
+    """
+    names = {}
+    default = None
+    for style in etree.fromstring(styles_xml).iterchildren(_w('style')):
+        name_element = style.find(_w('name'))
+        name = name_element.get(W_VAL) if name_element is not None else None
+        name = BabelFish.internal2ui(name) if name is not None else None
+        style_id = style.get(_w('styleId'))
+        if style_id is not None and style_id not in names:
+            # 同一ID只取第一个；不是段落样式的记为 False，查找时退回默认样式
+            names[style_id] = name if style.get(_w('type')) == 'paragraph' else False
+        if style.get(_w('type')) == 'paragraph' and style.get(_w('default')) in ('1', 'true', 'on'):
+            default = name
+    return names, default
+
+
+class DocxStream:
+    """
+    流式读取的DOCX文件
+
+    只在打开时读取关系和样式（都很小），正文在 blocks() 中边解析边交出
+    """
+
+    def __init__(self, docx_path):
+        self.archive = zipfile.ZipFile(docx_path)
+        try:
+            package_rels = _read_rels(self.archive, '')
+            self.document_part = next(
+                (target for rel_type, _, target, external in package_rels.values()
+                 if rel_type == OFFICE_DOCUMENT_REL and not external),
+                'word/document.xml')
+            self.rels = _read_rels(self.archive, self.document_part)
+
+            styles_part = next((target for rel_type, _, target, external in self.rels.values()
+                                if rel_type == STYLES_REL and not external), None)
+            if styles_part is not None:
+                self.style_names, self.default_style = _style_names(self.archive.read(styles_part))
+            else:
+                # 没有样式部件时 python-docx 使用内置的默认样式（Normal）
+                self.style_names, self.default_style = {}, 'Normal'
+        except Exception:
+            self.archive.close()
+            raise
+
+        # 图片关系的筛选与 python-docx 路径（docx_images.document_image_blobs）一致
+        self.image_blobs = {rId: self._reader(target)
+                            for rId, (_, target_ref, target, external) in self.rels.items()
+                            if 'image' in target_ref and not external}
+        self.paragraphs = 0
+        self.tables = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.archive.close()
+
+    def _reader(self, part_name):
+        return lambda: self.archive.read(part_name)
+
+    def style_name(self, p):
+        """段落样式名"""
+        pstyle = p.find(W_PSTYLE)
+        style_id = pstyle.get(W_VAL) if pstyle is not None else None
+        name = self.style_names.get(style_id, False) if style_id else False
+        return self.default_style if name is False else name
+
+    def blocks(self):
+        """按文档顺序交出正文的段落和表格事件"""
+        with self.archive.open(self.document_part) as f:
+            events = etree.iterparse(f, events=('end',), tag=(W_P, W_TBL),
+                                     resolve_entities=False, huge_tree=True)
+            for _, element in events:
+                parent = element.getparent()
+                if parent is None or parent.tag != W_BODY:
+                    continue  # 表格中的段落随表格一起处理
+
+                if element.tag == W_P:
+                    self.paragraphs += 1
+                    yield Block(PARAGRAPH, _paragraph(element), self.style_name(element),
+                                paragraph_image_ids(element))
+                else:
+                    self.tables += 1
+                    yield Block(TABLE, read_table(element), None, ())
+
+                # 释放已处理的元素（连同之前的 w:sdt 等其他正文元素）
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+
+    def format_stats(self):
+        return f"流式读取: 段落 {self.paragraphs} 个，表格 {self.tables} 个"
+
+
+class CollapsingWriter:
+    """
+    逐段写出文本，连续换行超过 max_newlines 个时压缩为 max_newlines 个
+
+    结果与整篇拼接后 re.sub(r'\\n{N+1,}', '\\n' * N) 相同（跨片段的连续换行一并计算）；
+    chars / bytes / newlines 为已写出的字符数、UTF-8字节数和换行数
+    """
+
+    def __init__(self, f, max_newlines):
+        self.f = f
+        self.max_newlines = max_newlines
+        self.pattern = re.compile('\n{%d,}' % (max_newlines + 1))
+        self.replacement = '\n' * max_newlines
+        self.pending = 0  # 尚未写出的结尾换行数
+        self.chars = 0
+        self.bytes = 0
+        self.newlines = 0
+
+    def write(self, text):
+        body = text.lstrip('\n')
+        self.pending += len(text) - len(body)
+        if not body:
+            return
+        trimmed = body.rstrip('\n')
+        self._emit('\n' * min(self.pending, self.max_newlines) + self.pattern.sub(self.replacement, trimmed))
+        self.pending = len(body) - len(trimmed)
+
+    def flush(self):
+        """写出结尾的换行（之后的片段以非换行开头时，结果与不调用相同）"""
+        self._emit('\n' * min(self.pending, self.max_newlines))
+        self.pending = 0
+
+    def _emit(self, text):
+        self.f.write(text)
+        self.chars += len(text)
+        self.bytes += len(text.encode('utf-8'))
+        self.newlines += text.count('\n')
@@ -2,61 +2,73 @@
 """
 DOCX转HTML脚本
 - 保留标题层级 (h1~h6)
-- 转换表格为HTML table
-- 提取图片并转WebP
+- 转换表格为HTML table（直接读取 w:tc / gridSpan / vMerge，合并单元格输出 colspan / rowspan）
+- 提取图片并转WebP（--image-store 时跨运行复用已编码的图片，--webp-profile 选择编码档位）
+- DOCX只解析一次，只编码正文引用的图片，编码在线程池中与正文转换并行（--image-threads=N，见 docx_images）
 - 保留粗体/斜体/列表格式
+- --stream: 流式读取 word/document.xml 并边转换边写文件（见 docx_stream），内存占用与文档大小基本无关，
+  用于数百页的大文档；输出与默认方式相同
+- --chapters[=dir]: 转换时在 h1~h3 标题处分章，每章写一个HTML片段并写出 manifest.json（见 docx_chapters，
+  默认目录为HTML所在目录下的 chapters/；隐含 --stream），整篇HTML照常写出
+- --report=path / --no-report / --profile[=path] / --trace-memory: 分阶段耗时与内存的JSON报告（默认写到
+  HTML所在目录的 .ingest_reports/）和可选的 cProfile 文件（见 instrument）
 """
 
 import sys
 import os
 from docx import Document
-from docx.oxml.ns import qn
-from pathlib import Path
-from PIL import Image
-import io
-import hashlib
 import re
 from html import escape
+from image_store import open_image_store
+from image_encoding import WEBP_ENCODER, profile_option
+from docx_images import DocxImages, DEFAULT_IMAGE_THREADS, document_image_blobs, image_threads_option
+from docx_stream import DocxStream, CollapsingWriter, PARAGRAPH, document_blocks
+from docx_chapters import ChapterSplitter, SPLIT_LEVEL, chapters_option
+from script_args import split_args
+from instrument import open_instrument, stage
 
 def table_to_html(table):
-    """转换DOCX表格为HTML table，保留格式"""
+    """
+    转换DOCX表格（docx_stream.TableGrid）为HTML table，保留格式
+    
+    合并单元格输出一次并带 colspan / rowspan；行首空出的网格列（gridBefore）补一个空单元格
+    """
     if not table.rows:
         return ''
     
     html_lines = ['<table class="wiki-table">']
     
     for row_idx, row in enumerate(table.rows):
+        # 第一行作为表头
+        tag = 'th' if row_idx == 0 else 'td'
         html_lines.append('  <tr>')
+        if row.grid_before:
+            html_lines.append(f'    <{tag}{span_attrs(row.grid_before, 1)}></{tag}>')
         for cell in row.cells:
             # 处理单元格内的段落和格式
-            cell_content = ''
+            para_texts = []
             for para in cell.paragraphs:
                 para_text = ''
                 for run in para.runs:
-                    text = escape(run.text)
-                    if not text:
-                        continue
-                    # 保留粗体、斜体格式
-                    if run.bold:
-                        text = f'<strong>{text}</strong>'
-                    if run.italic:
-                        text = f'<em>{text}</em>'
-                    para_text += text
+                    para_text += process_run_formatting(run)
                 if para_text.strip():
-                    cell_content += para_text + '<br>'
-            
-            cell_content = cell_content.rstrip('<br>')
+                    para_texts.append(para_text)
             
-            # 第一行作为表头
-            if row_idx == 0:
-                html_lines.append(f'    <th>{cell_content}</th>')
-            else:
-                html_lines.append(f'    <td>{cell_content}</td>')
+            html_lines.append(f'    <{tag}{span_attrs(cell.colspan, cell.rowspan)}>{"<br>".join(para_texts)}</{tag}>')
         html_lines.append('  </tr>')
     
     html_lines.append('</table>')
     return '\n'.join(html_lines)
 
+def span_attrs(colspan, rowspan):
+    """单元格的 colspan / rowspan 属性（为1时省略）"""
+    attrs = ''
+    if colspan > 1:
+        attrs += f' colspan="{colspan}"'
+    if rowspan > 1:
+        attrs += f' rowspan="{rowspan}"'
+    return attrs
+
 def process_run_formatting(run):
     """处理文本格式，输出HTML"""
     text = run.text
@@ -76,106 +88,26 @@ def process_run_formatting(run):
     
     return text
 
-def extract_images_from_docx(docx_path, images_dir):
-    """提取DOCX中的图片"""
-    doc = Document(docx_path)
-    Path(images_dir).mkdir(parents=True, exist_ok=True)
-    
-    image_map = {}  # rId -> filepath
-    
-    # 遍历所有图片关系
-    for rel in doc.part.rels.values():
-        if "image" in rel.target_ref:
-            try:
-                image_bytes = rel.target_part.blob
-                img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
-                
-                # 转WebP
-                img = Image.open(io.BytesIO(image_bytes))
-                
-                # 处理颜色模式
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    bg = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P': 
-                        img = img.convert('RGBA')
-                    if img.mode in ('RGBA', 'LA'): 
-                        bg.paste(img, mask=img.split()[-1])
-                    img = bg
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                filename = f"img_{img_hash}.webp"
-                filepath = os.path.join(images_dir, filename)
-                img.save(filepath, "WEBP", quality=85, method=6)
-                
-                image_map[rel.rId] = f"/data/knowledge_images/{filename}"
-                print(f"      提取图片: {filename}")
-            except Exception as e:
-                print(f"      图片处理失败: {e}")
-    
-    return image_map
-
-def convert_docx_to_html(docx_path, output_html_path, images_dir):
+def convert_docx_to_html(docx_path, output_html_path, images_dir, store=None, encoder=WEBP_ENCODER,
+                         image_threads=DEFAULT_IMAGE_THREADS):
     """转换DOCX为HTML"""
     print(f"[1/4] 读取DOCX文件: {docx_path}")
-    doc = Document(docx_path)
-    
-    print(f"[2/4] 提取图片...")
-    image_map = extract_images_from_docx(docx_path, images_dir)
+    with stage('open'):
+        doc = Document(docx_path)
     
-    print(f"\n[3/4] 转换内容...")
-    html_lines = []
-    
-    for element in doc.element.body:
-        # 处理段落
-        if element.tag.endswith('p'):
-            para = None
-            for p in doc.paragraphs:
-                if p._element == element:
-                    para = p
-                    break
-            
-            if not para:
-                continue
-            
-            # 检测标题
-            if para.style.name.startswith('Heading'):
-                level = int(para.style.name.replace('Heading ', ''))
-                title = escape(para.text.strip())
-                if title:
-                    html_lines.append(f"<h{level}>{title}</h{level}>\n")
-            else:
-                # 普通段落
-                para_text = ''
-                for run in para.runs:
-                    para_text += process_run_formatting(run)
-                
-                # 检查图片
-                images_html = []
-                for drawing in para._element.findall('.//' + qn('w:drawing')):
-                    for blip in drawing.findall('.//' + qn('a:blip')):
-                        embed_id = blip.get(qn('r:embed'))
-                        if embed_id in image_map:
-                            images_html.append(f'<img src="{image_map[embed_id]}" alt="Image" />')
-                
-                if para_text.strip():
-                    html_lines.append(f"<p>{para_text.strip()}</p>\n")
-                
-                for img_html in images_html:
-                    html_lines.append(f"<p>{img_html}</p>\n")
+    print(f"[2/4] 转换内容（按需提取图片）...")
+    with DocxImages(document_image_blobs(doc), images_dir, store, encoder, image_threads) as images:
+        with stage('content') as s:
+            html_lines = convert_body(doc, images.url)
+            s.count(elements=len(doc.element.body))
         
-        # 处理表格
-        elif element.tag.endswith('tbl'):
-            table = None
-            for t in doc.tables:
-                if t._element == element:
-                    table = t
-                    break
-            
-            if table:
-                html_table = table_to_html(table)
-                if html_table:
-                    html_lines.append(html_table + '\n\n')
+        print(f"\n[3/4] 等待图片编码...")
+        with stage('images') as s:
+            images.finish()
+            s.count(images=images.stats['encoded'], reused=images.stats['reused'], skipped_rels=images.skipped)
+    print(f"      {images.format_stats()}")
+    if store is not None:
+        print(f"      {store.format_stats()}")
     
     # 合并内容
     html_content = ''.join(html_lines)
@@ -184,34 +116,186 @@ def convert_docx_to_html(docx_path, output_html_path, images_dir):
     html_content = re.sub(r'\n{3,}', '\n\n', html_content)
     
     print(f"[4/4] 保存HTML文件: {output_html_path}")
-    with open(output_html_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    with stage('write', bytes=len(html_content)):
+        with open(output_html_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+    
+    print_stats(html_stats(html_content))
+    
+    return html_content
+
+def convert_docx_to_html_stream(docx_path, output_html_path, images_dir, store=None, encoder=WEBP_ENCODER,
+                                image_threads=DEFAULT_IMAGE_THREADS, chapters_dir=None):
+    """
+    流式转换DOCX为HTML：不建立整份文档的对象树，也不在内存中拼接整篇HTML
+    
+    chapters_dir 不为 None 时同时分章，写出各章片段和 manifest.json（见 docx_chapters）
+    
+    Returns:
+        html_stats() 统计（写出时累计）；分章时另有 chapter_count 和 manifest（manifest.json 路径）
+    """
+    print(f"[1/4] 流式读取DOCX文件: {docx_path}")
+    with stage('open'):
+        stream = DocxStream(docx_path)
     
-    # 统计
-    heading_count = len(re.findall(r'<h[1-6]>', html_content))
-    image_count = len(re.findall(r'<img ', html_content))
-    table_count = len(re.findall(r'<table', html_content))
+    with stream, DocxImages(stream.image_blobs, images_dir, store, encoder, image_threads) as images:
+        print(f"[2/4] 转换内容并写入HTML文件: {output_html_path}（按需提取图片）")
+        stats = {'char_count': 0, 'heading_count': 0, 'image_count': 0, 'table_count': 0}
+        with stage('content') as s, open(output_html_path, 'w', encoding='utf-8') as f:
+            writer = CollapsingWriter(f, 2)
+            chapters = ChapterSplitter(chapters_dir, writer, output_html_path) if chapters_dir else None
+            image_url = chapters.image_url(images.url) if chapters else images.url
+            for block in stream.blocks():
+                level = heading_level(block)
+                for chunk in block_to_html(block, image_url):
+                    if chapters is None:
+                        writer.write(chunk)
+                    elif level is not None and level <= SPLIT_LEVEL:
+                        chapters.heading(level, block.item.text.strip(), chunk)
+                    else:
+                        chapters.write(chunk)
+                    for key, value in html_stats(chunk).items():
+                        stats[key] += value
+            if chapters is not None:
+                manifest = chapters.finish()
+                stats['chapter_count'] = manifest['chapter_count']
+                stats['manifest'] = chapters.manifest_path
+            writer.flush()
+            stats['char_count'] = writer.chars
+            s.count(elements=stream.paragraphs + stream.tables, bytes=writer.bytes)
+        print(f"      {stream.format_stats()}")
+        if chapters is not None:
+            print(f"      {chapters.format_stats()}")
+        
+        print(f"\n[3/4] 等待图片编码...")
+        with stage('images') as s:
+            images.finish()
+            s.count(images=images.stats['encoded'], reused=images.stats['reused'], skipped_rels=images.skipped)
+    print(f"      {images.format_stats()}")
+    if store is not None:
+        print(f"      {store.format_stats()}")
+    
+    print(f"[4/4] 已保存HTML文件: {output_html_path}")
+    print_stats(stats)
     
+    return stats
+
+def print_stats(stats):
     print(f"\n✅ 转换完成！")
     print(f"📊 统计:")
-    print(f"   - 总字符数: {len(html_content)}")
-    print(f"   - 标题数: {heading_count}")
-    print(f"   - 图片数: {image_count}")
-    print(f"   - 表格数: {table_count}")
+    print(f"   - 总字符数: {stats['char_count']}")
+    print(f"   - 标题数: {stats['heading_count']}")
+    print(f"   - 图片数: {stats['image_count']}")
+    print(f"   - 表格数: {stats['table_count']}")
+
+def convert_body(doc, image_url):
+    """
+    按文档顺序把正文的段落和表格转为HTML片段列表
+
+    image_url(embed_id) 返回图片引用对应的URL，不是可用图片时返回 None（如 DocxImages.url）
+    """
+    html_lines = []
+    for block in document_blocks(doc):
+        html_lines.extend(block_to_html(block, image_url))
+    return html_lines
+
+def block_to_html(block, image_url):
+    """一个正文事件（docx_stream.Block，段落或表格）的HTML片段列表"""
+    if block.kind != PARAGRAPH:
+        with stage('tables', tables=1):
+            html_table = table_to_html(block.item)
+        return [html_table + '\n\n'] if html_table else []
     
-    return html_content
+    para = block.item
+    
+    # 检测标题
+    level = heading_level(block)
+    if level is not None:
+        title = escape(para.text.strip())
+        return [f"<h{level}>{title}</h{level}>\n"] if title else []
+    
+    # 普通段落
+    para_text = ''
+    for run in para.runs:
+        para_text += process_run_formatting(run)
+    
+    # 检查图片
+    images_html = []
+    for embed_id in block.image_ids:
+        url = image_url(embed_id)
+        if url:
+            images_html.append(f'<img src="{url}" alt="Image" />')
+    
+    html_lines = []
+    if para_text.strip():
+        html_lines.append(f"<p>{para_text.strip()}</p>\n")
+    
+    for img_html in images_html:
+        html_lines.append(f"<p>{img_html}</p>\n")
+    return html_lines
 
-if __name__ == '__main__':
-    if len(sys.argv) < 4:
-        print("Usage: python3 docx_to_html.py <docx_path> <output_html_path> <images_dir>")
-        sys.exit(1)
+def heading_level(block):
+    """标题段落的级别（Heading N 样式），不是标题时为 None"""
+    if block.kind == PARAGRAPH and block.style_name.startswith('Heading'):
+        return int(block.style_name.replace('Heading ', ''))
+    return None
+
+def html_stats(html_content):
+    """HTML的字符数、标题数、图片数、表格数"""
+    return {
+        'char_count': len(html_content),
+        'heading_count': len(re.findall(r'<h[1-6]>', html_content)),
+        'image_count': len(re.findall(r'<img ', html_content)),
+        'table_count': len(re.findall(r'<table', html_content)),
+    }
+
+def run_conversion(docx_path, output_html_path, images_dir, options):
+    """
+    按命令行选项转换DOCX（命令行和 conversion_worker 共用）
     
-    docx_path = sys.argv[1]
-    output_html_path = sys.argv[2]
-    images_dir = sys.argv[3]
+    Args:
+        options: split_args 解析出的选项（--image-store / --webp-profile / --image-threads / --stream / --chapters）
     
+    Returns:
+        html_stats() 统计；--chapters 时另有 chapter_count 和 manifest（manifest.json 路径）
+    
+    Raises:
+        FileNotFoundError: DOCX文件不存在
+        ValueError: 未知的WebP编码档位
+    """
     if not os.path.exists(docx_path):
-        print(f"❌ 文件不存在: {docx_path}")
+        raise FileNotFoundError(f"文件不存在: {docx_path}")
+    
+    encoder = profile_option(options)
+    
+    store = open_image_store(options, images_dir, encoder=encoder)
+    chapters_dir = chapters_option(options, output_html_path)
+    try:
+        if options.get('stream') or chapters_dir:
+            return convert_docx_to_html_stream(docx_path, output_html_path, images_dir, store, encoder,
+                                               image_threads_option(options), chapters_dir)
+        html_content = convert_docx_to_html(docx_path, output_html_path, images_dir, store, encoder,
+                                            image_threads_option(options))
+    finally:
+        if store is not None:
+            store.close()
+    
+    return html_stats(html_content)
+
+def main():
+    args, options = split_args(sys.argv[1:])
+    
+    if len(args) < 3:
+        print("Usage: python3 docx_to_html.py <docx_path> <output_html_path> <images_dir> [--image-store[=manifest]] [--webp-profile=fast|balanced|max] [--image-threads=N] [--stream] [--chapters[=dir]] [--report=path] [--no-report] [--profile[=path]] [--trace-memory]")
         sys.exit(1)
     
-    convert_docx_to_html(docx_path, output_html_path, images_dir)
+    instrument = open_instrument(options, 'docx_to_html', os.path.dirname(os.path.abspath(args[1])))
+    try:
+        stats = run_conversion(args[0], args[1], args[2], options)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    instrument.finish(**stats)
+
+if __name__ == '__main__':
+    main()
@@ -2,45 +2,43 @@
 """
 DOCX转Markdown脚本 (增强版)
 - 保留标题层级
-- 转换表格为Markdown格式（完整支持）
-- 提取图片并转WebP
+- 转换表格为Markdown格式（直接读取 w:tc / gridSpan / vMerge，合并单元格的文字只出现一次）
+- 提取图片并转WebP（--image-store 时跨运行复用已编码的图片，--webp-profile 选择编码档位）
+- DOCX只解析一次，只编码正文引用的图片，编码在线程池中与正文转换并行（--image-threads=N，见 docx_images）
 - 保留粗体/斜体/列表格式
+- --stream: 流式读取 word/document.xml 并边转换边写文件（见 docx_stream），内存占用与文档大小基本无关，
+  用于数百页的大文档；输出与默认方式相同
+- --report=path / --no-report / --profile[=path] / --trace-memory: 分阶段耗时与内存的JSON报告（默认写到
+  Markdown所在目录的 .ingest_reports/）和可选的 cProfile 文件（见 instrument）
 """
 
 import sys
 import os
 from docx import Document
-from docx.oxml.ns import qn
-from pathlib import Path
-from PIL import Image
-import io
-import hashlib
 import re
+from image_store import open_image_store
+from image_encoding import WEBP_ENCODER, profile_option
+from docx_images import DocxImages, DEFAULT_IMAGE_THREADS, document_image_blobs, image_threads_option
+from docx_stream import DocxStream, CollapsingWriter, PARAGRAPH, document_blocks
+from script_args import split_args
+from instrument import open_instrument, stage
 
 def table_to_markdown(table):
-    """转换DOCX表格为Markdown"""
+    """
+    转换DOCX表格（docx_stream.TableGrid）为Markdown
+    
+    Markdown不支持合并单元格：合并单元格的文字只写在起始位置，被合并的其他位置留空
+    """
     if not table.rows:
         return ''
     
     md_lines = []
-    rows_data = []
     
-    # 提取所有行
-    for row in table.rows:
-        row_data = []
+    # 按网格列填入各行，保证列数一致
+    rows_data = [[''] * table.columns for _ in table.rows]
+    for row_data, row in zip(rows_data, table.rows):
         for cell in row.cells:
-            text = cell.text.strip().replace('\n', ' ')
-            row_data.append(text)
-        rows_data.append(row_data)
-    
-    if len(rows_data) < 1:
-        return ''
-    
-    # 确保列数一致
-    max_cols = max(len(row) for row in rows_data)
-    for row in rows_data:
-        while len(row) < max_cols:
-            row.append('')
+            row_data[cell.col] = cell.text.strip().replace('\n', ' ')
     
     # 表头
     header = rows_data[0]
@@ -71,102 +69,26 @@ def process_run_formatting(run):
     
     return text
 
-def extract_images_from_docx(docx_path, images_dir):
-    """提取DOCX中的图片"""
-    doc = Document(docx_path)
-    Path(images_dir).mkdir(parents=True, exist_ok=True)
-    
-    image_map = {}  # rId -> filepath
-    
-    # 遍历所有图片关系
-    for rel in doc.part.rels.values():
-        if "image" in rel.target_ref:
-            try:
-                image_bytes = rel.target_part.blob
-                img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
-                
-                # 转WebP
-                img = Image.open(io.BytesIO(image_bytes))
-                
-                # 处理颜色模式
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    bg = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P': 
-                        img = img.convert('RGBA')
-                    if img.mode in ('RGBA', 'LA'): 
-                        bg.paste(img, mask=img.split()[-1])
-                    img = bg
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                filename = f"img_{img_hash}.webp"
-                filepath = os.path.join(images_dir, filename)
-                img.save(filepath, "WEBP", quality=85, method=6)
-                
-                image_map[rel.rId] = f"/data/knowledge_images/{filename}"
-                print(f"      提取图片: {filename}")
-            except Exception as e:
-                print(f"      图片处理失败: {e}")
-    
-    return image_map
-
-def convert_docx_to_markdown(docx_path, output_md_path, images_dir):
+def convert_docx_to_markdown(docx_path, output_md_path, images_dir, store=None, encoder=WEBP_ENCODER,
+                             image_threads=DEFAULT_IMAGE_THREADS):
     """转换DOCX为Markdown"""
     print(f"[1/4] 读取DOCX文件: {docx_path}")
-    doc = Document(docx_path)
-    
-    print(f"[2/4] 提取图片...")
-    image_map = extract_images_from_docx(docx_path, images_dir)
-    
-    print(f"\n[3/4] 转换内容...")
-    markdown_lines = []
-    
-    for element in doc.element.body:
-        # 处理段落
-        if element.tag.endswith('p'):
-            para = None
-            for p in doc.paragraphs:
-                if p._element == element:
-                    para = p
-                    break
-            
-            if not para:
-                continue
-            
-            # 检测标题
-            if para.style.name.startswith('Heading'):
-                level = int(para.style.name.replace('Heading ', ''))
-                title = para.text.strip()
-                if title:
-                    markdown_lines.append(f"{'#' * level} {title}\n")
-            else:
-                # 普通段落
-                para_text = ''
-                for run in para.runs:
-                    para_text += process_run_formatting(run)
-                
-                # 检查图片
-                for drawing in para._element.findall('.//' + qn('w:drawing')):
-                    for blip in drawing.findall('.//' + qn('a:blip')):
-                        embed_id = blip.get(qn('r:embed'))
-                        if embed_id in image_map:
-                            para_text += f"\n\n![Image]({image_map[embed_id]})\n\n"
-                
-                if para_text.strip():
-                    markdown_lines.append(para_text.strip() + '\n\n')
+    with stage('open'):
+        doc = Document(docx_path)
+    
+    print(f"[2/4] 转换内容（按需提取图片）...")
+    with DocxImages(document_image_blobs(doc), images_dir, store, encoder, image_threads) as images:
+        with stage('content') as s:
+            markdown_lines = convert_body(doc, images.url)
+            s.count(elements=len(doc.element.body))
         
-        # 处理表格
-        elif element.tag.endswith('tbl'):
-            table = None
-            for t in doc.tables:
-                if t._element == element:
-                    table = t
-                    break
-            
-            if table:
-                md_table = table_to_markdown(table)
-                if md_table:
-                    markdown_lines.append(md_table + '\n\n')
+        print(f"\n[3/4] 等待图片编码...")
+        with stage('images') as s:
+            images.finish()
+            s.count(images=images.stats['encoded'], reused=images.stats['reused'], skipped_rels=images.skipped)
+    print(f"      {images.format_stats()}")
+    if store is not None:
+        print(f"      {store.format_stats()}")
     
     # 合并内容
     markdown_content = ''.join(markdown_lines)
@@ -175,36 +97,144 @@ def convert_docx_to_markdown(docx_path, output_md_path, images_dir):
     markdown_content = re.sub(r'\n{4,}', '\n\n\n', markdown_content)
     
     print(f"[4/4] 保存Markdown文件: {output_md_path}")
-    with open(output_md_path, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
+    with stage('write', bytes=len(markdown_content)):
+        with open(output_md_path, 'w', encoding='utf-8') as f:
+            f.write(markdown_content)
+    
+    print_stats(markdown_stats(markdown_content))
     
-    # 统计
+    return markdown_content
+
+def convert_docx_to_markdown_stream(docx_path, output_md_path, images_dir, store=None, encoder=WEBP_ENCODER,
+                                    image_threads=DEFAULT_IMAGE_THREADS):
+    """
+    流式转换DOCX为Markdown：不建立整份文档的对象树，也不在内存中拼接整篇Markdown
+    
+    Returns:
+        markdown_stats() 统计（写出时累计）
+    """
+    print(f"[1/4] 流式读取DOCX文件: {docx_path}")
+    with stage('open'):
+        stream = DocxStream(docx_path)
+    
+    with stream, DocxImages(stream.image_blobs, images_dir, store, encoder, image_threads) as images:
+        print(f"[2/4] 转换内容并写入Markdown文件: {output_md_path}（按需提取图片）")
+        stats = {'line_count': 0, 'heading_count': 0, 'image_count': 0, 'table_count': 0}
+        with stage('content') as s, open(output_md_path, 'w', encoding='utf-8') as f:
+            writer = CollapsingWriter(f, 3)
+            for block in stream.blocks():
+                for chunk in block_to_markdown(block, images.url):
+                    writer.write(chunk)
+                    for key, value in markdown_stats(chunk).items():
+                        stats[key] += value
+            writer.flush()
+            # 空行不计入标题/图片/表格，压缩空行只影响总行数
+            stats['line_count'] = writer.newlines + 1
+            s.count(elements=stream.paragraphs + stream.tables, bytes=f.tell())
+        print(f"      {stream.format_stats()}")
+        
+        print(f"\n[3/4] 等待图片编码...")
+        with stage('images') as s:
+            images.finish()
+            s.count(images=images.stats['encoded'], reused=images.stats['reused'], skipped_rels=images.skipped)
+    print(f"      {images.format_stats()}")
+    if store is not None:
+        print(f"      {store.format_stats()}")
+    
+    print(f"[4/4] 已保存Markdown文件: {output_md_path}")
+    print_stats(stats)
+    
+    return stats
+
+def markdown_stats(markdown_content):
+    """Markdown的行数、标题数、图片数、表格数"""
     lines = markdown_content.split('\n')
-    heading_count = len([l for l in lines if l.strip().startswith('#')])
-    image_count = len([l for l in lines if '![' in l])
     table_lines = [l for l in lines if l.strip().startswith('|')]
-    table_count = len([l for l in table_lines if '---' in l])  # 数表格，不是行
-    
+    return {
+        'line_count': len(lines),
+        'heading_count': len([l for l in lines if l.strip().startswith('#')]),
+        'image_count': len([l for l in lines if '![' in l]),
+        'table_count': len([l for l in table_lines if '---' in l]),  # 数表格，不是行
+    }
+
+def print_stats(stats):
     print(f"\n✅ 转换完成！")
     print(f"📊 统计:")
-    print(f"   - 总行数: {len(lines)}")
-    print(f"   - 标题数: {heading_count}")
-    print(f"   - 图片数: {image_count}")
-    print(f"   - 表格数: {table_count}")
-    
-    return markdown_content
+    print(f"   - 总行数: {stats['line_count']}")
+    print(f"   - 标题数: {stats['heading_count']}")
+    print(f"   - 图片数: {stats['image_count']}")
+    print(f"   - 表格数: {stats['table_count']}")
+
+def convert_body(doc, image_url):
+    """
+    按文档顺序把正文的段落和表格转为Markdown片段列表
+
+    image_url(embed_id) 返回图片引用对应的URL，不是可用图片时返回 None（如 DocxImages.url）
+    """
+    markdown_lines = []
+    for block in document_blocks(doc):
+        markdown_lines.extend(block_to_markdown(block, image_url))
+    return markdown_lines
+
+def block_to_markdown(block, image_url):
+    """一个正文事件（docx_stream.Block，段落或表格）的Markdown片段列表"""
+    if block.kind != PARAGRAPH:
+        with stage('tables', tables=1):
+            md_table = table_to_markdown(block.item)
+        return [md_table + '\n\n'] if md_table else []
+    
+    para = block.item
+    
+    # 检测标题
+    if block.style_name.startswith('Heading'):
+        level = int(block.style_name.replace('Heading ', ''))
+        title = para.text.strip()
+        return [f"{'#' * level} {title}\n"] if title else []
+    
+    # 普通段落
+    para_text = ''
+    for run in para.runs:
+        para_text += process_run_formatting(run)
+    
+    # 检查图片
+    for embed_id in block.image_ids:
+        url = image_url(embed_id)
+        if url:
+            para_text += f"\n\n![Image]({url})\n\n"
+    
+    return [para_text.strip() + '\n\n'] if para_text.strip() else []
 
 if __name__ == '__main__':
-    if len(sys.argv) < 4:
-        print("Usage: python3 docx_to_markdown.py <docx_path> <output_md_path> <images_dir>")
+    args, options = split_args(sys.argv[1:])
+    
+    if len(args) < 3:
+        print("Usage: python3 docx_to_markdown.py <docx_path> <output_md_path> <images_dir> [--image-store[=manifest]] [--webp-profile=fast|balanced|max] [--image-threads=N] [--stream] [--report=path] [--no-report] [--profile[=path]] [--trace-memory]")
         sys.exit(1)
     
-    docx_path = sys.argv[1]
-    output_md_path = sys.argv[2]
-    images_dir = sys.argv[3]
+    docx_path = args[0]
+    output_md_path = args[1]
+    images_dir = args[2]
     
     if not os.path.exists(docx_path):
         print(f"❌ 文件不存在: {docx_path}")
         sys.exit(1)
     
-    convert_docx_to_markdown(docx_path, output_md_path, images_dir)
+    try:
+        encoder = profile_option(options)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    instrument = open_instrument(options, 'docx_to_markdown', os.path.dirname(os.path.abspath(output_md_path)))
+    store = open_image_store(options, images_dir, encoder=encoder)
+    try:
+        if options.get('stream'):
+            stats = convert_docx_to_markdown_stream(docx_path, output_md_path, images_dir, store, encoder,
+                                                    image_threads_option(options))
+        else:
+            stats = markdown_stats(convert_docx_to_markdown(docx_path, output_md_path, images_dir, store, encoder,
+                                                            image_threads_option(options)))
+    finally:
+        if store is not None:
+            store.close()
+    instrument.finish(**stats)
@@ -5,6 +5,15 @@
 - 保留段落格式
 - 提取图片并转为WebP格式
 - 智能章节分割
+- --workers=N: 图片提取按页码范围分配到N个进程
+- --image-store[=manifest]: 使用内容寻址图片库，跨运行复用已编码的图片
+- --webp-profile=fast|balanced|max: WebP编码档位（默认max）
+- --page-cache[=path]: 按页指纹缓存提取结果，新版本手册只重新提取改动过的页
+- --table-backend=pdfplumber|pymupdf|auto: 表格提取后端（默认pdfplumber，见 pdf_tables）
+- --table-prefilter[=verify]: 没有线条/矩形/边的页跳过表格检测；verify 时仍检测并报告漏检的页
+- --low-memory / --max-rss=MB: pdfplumber逐页释放缓存，可选内存上限（超过时重新打开文档）
+- --report=path / --no-report / --profile[=path] / --trace-memory: 分阶段耗时与内存的JSON报告（默认写到
+  <输出目录>/.ingest_reports/）和可选的 cProfile 文件（见 instrument）
 """
 
 import sys
@@ -12,72 +21,117 @@ import os
 import json
 import hashlib
 import fitz  # PyMuPDF (用于图片提取)
-import pdfplumber  # 用于表格提取
 from pathlib import Path
 from PIL import Image
 import io
-import re
+from pdf_images import candidate_images, extract_images_parallel, new_scan_stats, format_scan_stats, store_image
+from image_store import open_image_store
+from image_encoding import WEBP_ENCODER, profile_option, save_encoded
+from script_args import split_args, int_option
+from page_cache import open_page_cache, images_kind
+from pdf_memory import PlumberReader, memory_options, peak_rss_mb, format_peak_memory
+from instrument import open_instrument
+from headings import detect_text_headings
+from sections import SectionBuilder
+from pdf_tables import DEFAULT_TABLE_BACKEND, table_backend_option, table_prefilter_option, content_kind
 
-def extract_images_webp(pdf_path, output_dir):
-    """提取PDF图片并转为WebP格式"""
+def extract_page_images(pdf_doc, page, page_num, output_dir, extracted_hashes, seen_xrefs, scan_stats,
+                        store=None, encoder=WEBP_ENCODER):
+    """提取单页图片并转为WebP，extracted_hashes / seen_xrefs 用于跨页去重"""
+    page_images = []
+    
+    # 解码前按xref去重、按元数据过滤小图
+    for img_info in candidate_images(page, seen_xrefs, scan_stats):
+        xref = img_info[0]
+        
+        try:
+            scan_stats['decoded'] += 1
+            base_image = pdf_doc.extract_image(xref)
+            image_bytes = base_image["image"]
+            
+            if store is not None:
+                stored = store_image(store, image_bytes, extracted_hashes, scan_stats)
+                if stored:
+                    filename, width, height = stored
+                    page_images.append({
+                        'filename': filename,
+                        'path': f'/data/knowledge_images/{filename}',
+                        'width': width,
+                        'height': height
+                    })
+                continue
+            
+            img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
+            if img_hash in extracted_hashes:
+                scan_stats['skipped_duplicate'] += 1
+                continue
+            extracted_hashes.add(img_hash)
+            
+            img = Image.open(io.BytesIO(image_bytes))
+            width, height = img.size
+            
+            # 跳过小图
+            if width < 50 or height < 50:
+                continue
+            
+            # 转为WebP
+            filename = f"img_p{page_num + 1}_{img_hash}.webp"
+            filepath = os.path.join(output_dir, filename)
+            
+            save_encoded(img, filepath, encoder)
+            
+            page_images.append({
+                'filename': filename,
+                'path': f'/data/knowledge_images/{filename}',
+                'width': width,
+                'height': height
+            })
+            
+        except Exception as e:
+            continue
+    
+    return page_images
+
+def extract_images_webp(pdf_path, output_dir, workers=0, scan_stats=None, store=None, encoder=WEBP_ENCODER,
+                        page_cache=None):
+    """
+    提取PDF图片并转为WebP格式
+    
+    workers > 1 时按页码范围多进程提取；传入 store 时复用内容寻址图片库中已编码的图片；
+    encoder 为编码档位参数；传入 page_cache 时按页序串行处理，未变化的页直接复用上次的图片映射
+    """
+    if scan_stats is None:
+        scan_stats = new_scan_stats()
+    
+    if workers > 1 and page_cache is None:
+        return extract_images_parallel(pdf_path, output_dir, workers, scan_stats=scan_stats,
+                                       store=store, encoder=encoder)
+    
     images = []
     extracted_hashes = set()
+    seen_xrefs = set()
     
     pdf_doc = fitz.open(pdf_path)
+    kind = images_kind(encoder, store)
     
     for page_num in range(pdf_doc.page_count):
-        page = pdf_doc[page_num]
-        image_list = page.get_images(full=True)
+        def extract(page_num=page_num):
+            return extract_page_images(pdf_doc, pdf_doc[page_num], page_num, output_dir,
+                                       extracted_hashes, seen_xrefs, scan_stats, store, encoder)
         
-        for img_info in image_list:
-            xref = img_info[0]
-            
-            try:
-                base_image = pdf_doc.extract_image(xref)
-                image_bytes = base_image["image"]
-                
-                img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
-                if img_hash in extracted_hashes:
-                    continue
-                extracted_hashes.add(img_hash)
-                
-                img = Image.open(io.BytesIO(image_bytes))
-                width, height = img.size
-                
-                # 跳过小图
-                if width < 50 or height < 50:
-                    continue
-                
-                # 转为WebP
-                filename = f"img_p{page_num + 1}_{img_hash}.webp"
-                filepath = os.path.join(output_dir, filename)
-                
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    bg = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P': img = img.convert('RGBA')
-                    if img.mode in ('RGBA', 'LA'): bg.paste(img, mask=img.split()[-1])
-                    img = bg
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                img.save(filepath, "WEBP", quality=85, method=6)
-                
-                images.append({
-                    'page': page_num + 1,
-                    'filename': filename,
-                    'path': f'/data/knowledge_images/{filename}',
-                    'width': width,
-                    'height': height
-                })
-                
-            except Exception as e:
-                continue
+        if page_cache is not None:
+            page_images = page_cache.page_images(kind, page_num + 1, extract, seen_xrefs, extracted_hashes, output_dir)
+        else:
+            page_images = extract()
+        
+        for img in page_images:
+            images.append({'page': page_num + 1, **img})
     
     pdf_doc.close()
     return images
 
 def table_to_markdown(table_data):
-    """将pdfplumber提取的表格转为Markdown格式"""
+    """将提取的表格（pdfplumber / PyMuPDF 行列表）转为Markdown格式"""
     if not table_data or len(table_data) < 2:
         return None
     
@@ -106,85 +160,114 @@ def table_to_markdown(table_data):
     
     return '\n'.join(md_lines)
 
-def extract_content_structured(pdf_path, images_by_page):
-    """提取PDF内容，保留结构（段落、表格）"""
-    sections = []
-    current_section = {'title': '', 'content': '', 'page_start': 1, 'page_end': 1}
+def extract_content_structured(pdf_path, images_by_page, page_cache=None, low_memory=False, max_rss_mb=0,
+                               table_backend=DEFAULT_TABLE_BACKEND, prefilter=None):
+    """
+    提取PDF内容，保留结构（段落、表格）
     
-    # 章节标题模式
-    chapter_pattern = re.compile(r'^(\d+(?:\.\d+)*)\s+(.+)$')
+    传入 page_cache 时未变化的页直接复用上次的文本和表格；
+    low_memory 时每页取完文本和表格即释放pdfplumber缓存，max_rss_mb 为可选的内存上限；
+    table_backend 为已解析的表格提取后端，传入 prefilter 时没有框线的页跳过表格检测
+    """
+    kind = content_kind(table_backend)
     
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            # 提取表格
-            tables = page.extract_tables()
-            
-            # 提取文本
-            text = page.extract_text() or ''
-            
-            lines = text.split('\n')
+    # 先取出全部页的文本和表格：pdfplumber 纯文本没有字体信息，标题要按编号连续性整体判断
+    pages = []
+    with PlumberReader(pdf_path, low_memory, max_rss_mb, table_backend, prefilter) as reader:
+        for page_num in range(1, reader.page_count + 1):
+            # 提取文本和表格
+            def extract():
+                return reader.text_tables(page_num)
             
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
+            if page_cache is not None:
+                text, tables = page_cache.page_content(kind, page_num, extract)
+            else:
+                text, tables = extract()
+            lines = [line.strip() for line in (text or '').split('\n') if line.strip()]
+            pages.append((page_num, lines, tables))
+        
+        if low_memory:
+            print(f"      {reader.format_stats()}", file=sys.stderr)
+    
+    headings = iter(detect_text_headings((page_num, line) for page_num, lines, _ in pages for line in lines))
+    
+    sections = []
+    current_section = SectionBuilder(page_num=1, title='')
+    
+    for page_num, lines, tables in pages:
+        for line in lines:
+            # 检测章节标题
+            _, _, heading = next(headings)
+            if heading:
+                # 保存上一章节
+                if current_section.has_content:
+                    sections.append(current_section.finalize())
                 
-                # 检测章节标题
-                match = chapter_pattern.match(line)
-                if match and len(line) < 100:  # 标题通常不会太长
-                    # 保存上一章节
-                    if current_section['content'].strip():
-                        sections.append(current_section.copy())
-                    
-                    # 开始新章节
-                    chapter_num = match.group(1)
-                    chapter_title = match.group(2)
-                    current_section = {
-                        'title': line,
-                        'content': f"## {line}\n\n",
-                        'page_start': page_num,
-                        'page_end': page_num
-                    }
-                else:
-                    # 添加到当前章节
-                    current_section['content'] += line + '\n\n'
-                    current_section['page_end'] = page_num
-            
-            # 插入表格（Markdown格式）
-            if tables:
-                for table in tables:
-                    md_table = table_to_markdown(table)
-                    if md_table:
-                        current_section['content'] += '\n' + md_table + '\n\n'
-            
-            # 插入图片
-            if page_num in images_by_page:
-                for img in images_by_page[page_num]:
-                    current_section['content'] += f"![图片]({img['path']})\n\n"
+                # 开始新章节
+                current_section = SectionBuilder(f"## {line}\n\n", page_num=page_num, title=line)
+            else:
+                # 添加到当前章节
+                current_section.append(line + '\n\n', page_num=page_num)
+        
+        # 插入表格（Markdown格式）
+        if tables:
+            for table in tables:
+                md_table = table_to_markdown(table)
+                if md_table:
+                    current_section.append('\n' + md_table + '\n\n')
+        
+        # 插入图片
+        if page_num in images_by_page:
+            for img in images_by_page[page_num]:
+                current_section.append(f"![图片]({img['path']})\n\n")
     
     # 保存最后一章
-    if current_section['content'].strip():
-        sections.append(current_section)
+    if current_section.has_content:
+        sections.append(current_section.finalize())
     
     return sections
 
 def main():
-    if len(sys.argv) < 3:
-        print(json.dumps({'error': 'Usage: extract_pdf_enhanced.py <pdf_path> <output_dir>'}))
+    args, options = split_args(sys.argv[1:])
+    workers = int_option(options, 'workers')
+    low_memory, max_rss_mb = memory_options(options)
+    
+    if len(args) < 2:
+        print(json.dumps({'error': 'Usage: extract_pdf_enhanced.py <pdf_path> <output_dir> [--workers=N] [--image-store[=manifest]] [--webp-profile=fast|balanced|max] [--page-cache[=path]] [--table-backend=pdfplumber|pymupdf|auto] [--table-prefilter[=verify]] [--low-memory] [--max-rss=MB] [--report=path] [--no-report] [--profile[=path]] [--trace-memory]'}))
         sys.exit(1)
     
-    pdf_path = sys.argv[1]
-    output_dir = sys.argv[2]
+    pdf_path = args[0]
+    output_dir = args[1]
     
     if not os.path.exists(pdf_path):
         print(json.dumps({'error': f'PDF not found: {pdf_path}'}))
         sys.exit(1)
     
+    try:
+        encoder = profile_option(options)
+        table_backend = table_backend_option(options)
+        prefilter = table_prefilter_option(options)
+    except ValueError as e:
+        print(json.dumps({'error': str(e)}, ensure_ascii=False))
+        sys.exit(1)
+    
     Path(output_dir).mkdir(parents=True, exist_ok=True)
     
+    instrument = open_instrument(options, 'extract_pdf_enhanced', output_dir)
+    
     print(f"[1/3] 提取图片...", file=sys.stderr)
-    images = extract_images_webp(pdf_path, output_dir)
+    scan_stats = new_scan_stats()
+    with instrument.stage('open'):
+        store = open_image_store(options, output_dir, encoder=encoder)
+        page_cache = open_page_cache(options, pdf_path, output_dir)
+    with instrument.stage('images') as s:
+        images = extract_images_webp(pdf_path, output_dir, workers, scan_stats, store, encoder, page_cache)
+        s.count(images=len(images))
     print(f"      提取了 {len(images)} 张图片", file=sys.stderr)
+    print(f"      {format_scan_stats(scan_stats)}", file=sys.stderr)
+    if store is not None:
+        print(f"      {store.format_stats()}", file=sys.stderr)
+        store.close()
     
     # 按页码组织图片
     images_by_page = {}
@@ -195,8 +278,18 @@ def main():
         images_by_page[page].append(img)
     
     print(f"[2/3] 提取文本和表格...", file=sys.stderr)
-    sections = extract_content_structured(pdf_path, images_by_page)
+    print(f"      表格提取后端: {table_backend}", file=sys.stderr)
+    with instrument.stage('content') as s:
+        sections = extract_content_structured(pdf_path, images_by_page, page_cache, low_memory, max_rss_mb,
+                                              table_backend, prefilter)
+        s.count(sections=len(sections))
     print(f"      提取了 {len(sections)} 个章节", file=sys.stderr)
+    if prefilter is not None:
+        print(f"      {prefilter.format_stats()}", file=sys.stderr)
+    print(f"      {format_peak_memory()}", file=sys.stderr)
+    if page_cache is not None:
+        print(f"      {page_cache.format_stats()}", file=sys.stderr)
+        page_cache.close()
     
     print(f"[3/3] 生成结果...", file=sys.stderr)
     
@@ -207,11 +300,16 @@ def main():
         'sections': sections,
         'stats': {
             'images': len(images),
-            'sections': len(sections)
+            'sections': len(sections),
+            'content_bytes': sum(section['content_bytes'] for section in sections),
+            'peak_memory_mb': round(peak_rss_mb()),
+            'report': instrument.report_path
         }
     }
     
-    print(json.dumps(result, ensure_ascii=False))
+    with instrument.stage('output'):
+        print(json.dumps(result, ensure_ascii=False))
+    instrument.finish(**result['stats'])
 
 if __name__ == '__main__':
     main()
@@ -2,6 +2,12 @@
 """
 PDF Image Extractor using PyMuPDF (fitz)
 Extract all images from PDF and save to specified directory
+--workers=N shards page ranges across N processes
+--image-store[=manifest] reuses images already encoded by earlier runs
+--webp-profile=fast|balanced|max selects the WebP encoder profile (default: max)
+--ndjson streams one JSON record per line as each image is written (see ndjson_output)
+--report=path / --no-report / --profile[=path] / --trace-memory write a per-stage timing and memory
+report (default: <output_dir>/.ingest_reports/) and an optional cProfile dump (see instrument)
 """
 
 import sys
@@ -12,18 +18,69 @@ import fitz  # PyMuPDF
 from pathlib import Path
 from PIL import Image
 import io
+from pdf_images import candidate_images, extract_images_parallel, new_scan_stats, format_scan_stats, store_image
+from image_store import open_image_store
+from image_encoding import WEBP_ENCODER, profile_option, save_encoded
+from script_args import split_args, int_option
+from ndjson_output import emit_record
+from instrument import open_instrument, stage
 
-def extract_images(pdf_path, output_dir):
+def extract_images_sharded(pdf_path, output_dir, workers, scan_stats, store, encoder, on_image=None):
+    """
+    Extract images with page ranges sharded across worker processes
+    
+    Output (images, order, filenames) is identical to the serial path.
+    """
+    def report_error(page, message):
+        print(f"⚠ Page {page}: Failed to extract image - {message}", file=sys.stderr)
+    
+    try:
+        shard_images = extract_images_parallel(pdf_path, output_dir, workers,
+                                               on_error=report_error, scan_stats=scan_stats,
+                                               store=store, encoder=encoder)
+    except Exception as e:
+        print(json.dumps({'error': str(e)}), file=sys.stderr)
+        return []
+    
+    images = []
+    for img in shard_images:
+        images.append({
+            'filename': img['filename'],
+            'page': img['page'],
+            'width': img['width'],
+            'height': img['height'],
+            'path': img['path']
+        })
+        if on_image:
+            on_image(images[-1])
+        print(f"✓ Page {img['page']}: {img['filename']} ({img['width']}x{img['height']})", file=sys.stderr)
+    
+    print(f"\n✅ Total extracted: {len(images)} images ({workers} workers)", file=sys.stderr)
+    print(f"   {format_scan_stats(scan_stats)}", file=sys.stderr)
+    
+    return images
+
+def extract_images(pdf_path, output_dir, workers=0, store=None, encoder=WEBP_ENCODER, on_image=None):
     """
     Extract all images from PDF file
     
     Args:
         pdf_path: Path to PDF file
         output_dir: Directory to save extracted images
+        workers: Process count; > 1 shards page ranges across a process pool
+        store: Optional ImageStore; already-encoded images are reused by content hash
+        encoder: WebP encoder settings (see image_encoding.WEBP_PROFILES)
+        on_image: Optional callback on_image(img), called as soon as each image is written
         
     Returns:
         List of dicts: [{'filename', 'page', 'width', 'height', 'path'}]
     """
+    # Pre-decode filter counters (duplicate xref / small / duplicate bytes / decoded)
+    scan_stats = new_scan_stats()
+    
+    if workers > 1:
+        return extract_images_sharded(pdf_path, output_dir, workers, scan_stats, store, encoder, on_image)
+    
     images = []
     
     # Open PDF
@@ -37,25 +94,45 @@ def extract_images(pdf_path, output_dir):
     
     # Track extracted images by hash to avoid duplicates
     extracted_hashes = set()
+    seen_xrefs = set()
     
     # Iterate through pages
     for page_num in range(pdf_doc.page_count):
         page = pdf_doc[page_num]
-        image_list = page.get_images(full=True)
         
-        for img_index, img_info in enumerate(image_list):
+        # Dedup by xref and drop small images using get_images metadata, before decoding
+        for img_info in candidate_images(page, seen_xrefs, scan_stats):
             xref = img_info[0]  # XREF number
             
             try:
                 # Extract image
+                scan_stats['decoded'] += 1
                 base_image = pdf_doc.extract_image(xref)
                 image_bytes = base_image["image"]
                 image_ext = base_image["ext"]
                 
+                # Content-addressed store: reuse images encoded by earlier runs
+                if store is not None:
+                    stored = store_image(store, image_bytes, extracted_hashes, scan_stats)
+                    if stored:
+                        filename, width, height = stored
+                        images.append({
+                            'filename': filename,
+                            'page': page_num + 1,
+                            'width': width,
+                            'height': height,
+                            'path': f'/data/knowledge_images/{filename}'
+                        })
+                        if on_image:
+                            on_image(images[-1])
+                        print(f"✓ Page {page_num + 1}: {filename} ({width}x{height})", file=sys.stderr)
+                    continue
+                
                 # Calculate hash to avoid duplicates
                 img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
                 
                 if img_hash in extracted_hashes:
+                    scan_stats['skipped_duplicate'] += 1
                     continue
                 
                 extracted_hashes.add(img_hash)
@@ -72,21 +149,8 @@ def extract_images(pdf_path, output_dir):
                 filename = f"img_p{page_num + 1}_{img_hash}.webp"
                 filepath = os.path.join(output_dir, filename)
                 
-                # Convert to WebP for optimal compression
-                # Handle different color modes
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    # Create white background for transparency
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    if img.mode in ('RGBA', 'LA'):
-                        background.paste(img, mask=img.split()[-1])
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Save as WebP (quality 85 for balance between size and quality)
-                img.save(filepath, "WEBP", quality=85, method=6)
+                # Convert to WebP (white background for transparency; profile sets quality/method)
+                save_encoded(img, filepath, encoder)
                 
                 images.append({
                     'filename': filename,
@@ -95,6 +159,8 @@ def extract_images(pdf_path, output_dir):
                     'height': height,
                     'path': f'/data/knowledge_images/{filename}'
                 })
+                if on_image:
+                    on_image(images[-1])
                 
                 print(f"✓ Page {page_num + 1}: {filename} ({width}x{height})", file=sys.stderr)
                 
@@ -105,29 +171,80 @@ def extract_images(pdf_path, output_dir):
     pdf_doc.close()
     
     print(f"\n✅ Total extracted: {len(images)} images", file=sys.stderr)
+    print(f"   {format_scan_stats(scan_stats)}", file=sys.stderr)
     
     return images
 
-def main():
-    if len(sys.argv) < 3:
-        print(json.dumps({'error': 'Usage: extract_pdf_images.py <pdf_path> <output_dir>'}))
-        sys.exit(1)
-    
-    pdf_path = sys.argv[1]
-    output_dir = sys.argv[2]
+def run_extraction(pdf_path, output_dir, options, on_image=None):
+    """
+    Extract images according to CLI options (shared by the CLI and conversion_worker)
     
+    Args:
+        options: Options parsed by split_args (--workers / --image-store / --webp-profile)
+        on_image: Optional callback on_image(img), see extract_images
+        
+    Returns:
+        List of dicts: [{'filename', 'page', 'width', 'height', 'path'}]
+        
+    Raises:
+        FileNotFoundError: PDF file does not exist
+        ValueError: Unknown WebP profile
+    """
     if not os.path.exists(pdf_path):
-        print(json.dumps({'error': f'PDF file not found: {pdf_path}'}))
-        sys.exit(1)
+        raise FileNotFoundError(f'PDF file not found: {pdf_path}')
+    
+    encoder = profile_option(options)
     
     # Ensure output directory exists
     Path(output_dir).mkdir(parents=True, exist_ok=True)
     
+    with stage('open'):
+        store = open_image_store(options, output_dir, encoder=encoder)
+    try:
+        with stage('images') as s:
+            images = extract_images(pdf_path, output_dir, int_option(options, 'workers'), store, encoder, on_image)
+            s.count(images=len(images))
+        return images
+    finally:
+        if store is not None:
+            print(store.format_stats(), file=sys.stderr)
+            store.close()
+
+def main():
+    args, options = split_args(sys.argv[1:])
+    ndjson = bool(options.get('ndjson'))
+    
+    def fail(message, **json_kwargs):
+        if ndjson:
+            emit_record('error', error=message)
+        else:
+            print(json.dumps({'error': message}, **json_kwargs))
+        sys.exit(1)
+    
+    if len(args) < 2:
+        fail('Usage: extract_pdf_images.py <pdf_path> <output_dir> [--workers=N] [--image-store[=manifest]] [--webp-profile=fast|balanced|max] [--ndjson] [--report=path] [--no-report] [--profile[=path]] [--trace-memory]')
+    
+    instrument = open_instrument(options, 'extract_pdf_images', args[1])
+    
     # Extract images
-    images = extract_images(pdf_path, output_dir)
+    on_image = (lambda img: emit_record('image', **img)) if ndjson else None
+    try:
+        images = run_extraction(args[0], args[1], options, on_image)
+    except FileNotFoundError as e:
+        fail(str(e))
+    except ValueError as e:
+        fail(str(e), ensure_ascii=False)
+    
+    # Stream mode: images were already written line by line, finish with a summary record
+    if ndjson:
+        emit_record('stats', success=True, stats={'images': len(images), 'report': instrument.report_path})
+        instrument.finish(images=len(images))
+        return
     
     # Output JSON result to stdout
-    print(json.dumps({'success': True, 'images': images}))
+    with instrument.stage('output'):
+        print(json.dumps({'success': True, 'images': images}))
+    instrument.finish(images=len(images))
 
 if __name__ == '__main__':
     main()
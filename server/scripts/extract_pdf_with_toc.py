@@ -5,75 +5,172 @@
 - 按章节范围提取图片和表格
 - 自动转WebP优化图片
 - 输出结构化Markdown内容
+- --single-pass: 只打开一次PDF，单次遍历完成全部提取
+- --workers=N: 图片提取和章节文本/表格提取分配到N个进程
+- --image-store[=manifest]: 使用内容寻址图片库，跨运行复用已编码的图片
+- --webp-profile=fast|balanced|max: WebP编码档位（默认max）
+- --page-cache[=path]: 按页指纹缓存提取结果，新版本手册只重新提取改动过的页
+- --table-backend=pdfplumber|pymupdf|auto: 表格提取后端（默认pdfplumber，见 pdf_tables）
+- --table-prefilter[=verify]: 没有线条/矩形/边的页跳过表格检测；verify 时仍检测并报告漏检的页
+- --low-memory / --max-rss=MB: pdfplumber逐页释放缓存，可选内存上限（超过时重新打开文档）
+- --checkpoint[=path] / --resume: 定期写检查点，中断后用 --resume 从检查点继续（见 checkpoint）
+- --ndjson: 流式输出，书签、图片、章节就绪后逐行输出（见 ndjson_output）
+- --report=path / --no-report / --profile[=path] / --trace-memory: 分阶段耗时与内存的JSON报告（默认写到
+  <输出目录>/.ingest_reports/）和可选的 cProfile 文件（见 instrument）
 """
 
 import sys
 import os
 import json
 import hashlib
+import time
 import fitz  # PyMuPDF
 import pdfplumber
 from pathlib import Path
 from PIL import Image
 import io
+from concurrent.futures import ProcessPoolExecutor
+from pdf_images import candidate_images, extract_images_parallel, new_scan_stats, format_scan_stats, store_image
+from image_store import open_image_store
+from image_encoding import WEBP_ENCODER, profile_option, save_encoded
+from script_args import split_args, int_option
+from ndjson_output import emit_record, emit_image
+from page_cache import open_page_cache, images_kind
+from sections import SectionBuilder
+from checkpoint import open_checkpoint
+from glyphs import normalize_page
+from pdf_memory import PlumberReader, memory_options, peak_rss_mb, format_peak_memory
+from instrument import open_instrument, stage
+from pdf_tables import (DEFAULT_TABLE_BACKEND, TablePrefilter, table_backend_option, table_prefilter_option,
+                        content_kind, pymupdf_tables)
 
-def extract_images_by_page(pdf_path, output_dir):
-    """提取所有图片并按页码组织，转为WebP"""
-    images_by_page = {}
-    extracted_hashes = set()
+def extract_page_images(pdf_doc, page, page_num, output_dir, extracted_hashes, seen_xrefs, scan_stats,
+                        store=None, encoder=WEBP_ENCODER):
+    """
+    提取单页图片并转为WebP（encoder 为编码档位参数）
     
-    pdf_doc = fitz.open(pdf_path)
+    extracted_hashes / seen_xrefs 用于跨页去重，小图在解码前按元数据过滤；
+    传入 store 时通过内容寻址图片库复用已编码的图片
+    """
+    page_images = []
     
-    for page_num in range(pdf_doc.page_count):
-        page = pdf_doc[page_num]
-        image_list = page.get_images(full=True)
+    for img_info in candidate_images(page, seen_xrefs, scan_stats):
+        xref = img_info[0]
         
-        page_images = []
-        
-        for img_info in image_list:
-            xref = img_info[0]
+        try:
+            scan_stats['decoded'] += 1
+            base_image = pdf_doc.extract_image(xref)
+            image_bytes = base_image["image"]
+            
+            if store is not None:
+                stored = store_image(store, image_bytes, extracted_hashes, scan_stats)
+                if stored:
+                    filename, width, height = stored
+                    page_images.append({
+                        'filename': filename,
+                        'path': f'/data/knowledge_images/{filename}',
+                        'width': width,
+                        'height': height
+                    })
+                continue
             
-            try:
-                base_image = pdf_doc.extract_image(xref)
-                image_bytes = base_image["image"]
-                
-                img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
-                if img_hash in extracted_hashes:
-                    continue
-                extracted_hashes.add(img_hash)
-                
-                img = Image.open(io.BytesIO(image_bytes))
-                width, height = img.size
-                
-                if width < 50 or height < 50:
-                    continue
-                
-                # 转WebP
-                filename = f"img_p{page_num + 1}_{img_hash}.webp"
-                filepath = os.path.join(output_dir, filename)
-                
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    bg = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P': img = img.convert('RGBA')
-                    if img.mode in ('RGBA', 'LA'): bg.paste(img, mask=img.split()[-1])
-                    img = bg
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                img.save(filepath, "WEBP", quality=85, method=6)
-                
-                page_images.append({
-                    'filename': filename,
-                    'path': f'/data/knowledge_images/{filename}',
-                    'width': width,
-                    'height': height
-                })
-                
-            except Exception as e:
+            img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
+            if img_hash in extracted_hashes:
+                scan_stats['skipped_duplicate'] += 1
                 continue
+            extracted_hashes.add(img_hash)
+            
+            img = Image.open(io.BytesIO(image_bytes))
+            width, height = img.size
+            
+            if width < 50 or height < 50:
+                continue
+            
+            # 转WebP
+            filename = f"img_p{page_num + 1}_{img_hash}.webp"
+            filepath = os.path.join(output_dir, filename)
+            
+            save_encoded(img, filepath, encoder)
+            
+            page_images.append({
+                'filename': filename,
+                'path': f'/data/knowledge_images/{filename}',
+                'width': width,
+                'height': height
+            })
+            
+        except Exception as e:
+            continue
+    
+    return page_images
+
+def restore_images(checkpoint, images_by_page, extracted_hashes, seen_xrefs, scan_stats, on_image=None):
+    """从检查点恢复图片映射和跨页去重状态，返回已完成的页数（恢复的图片按页序重新回调 on_image）"""
+    pages_done = checkpoint.get('pages_done', 0) if checkpoint is not None else 0
+    if not pages_done:
+        return 0
+    
+    for page_num, page_images in checkpoint.get('images_by_page', {}).items():
+        images_by_page[int(page_num)] = page_images
+        if on_image:
+            for img in page_images:
+                on_image(int(page_num), img)
+    extracted_hashes.update(checkpoint.get('extracted_hashes', []))
+    seen_xrefs.update(checkpoint.get('seen_xrefs', []))
+    scan_stats.update(checkpoint.get('scan_stats', {}))
+    return pages_done
+
+def extract_images_by_page(pdf_path, output_dir, workers=0, scan_stats=None, store=None, encoder=WEBP_ENCODER,
+                           on_image=None, page_cache=None, checkpoint=None):
+    """
+    提取所有图片并按页码组织，转为WebP（workers > 1 时按页码范围多进程提取）
+    
+    on_image(page_num, img) 在每张图片就绪后立即回调（用于流式输出）；
+    传入 page_cache 时按页序串行处理，未变化的页直接复用上次的图片映射；
+    传入 checkpoint 时按页序串行处理，定期记录进度并从上次完成的页继续
+    """
+    images_by_page = {}
+    if scan_stats is None:
+        scan_stats = new_scan_stats()
+    
+    if workers > 1 and page_cache is None and checkpoint is None:
+        for img in extract_images_parallel(pdf_path, output_dir, workers,
+                                           scan_stats=scan_stats, store=store, encoder=encoder):
+            page_image = {
+                'filename': img['filename'],
+                'path': img['path'],
+                'width': img['width'],
+                'height': img['height']
+            }
+            images_by_page.setdefault(img['page'], []).append(page_image)
+            if on_image:
+                on_image(img['page'], page_image)
+        return images_by_page
+    
+    extracted_hashes = set()
+    seen_xrefs = set()
+    pages_done = restore_images(checkpoint, images_by_page, extracted_hashes, seen_xrefs, scan_stats, on_image)
+    
+    pdf_doc = fitz.open(pdf_path)
+    kind = images_kind(encoder, store)
+    
+    for page_num in range(pages_done, pdf_doc.page_count):
+        def extract(page_num=page_num):
+            return extract_page_images(pdf_doc, pdf_doc[page_num], page_num, output_dir,
+                                       extracted_hashes, seen_xrefs, scan_stats, store, encoder)
         
+        if page_cache is not None:
+            page_images = page_cache.page_images(kind, page_num + 1, extract, seen_xrefs, extracted_hashes, output_dir)
+        else:
+            page_images = extract()
         if page_images:
             images_by_page[page_num + 1] = page_images
+            if on_image:
+                for img in page_images:
+                    on_image(page_num + 1, img)
+        if checkpoint is not None:
+            checkpoint.update(pages_done=page_num + 1, images_by_page=images_by_page, extracted_hashes=extracted_hashes,
+                              seen_xrefs=seen_xrefs, scan_stats=scan_stats, force=page_num + 1 == pdf_doc.page_count)
     
     pdf_doc.close()
     return images_by_page
@@ -111,104 +208,496 @@ def table_to_markdown(table_data):
     
     return '\n' + '\n'.join(md_lines) + '\n'
 
-def extract_content_by_toc(pdf_path, toc, images_by_page):
-    """基于书签提取章节内容"""
-    sections = []
+def render_page_content(text, tables, page_images):
+    """将单页的文本、表格和图片渲染为Markdown片段"""
+    content = ''
     
+    if text:
+        # 简单清理：移除过多的空行
+        lines = [line.strip() for line in text.split('\n') if line.strip()]
+        content += '\n\n'.join(lines) + '\n\n'
+    
+    for table in tables:
+        md_table = table_to_markdown(table)
+        if md_table:
+            content += md_table + '\n'
+    
+    for img in page_images or []:
+        content += f"![图片]({img['path']})\n\n"
+    
+    return content
+
+def iter_sections(toc, page_count, page_content):
+    """按书签页码范围逐个拼装章节（生成器），page_content(page_num) 返回该页的Markdown片段"""
+    for i, (level, title, page_start) in enumerate(toc):
+        # 计算页码范围
+        if i + 1 < len(toc):
+            page_end = toc[i + 1][2] - 1
+        else:
+            page_end = page_count
+        
+        section = SectionBuilder(f"{'#' * (level + 1)} {title}\n\n", page_num=page_start, title=title, level=level)
+        
+        for page_num in range(page_start, page_end + 1):
+            if page_num > page_count:
+                break
+            section.append(page_content(page_num))
+        
+        section.page_end = page_end
+        yield section.finalize(strip=True)
+
+def assemble_sections(toc, page_count, page_content):
+    """按书签页码范围拼装全部章节"""
+    return list(iter_sections(toc, page_count, page_content))
+
+def section_pages(toc, i, page_count):
+    """第i个书签对应章节需要读取的页码（与 assemble_sections 的范围一致）"""
+    page_start = toc[i][2]
+    page_end = toc[i + 1][2] - 1 if i + 1 < len(toc) else page_count
+    return [page_num for page_num in range(page_start, page_end + 1) if page_num <= page_count]
+
+def chunk_toc_pages(toc, page_count, chunks):
+    """将书签按顺序切分为连续分组，返回每组需要提取的页码列表（按页数均衡）"""
+    groups = []
+    current = []
+    target = max(1, page_count // max(1, chunks))
+    
+    for i in range(len(toc)):
+        for page_num in section_pages(toc, i, page_count):
+            if page_num not in current:
+                current.append(page_num)
+        if len(current) >= target:
+            groups.append(current)
+            current = []
+    
+    if current:
+        groups.append(current)
+    
+    return groups
+
+def _extract_pages_text_tables(pdf_path, page_nums, table_backend=DEFAULT_TABLE_BACKEND, prefilter_verify=None):
+    """
+    worker：提取一组页面的文本和表格，每页处理完立即释放缓存
+    
+    prefilter_verify 不为 None 时启用表格预检；返回 (结果, 预检统计)
+    """
+    prefilter = TablePrefilter(prefilter_verify) if prefilter_verify is not None else None
+    
+    with PlumberReader(pdf_path, low_memory=True, table_backend=table_backend, prefilter=prefilter) as reader:
+        results = {page_num: reader.text_tables(page_num) for page_num in page_nums}
+    
+    return results, prefilter.counts() if prefilter is not None else None
+
+def iter_content_by_toc_parallel(pdf_path, toc, images_by_page, workers, page_cache=None,
+                                 table_backend=DEFAULT_TABLE_BACKEND, prefilter=None):
+    """
+    多进程按书签提取章节内容（生成器）
+    
+    书签按顺序切分为连续的页码分组，每个分组在worker中单独打开、处理并关闭PDF，
+    worker内存只与分组大小相关；主进程按书签顺序重新拼装章节，结果与串行一致。
+    分组按顺序取回结果，章节所需的分组完成后即可产出，无需等待全部分组。
+    传入 page_cache 时命中缓存的页不再分发给worker；prefilter 汇总各worker的预检统计。
+    """
     with pdfplumber.open(pdf_path) as pdf:
-        for i, (level, title, page_start) in enumerate(toc):
-            # 计算页码范围
-            if i + 1 < len(toc):
-                page_end = toc[i + 1][2] - 1
-            else:
-                page_end = len(pdf.pages)
-            
-            # 提取该章节的文本和表格
-            content = f"{'#' * (level + 1)} {title}\n\n"
-            
-            for page_num in range(page_start, page_end + 1):
-                if page_num > len(pdf.pages):
-                    break
-                
-                page = pdf.pages[page_num - 1]
-                
-                # 提取文本
-                text = page.extract_text()
-                if text:
-                    # 简单清理：移除过多的空行
-                    lines = [line.strip() for line in text.split('\n') if line.strip()]
-                    content += '\n\n'.join(lines) + '\n\n'
-                
-                # 提取表格
-                tables = page.extract_tables()
-                for table in tables:
-                    md_table = table_to_markdown(table)
-                    if md_table:
-                        content += md_table + '\n'
-                
-                # 插入图片
-                if page_num in images_by_page:
-                    for img in images_by_page[page_num]:
-                        content += f"![图片]({img['path']})\n\n"
+        page_count = len(pdf.pages)
+    
+    page_data = {}
+    groups = chunk_toc_pages(toc, page_count, workers * 4)
+    kind = content_kind(table_backend)
+    
+    if page_cache is not None:
+        for pages in groups:
+            for page_num in pages:
+                cached = page_cache.lookup(kind, page_num)
+                if cached is not None:
+                    page_data[page_num] = (cached['text'], cached['tables'])
+                    page_cache.mark(page_num, True)
+        groups = [[page_num for page_num in pages if page_num not in page_data] for pages in groups]
+        groups = [pages for pages in groups if pages]
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        prefilter_verify = prefilter.verify if prefilter is not None else None
+        pending = [pool.submit(_extract_pages_text_tables, pdf_path, pages, table_backend, prefilter_verify)
+                   for pages in groups]
+        pending.reverse()
+        
+        def page_content(page_num):
+            while page_num not in page_data:
+                results, prefilter_counts = pending.pop().result()
+                if prefilter is not None:
+                    prefilter.merge(prefilter_counts)
+                if page_cache is not None:
+                    for extracted_page, (text, tables) in results.items():
+                        page_cache.save(kind, extracted_page, {'text': text, 'tables': tables})
+                        page_cache.mark(extracted_page, False)
+                page_data.update(results)
+            text, tables = page_data[page_num]
+            return render_page_content(text, tables, images_by_page.get(page_num))
+        
+        yield from iter_sections(toc, page_count, page_content)
+
+def iter_content_by_toc(pdf_path, toc, images_by_page, workers=0, page_cache=None, low_memory=False, max_rss_mb=0,
+                        table_backend=DEFAULT_TABLE_BACKEND, prefilter=None):
+    """
+    基于书签逐个提取章节内容（生成器，workers > 1 时按书签分组多进程提取）
+    
+    传入 page_cache 时未变化的页直接复用上次的文本和表格；
+    low_memory 时每页取完文本和表格即释放pdfplumber缓存，max_rss_mb 为可选的内存上限
+    （多进程路径的worker本身已逐页释放）；table_backend 为已解析的表格提取后端，
+    传入 prefilter 时没有框线的页跳过表格检测
+    """
+    if workers > 1:
+        yield from iter_content_by_toc_parallel(pdf_path, toc, images_by_page, workers, page_cache, table_backend,
+                                                prefilter)
+        return
+    
+    kind = content_kind(table_backend)
+    
+    with PlumberReader(pdf_path, low_memory, max_rss_mb, table_backend, prefilter) as reader:
+        def page_content(page_num):
+            def extract():
+                return reader.text_tables(page_num)
             
-            sections.append({
-                'title': title,
-                'level': level,
-                'content': content.strip(),
-                'page_start': page_start,
-                'page_end': page_end
-            })
+            if page_cache is not None:
+                text, tables = page_cache.page_content(kind, page_num, extract)
+            else:
+                text, tables = extract()
+            return render_page_content(text, tables, images_by_page.get(page_num))
+        
+        yield from iter_sections(toc, reader.page_count, page_content)
+        
+        if low_memory:
+            print(f"      {reader.format_stats()}", file=sys.stderr)
+
+def extract_content_by_toc(pdf_path, toc, images_by_page, workers=0, page_cache=None, low_memory=False, max_rss_mb=0,
+                           table_backend=DEFAULT_TABLE_BACKEND, prefilter=None):
+    """基于书签提取章节内容（workers > 1 时按书签分组多进程提取）"""
+    return list(iter_content_by_toc(pdf_path, toc, images_by_page, workers, page_cache, low_memory, max_rss_mb,
+                                    table_backend, prefilter))
+
+def iter_content_with_checkpoint(pdf_path, toc, images_by_page, checkpoint=None, **kwargs):
+    """
+    iter_content_by_toc 的断点续传版本（生成器）
     
-    return sections
+    先给出检查点中已完成的章节，再从下一个书签继续提取，每个新章节写入检查点；
+    每个章节只依赖自身和下一个书签的页码，从中间的书签开始提取结果不变
+    """
+    done = 0
+    if checkpoint is not None:
+        for section in checkpoint.saved_sections():
+            done += 1
+            yield section
+    
+    for section in iter_content_by_toc(pdf_path, toc[done:], images_by_page, **kwargs):
+        if checkpoint is not None:
+            checkpoint.add_section(section)
+        yield section
+
+def iter_single_pass(pdf_doc, toc, output_dir, images_by_page, scan_stats=None, store=None, encoder=WEBP_ENCODER,
+                     on_image=None, page_cache=None, prefilter=None, checkpoint=None):
+    """
+    单次遍历页面，同时提取文本、表格和图片，逐个产出章节（生成器）
+    
+    文本使用PyMuPDF的 get_text，表格使用 find_tables，
+    避免分别用 fitz / pdfplumber 重复打开和解析同一份文档。
+    页面按章节需要依次处理，章节的最后一页处理完即产出该章节；
+    每页的内容只保留到用到它的最后一个章节产出为止，内存不随文档长度增长。
+    图片写入 images_by_page，on_image(page_num, img) 在每张图片就绪后立即回调（用于流式输出）。
+    传入 page_cache 时未变化的页直接复用上次的图片映射、文本和表格；
+    传入 prefilter 时没有框线的页跳过 find_tables；
+    传入 checkpoint 时定期记录已完成的页和尚未用完的页内容，先给出已产出的章节，再从上次完成的页继续。
+    """
+    page_count = pdf_doc.page_count
+    extracted_hashes = set()
+    seen_xrefs = set()
+    if scan_stats is None:
+        scan_stats = new_scan_stats()
+    
+    done = 0
+    if checkpoint is not None:
+        for section in checkpoint.saved_sections():
+            done += 1
+            yield section
+    
+    # 每页还要被多少个未产出的章节用到（为 0 的页不保留内容）
+    uses = {}
+    for i in range(done, len(toc)):
+        for page_num in section_pages(toc, i, page_count):
+            uses[page_num] = uses.get(page_num, 0) + 1
+    
+    kind = images_kind(encoder, store)
+    pages_done = restore_images(checkpoint, images_by_page, extracted_hashes, seen_xrefs, scan_stats, on_image)
+    page_contents = {}
+    if pages_done:
+        page_contents = {int(page_num): content for page_num, content in checkpoint.get('page_contents', {}).items()
+                         if uses.get(int(page_num))}
+    
+    def process_page(page_num):
+        page = pdf_doc[page_num]
+        
+        def extract_images():
+            with stage('images', pages=1) as s:
+                page_images = extract_page_images(pdf_doc, page, page_num, output_dir,
+                                                  extracted_hashes, seen_xrefs, scan_stats, store, encoder)
+                s.count(images=len(page_images))
+            return page_images
+        
+        def extract_content():
+            with stage('text', pages=1):
+                text = page.get_text()
+            with stage('tables', pages=1) as s:
+                if prefilter is not None:
+                    tables = prefilter.tables(page_num + 1, page, 'pymupdf')
+                else:
+                    tables = pymupdf_tables(page)
+                s.count(tables=len(tables))
+            return normalize_page(text, tables)
+        
+        if page_cache is not None:
+            page_images = page_cache.page_images(kind, page_num + 1, extract_images, seen_xrefs,
+                                                 extracted_hashes, output_dir)
+            text, tables = page_cache.page_content('pymupdf', page_num + 1, extract_content)
+        else:
+            page_images = extract_images()
+            text, tables = extract_content()
+        if page_images:
+            images_by_page[page_num + 1] = page_images
+            if on_image:
+                for img in page_images:
+                    on_image(page_num + 1, img)
+        
+        if uses.get(page_num + 1):
+            page_contents[page_num + 1] = render_page_content(text, tables, page_images)
+        if checkpoint is not None:
+            checkpoint.update(pages_done=page_num + 1, images_by_page=images_by_page, page_contents=page_contents,
+                              extracted_hashes=extracted_hashes, seen_xrefs=seen_xrefs, scan_stats=scan_stats,
+                              force=page_num + 1 == page_count)
+    
+    def advance(page_num):
+        """处理到第 page_num 页（含）为止"""
+        nonlocal pages_done
+        while pages_done < page_num:
+            process_page(pages_done)
+            pages_done += 1
+    
+    consumed = []
+    
+    def page_content(page_num):
+        if page_num < 1:
+            return ''
+        advance(page_num)
+        uses[page_num] -= 1
+        consumed.append(page_num)
+        return page_contents[page_num]
+    
+    for section in iter_sections(toc[done:], page_count, page_content):
+        if checkpoint is not None:
+            checkpoint.add_section(section)
+        # 章节记入检查点后再释放它用完的页，检查点中总有未产出章节需要的页
+        for page_num in consumed:
+            if not uses[page_num]:
+                page_contents.pop(page_num, None)
+        consumed.clear()
+        yield section
+    
+    # 最后一个章节之后没有书签覆盖的页仍要提取图片
+    advance(page_count)
+
+def extract_single_pass(pdf_path, output_dir, scan_stats=None, store=None, encoder=WEBP_ENCODER, on_image=None,
+                        page_cache=None, prefilter=None, checkpoint=None):
+    """
+    单次打开PDF、单次遍历页面，同时提取书签、文本、表格和图片（一次性返回全部章节，见 iter_single_pass）
+    
+    Returns:
+        (toc, images_by_page, sections, page_count)
+    """
+    with fitz.open(pdf_path) as pdf_doc:
+        toc = pdf_doc.get_toc()
+        if not toc:
+            return toc, {}, [], pdf_doc.page_count
+        
+        images_by_page = {}
+        sections = list(iter_single_pass(pdf_doc, toc, output_dir, images_by_page, scan_stats, store, encoder,
+                                         on_image, page_cache, prefilter, checkpoint))
+        return toc, images_by_page, sections, pdf_doc.page_count
 
 def main():
-    if len(sys.argv) < 3:
-        print(json.dumps({'error': 'Usage: extract_pdf_with_toc.py <pdf_path> <output_dir>'}))
+    args, options = split_args(sys.argv[1:])
+    single_pass = bool(options.get('single-pass'))
+    workers = int_option(options, 'workers')
+    ndjson = bool(options.get('ndjson'))
+    low_memory, max_rss_mb = memory_options(options)
+    on_image = emit_image if ndjson else None
+    
+    def fail(message, **json_kwargs):
+        if ndjson:
+            emit_record('error', error=message)
+        else:
+            print(json.dumps({'error': message}, **json_kwargs))
         sys.exit(1)
     
-    pdf_path = sys.argv[1]
-    output_dir = sys.argv[2]
+    if len(args) < 2:
+        fail('Usage: extract_pdf_with_toc.py <pdf_path> <output_dir> [--single-pass] [--workers=N] [--image-store[=manifest]] [--webp-profile=fast|balanced|max] [--page-cache[=path]] [--table-backend=pdfplumber|pymupdf|auto] [--table-prefilter[=verify]] [--low-memory] [--max-rss=MB] [--checkpoint[=path]] [--resume] [--ndjson] [--report=path] [--no-report] [--profile[=path]] [--trace-memory]')
+    
+    pdf_path = args[0]
+    output_dir = args[1]
     
     if not os.path.exists(pdf_path):
-        print(json.dumps({'error': f'PDF not found: {pdf_path}'}))
-        sys.exit(1)
+        fail(f'PDF not found: {pdf_path}')
+    
+    try:
+        encoder = profile_option(options)
+        table_backend = table_backend_option(options)
+        prefilter = table_prefilter_option(options)
+    except ValueError as e:
+        fail(str(e), ensure_ascii=False)
     
     Path(output_dir).mkdir(parents=True, exist_ok=True)
     
-    print("[1/4] 读取PDF书签...", file=sys.stderr)
-    pdf_doc = fitz.open(pdf_path)
-    toc = pdf_doc.get_toc()
-    pdf_doc.close()
+    started_at = time.perf_counter()
+    instrument = open_instrument(options, 'extract_pdf_with_toc', output_dir)
+    scan_stats = new_scan_stats()
+    with instrument.stage('open'):
+        store = open_image_store(options, output_dir, encoder=encoder)
+        page_cache = open_page_cache(options, pdf_path, output_dir)
+        checkpoint = None
+        if page_cache is not None:
+            if options.get('checkpoint') or options.get('resume'):
+                print("      已启用页缓存，重跑时直接复用已完成的页，忽略 --checkpoint / --resume", file=sys.stderr)
+        else:
+            checkpoint = open_checkpoint(options, pdf_path, output_dir, single_pass=single_pass, encoder=encoder,
+                                         image_store=bool(store), table_backend=table_backend)
+            if checkpoint is not None:
+                print(f"      {checkpoint.format_stats()}", file=sys.stderr)
     
-    if not toc:
-        print(json.dumps({'error': 'PDF没有书签（TOC）！请确保导出PDF时勾选了"创建书签"选项。'}))
-        sys.exit(1)
+    if single_pass:
+        print("[1/2] 单次遍历提取书签、图片、文本和表格...", file=sys.stderr)
+        pdf_doc = fitz.open(pdf_path)
+        toc = pdf_doc.get_toc()
+        page_count = pdf_doc.page_count
+        
+        if not toc:
+            pdf_doc.close()
+            fail('PDF没有书签（TOC）！请确保导出PDF时勾选了"创建书签"选项。')
+        
+        if ndjson:
+            # 书签在打开时已知，先于图片和章节输出
+            emit_record('toc', toc=toc)
+        
+        images_by_page = {}
+        content_sections = iter_single_pass(pdf_doc, toc, output_dir, images_by_page, scan_stats, store, encoder,
+                                            on_image, page_cache, prefilter, checkpoint)
+        with instrument.stage('single_pass') as s:
+            if ndjson:
+                # 章节的最后一页处理完即输出，不在内存中保留全部章节
+                sections = []
+                section_count = 0
+                content_bytes = 0
+                for section in content_sections:
+                    emit_record('section', index=section_count, **section)
+                    section_count += 1
+                    content_bytes += section['content_bytes']
+            else:
+                sections = list(content_sections)
+                section_count = len(sections)
+                content_bytes = sum(section['content_bytes'] for section in sections)
+            s.count(pages=page_count, sections=section_count)
+        pdf_doc.close()
+        
+        total_images = sum(len(imgs) for imgs in images_by_page.values())
+        print(f"      找到 {len(toc)} 个书签，提取了 {total_images} 张图片，{section_count} 个章节", file=sys.stderr)
+        print(f"      {format_scan_stats(scan_stats)}", file=sys.stderr)
+        print("[2/2] 生成结果...", file=sys.stderr)
+    else:
+        print("[1/4] 读取PDF书签...", file=sys.stderr)
+        with instrument.stage('toc') as s:
+            pdf_doc = fitz.open(pdf_path)
+            toc = pdf_doc.get_toc()
+            page_count = pdf_doc.page_count
+            pdf_doc.close()
+            s.count(bookmarks=len(toc))
+        
+        if not toc:
+            fail('PDF没有书签（TOC）！请确保导出PDF时勾选了"创建书签"选项。')
+        
+        print(f"      找到 {len(toc)} 个书签", file=sys.stderr)
+        if ndjson:
+            emit_record('toc', toc=toc)
+        
+        print("[2/4] 提取图片并转WebP...", file=sys.stderr)
+        with instrument.stage('images') as s:
+            images_by_page = extract_images_by_page(pdf_path, output_dir, workers, scan_stats, store, encoder,
+                                                    on_image, page_cache, checkpoint)
+            total_images = sum(len(imgs) for imgs in images_by_page.values())
+            s.count(pages=page_count, images=total_images)
+        print(f"      提取了 {total_images} 张图片", file=sys.stderr)
+        print(f"      {format_scan_stats(scan_stats)}", file=sys.stderr)
+        
+        print("[3/4] 按书签提取章节内容...", file=sys.stderr)
+        print(f"      表格提取后端: {table_backend}", file=sys.stderr)
+        content_sections = iter_content_with_checkpoint(pdf_path, toc, images_by_page, checkpoint, workers=workers,
+                                                        page_cache=page_cache, low_memory=low_memory,
+                                                        max_rss_mb=max_rss_mb, table_backend=table_backend,
+                                                        prefilter=prefilter)
+        with instrument.stage('content') as s:
+            if ndjson:
+                # 逐章节输出，不在内存中保留全部章节
+                sections = []
+                section_count = 0
+                content_bytes = 0
+                for section in content_sections:
+                    emit_record('section', index=section_count, **section)
+                    section_count += 1
+                    content_bytes += section['content_bytes']
+            else:
+                sections = list(content_sections)
+                section_count = len(sections)
+                content_bytes = sum(section['content_bytes'] for section in sections)
+            s.count(sections=section_count, bytes=content_bytes)
+        print(f"      提取了 {section_count} 个章节", file=sys.stderr)
+        
+        print("[4/4] 生成结果...", file=sys.stderr)
     
-    print(f"      找到 {len(toc)} 个书签", file=sys.stderr)
+    if store is not None:
+        print(f"      {store.format_stats()}", file=sys.stderr)
+        store.close()
+    if page_cache is not None:
+        print(f"      {page_cache.format_stats()}", file=sys.stderr)
+        page_cache.close()
+    if prefilter is not None:
+        print(f"      {prefilter.format_stats()}", file=sys.stderr)
+    if checkpoint is not None:
+        # 提取已全部完成，之后只剩输出
+        checkpoint.complete()
     
-    print("[2/4] 提取图片并转WebP...", file=sys.stderr)
-    images_by_page = extract_images_by_page(pdf_path, output_dir)
-    total_images = sum(len(imgs) for imgs in images_by_page.values())
-    print(f"      提取了 {total_images} 张图片", file=sys.stderr)
+    elapsed = time.perf_counter() - started_at
+    print(f"      耗时 {elapsed:.2f}s，{page_count / elapsed if elapsed else 0:.1f} 页/秒 ({page_count} 页)，"
+          f"{format_peak_memory()}", file=sys.stderr)
     
-    print("[3/4] 按书签提取章节内容...", file=sys.stderr)
-    sections = extract_content_by_toc(pdf_path, toc, images_by_page)
-    print(f"      提取了 {len(sections)} 个章节", file=sys.stderr)
+    stats = {
+        'bookmarks': len(toc),
+        'images': total_images,
+        'sections': section_count,
+        'content_bytes': content_bytes,
+        'peak_memory_mb': round(peak_rss_mb()),
+        'report': instrument.report_path
+    }
     
-    print("[4/4] 生成结果...", file=sys.stderr)
+    if ndjson:
+        emit_record('stats', success=True, stats=stats)
+        instrument.finish(pages=page_count, **stats)
+        return
     
     result = {
         'success': True,
         'toc': toc,
         'sections': sections,
-        'stats': {
-            'bookmarks': len(toc),
-            'images': total_images,
-            'sections': len(sections)
-        }
+        'stats': stats
     }
     
-    print(json.dumps(result, ensure_ascii=False))
+    with instrument.stage('output'):
+        print(json.dumps(result, ensure_ascii=False))
+    instrument.finish(pages=page_count, **stats)
 
 if __name__ == '__main__':
     main()
@@ -2,93 +2,98 @@
 """
 修复MAVO Edge 6K PDF操作说明书的编码问题
 并重新提取内容到数据库
+- 映射表见 glyphs（乱码字 + 康熙部首/兼容汉字规范化），编译为 str.translate 表，每个字段只扫描一次
+- 新的提取已在提取时规范化文本，本脚本只用于修复数据库中已有的文章
+- 只修复标题、摘要或正文含有乱码标记字的文章（返、项、览 等乱码本身是常用字，已规范化的文章不会被改写）；
+  其他文章只做部首规范化。--force: 所有文章都按乱码修复（仅用于确认全部来自编码错误的旧导入）
+- 按 id 分批读取（--chunk-size=N，默认200），每批用 executemany 更新并立即提交，
+  不长时间持有写锁，可以在运行中的数据库上执行
+- --dry-run: 只统计需要修复的文章，不写入
 """
 
 import sqlite3
 import sys
 import os
+from glyphs import GARBLED_MAP, normalize_glyphs, is_garbled
+from script_args import split_args, int_option
+
+# 字符映射表（乱码 → 正确字符），保留原名供其他脚本引用
+CHAR_MAP = GARBLED_MAP
+
+DEFAULT_CHUNK_SIZE = 200
+
+def fix_text(text, repair=None):
+    """修复文本中的乱码字符（repair 含义同 normalize_glyphs，None 时按文本是否含乱码标记字判断）"""
+    return normalize_glyphs(text, repair=repair)
+
+def fix_database_content(db_path, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, force=False):
+    """
+    修复数据库中所有Manual类文章的title、summary和content
+
+    Args:
+        force: 不检查乱码标记字，所有文章都按乱码修复
+    """
+
+    conn = sqlite3.connect(db_path, timeout=30)
+
+    total = conn.execute("SELECT COUNT(*) FROM knowledge_articles WHERE category = 'Manual'").fetchone()[0]
+    print(f"找到 {total} 篇Manual类文章")
 
-# 字符映射表（乱码 → 正确字符）
-CHAR_MAP = {
-    '弼': '当',
-    '丌': '不',
-    '迕': '进',
-    '劢': '动',
-    '返': '这',
-    '秱': '移',
-    '卐': '卓',
-    '巫': '已',
-    '乊': '之',
-    '叏': '取',
-    '吭': '启',
-    '项': '须',
-    '枂': '析',
-    '轲': '载',
-    '匘': '匹',
-    '览': '浏',
-    '劣': '助',
-    '亍': '于',
-    '卑': '单',
-}
-
-def fix_text(text):
-    """修复文本中的乱码字符"""
-    if not text:
-        return text
-    
-    for wrong, correct in CHAR_MAP.items():
-        text = text.replace(wrong, correct)
-    
-    return text
-
-def fix_database_content(db_path):
-    """修复数据库中所有Manual类文章的content和summary"""
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # 获取所有Manual类文章
-    cursor.execute("""
-        SELECT id, title, summary, content 
-        FROM knowledge_articles 
-        WHERE category = 'Manual'
-    """)
-    
-    articles = cursor.fetchall()
-    print(f"找到 {len(articles)} 篇Manual类文章")
-    
     fixed_count = 0
-    for article_id, title, summary, content in articles:
-        # 修复标题、摘要和正文
-        fixed_title = fix_text(title)
-        fixed_summary = fix_text(summary)
-        fixed_content = fix_text(content)
-        
-        # 检查是否有变化
-        if fixed_title != title or fixed_summary != summary or fixed_content != content:
-            cursor.execute("""
-                UPDATE knowledge_articles 
-                SET title = ?, summary = ?, content = ?
-                WHERE id = ?
-            """, (fixed_title, fixed_summary, fixed_content, article_id))
-            fixed_count += 1
-            print(f"✓ 修复文章 #{article_id}: {title[:30]}...")
-    
-    conn.commit()
+    last_id = 0
+    while True:
+        # 按主键分批读取，每批读完再写，读写不交错
+        rows = conn.execute("""
+            SELECT id, title, summary, content
+            FROM knowledge_articles
+            WHERE category = 'Manual' AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updates = []
+        for article_id, title, summary, content in rows:
+            # 按整篇文章判断是否乱码（标题、摘要可能不含标记字），再修复标题、摘要和正文
+            repair = force or any(is_garbled(text) for text in (title, summary, content))
+            fixed_title = fix_text(title, repair)
+            fixed_summary = fix_text(summary, repair)
+            fixed_content = fix_text(content, repair)
+
+            # 检查是否有变化
+            if fixed_title != title or fixed_summary != summary or fixed_content != content:
+                updates.append((fixed_title, fixed_summary, fixed_content, article_id))
+                print(f"✓ 修复文章 #{article_id}: {(title or '')[:30]}...")
+
+        if updates and not dry_run:
+            with conn:
+                conn.executemany("""
+                    UPDATE knowledge_articles
+                    SET title = ?, summary = ?, content = ?
+                    WHERE id = ?
+                """, updates)
+        fixed_count += len(updates)
+
     conn.close()
-    
-    print(f"\n✅ 完成！共修复 {fixed_count} 篇文章")
+
+    action = "需要修复" if dry_run else "共修复"
+    print(f"\n✅ 完成！{action} {fixed_count} 篇文章")
     return fixed_count
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python fix_pdf_encoding.py <database_path>")
+    args, options = split_args(sys.argv[1:])
+
+    if not args:
+        print("Usage: python fix_pdf_encoding.py <database_path> [--chunk-size=N] [--dry-run] [--force]")
         sys.exit(1)
-    
-    db_path = sys.argv[1]
-    
+
+    db_path = args[0]
+
     if not os.path.exists(db_path):
         print(f"错误：数据库文件不存在: {db_path}")
         sys.exit(1)
-    
-    fix_database_content(db_path)
+
+    fix_database_content(db_path, max(1, int_option(options, 'chunk-size', DEFAULT_CHUNK_SIZE)),
+                         dry_run=bool(options.get('dry-run')), force=bool(options.get('force')))
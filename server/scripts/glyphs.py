@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+PDF提取文本的字形规范化（在提取时处理，乱码不再写入数据库）
+- 康熙部首（U+2F00–2FDF）、CJK部首补充（U+2E80–2EFF）、CJK兼容表意文字（U+F900–FAFF、U+2F800–2FA1F）
+  按 NFKC 映射为对应的统一汉字：PDF字体把部首字形当作汉字输出时，文字看起来正确但无法搜索
+- GARBLED_MAP：MAVO Edge 6K 说明书字体编码错误产生的乱码 → 正确字符；其中部分乱码本身是常用字
+  （如 返、项），默认只对含有罕见乱码标记字的文本修复，正常文档不受影响
+- 全部映射预先编译为 str.translate 表，每段文本只扫描一次
+"""
+
+import unicodedata
+
+# 字符映射表（乱码 → 正确字符）
+GARBLED_MAP = {
+    '弼': '当',
+    '丌': '不',
+    '迕': '进',
+    '劢': '动',
+    '返': '这',
+    '秱': '移',
+    '卐': '卓',
+    '巫': '已',
+    '乊': '之',
+    '叏': '取',
+    '吭': '启',
+    '项': '须',
+    '枂': '析',
+    '轲': '载',
+    '匘': '匹',
+    '览': '浏',
+    '劣': '助',
+    '亍': '于',
+    '卑': '单',
+}
+
+# 正常中文文本中几乎不会出现的乱码字，出现即说明文本来自编码错误的字体
+GARBLED_MARKERS = frozenset('丌迕劢秱卐乊叏枂轲匘')
+
+RADICAL_RANGES = ((0x2E80, 0x2EFF), (0x2F00, 0x2FDF), (0xF900, 0xFAFF), (0x2F800, 0x2FA1F))
+
+
+def _radical_table():
+    table = {}
+    for start, end in RADICAL_RANGES:
+        for code in range(start, end + 1):
+            char = chr(code)
+            normalized = unicodedata.normalize('NFKC', char)
+            if normalized != char and len(normalized) == 1:
+                table[code] = normalized
+    return table
+
+
+# 部首/兼容字 → 统一汉字
+RADICAL_TABLE = _radical_table()
+
+# 部首规范化 + 乱码修复
+REPAIR_TABLE = {**RADICAL_TABLE, **str.maketrans(GARBLED_MAP)}
+
+
+def is_garbled(text):
+    """文本是否含有乱码标记字"""
+    return bool(text) and not GARBLED_MARKERS.isdisjoint(text)
+
+
+def normalize_glyphs(text, repair=None):
+    """
+    规范化一段文本
+
+    Args:
+        repair: True 总是修复乱码，False 只规范部首，None 按文本是否含乱码标记字判断
+    """
+    if not text:
+        return text
+    if repair is None:
+        repair = is_garbled(text)
+    return text.translate(REPAIR_TABLE if repair else RADICAL_TABLE)
+
+
+def normalize_page(text, tables=()):
+    """
+    规范化一页的文本和表格单元格（是否修复乱码按整页文本和单元格判断，单元格为 None 时保持不变）
+
+    Returns:
+        (text, tables)
+    """
+    repair = is_garbled(text) or any(is_garbled(cell) for rows in tables for row in rows for cell in row)
+    table = REPAIR_TABLE if repair else RADICAL_TABLE
+    if text:
+        text = text.translate(table)
+    tables = [[[cell.translate(table) if cell else cell for cell in row] for row in rows] for rows in tables]
+    return text, tables
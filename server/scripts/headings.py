@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+章节标题检测（各导入脚本共用）
+- 编号标题：形如 "3.3.2 自动白平衡"，单次遍历文档逐行判断
+- 有字体信息时（PyMuPDF get_text("dict") 的 span 字号/粗体，Word 标题样式和 run 格式）：
+  只有字号明显大于正文或加粗的编号行才算标题，正文字号的编号列表项不再误判
+- 没有字体信息时（pdfplumber 纯文本）：逐行只排除明显的正文（句子、年份等过大的编号、"3 秒后自动关机"
+  之类编号后接单位的数值），再对全部候选整体选出编号连续的标题链（detect_text_headings）：
+  接不上前后标题的编号行（列表步骤等）不选，且一个误判的编号行不会让其后的真标题都接不上
+- Markdown：# / ## / ### 标题
+- PDF行文本经 glyphs 规范化（部首字形、乱码字体）
+"""
+
+import re
+from collections import Counter
+from glyphs import is_garbled, normalize_glyphs
+
+NUMBERED_HEADING = re.compile(r'^(\d+(?:\.\d+)*)\s+(.+)$')
+MARKDOWN_HEADING = re.compile(r'^(#{1,3})[ \t]+(\S.*)$')
+
+# 标题通常不会太长
+MAX_HEADING_LENGTH = 100
+
+# 字号超过正文字号的倍数才算标题字号
+HEADING_SIZE_RATIO = 1.05
+
+# 编号连续性允许跳过的编号数（漏检一个标题时后续标题仍能接上）
+MAX_NUMBER_GAP = 2
+
+# 没有字体信息时编号各级的最大值（更大的多为年份或数值，如 "2024 年 12 月"）
+MAX_SECTION_NUMBER = 99
+
+# 没有字体信息时，编号后紧跟单位或量词的是正文中的数值（如 "3 秒后自动关机"）
+MEASURE_WORD = re.compile(r'^(?:秒|分钟|小时|年|月|次|个|张|%|°|mm\b|cm\b|kg\b|mAh\b|Hz\b|fps\b|[KMGT]B\b)',
+                          re.IGNORECASE)
+
+# 选取标题链时，不能紧接上一个标题的编号扣的分（每个标题得1分）：
+# 孤立的不连续编号不选，其后至少还有一个标题接得上时才选（漏检标题、编号重新开始）
+CHAIN_BREAK_PENALTY = 1.5
+
+# 选取标题链时只在最近这么多个候选中找上一个标题，更早的按不连续计
+CHAIN_WINDOW = 50
+
+# 以这些标点结尾的是句子而不是标题
+SENTENCE_ENDINGS = ('。', '；', '，', ';', ',')
+
+# PyMuPDF span flags 中的粗体位
+PYMUPDF_BOLD = 16
+
+# Word 正文样式未设置字号时按此字号判断
+DOCX_BODY_SIZE = 12
+
+
+def page_lines(page):
+    """
+    逐行取出一页的文本和字体信息（字形规范化，是否修复乱码按整页判断）
+
+    Returns:
+        [(text, size, bold)]，size 为该行最大span字号
+    """
+    lines = []
+    for block in page.get_text("dict").get("blocks", []):
+        if block.get("type") != 0:  # 只处理文本块
+            continue
+
+        for line in block.get("lines", []):
+            spans = [span for span in line.get("spans", []) if span.get("text", "").strip()]
+            text = ''.join(span.get("text", "") for span in line.get("spans", [])).strip()
+            if not text or not spans:
+                continue
+
+            size = max(span.get("size", 0) for span in spans)
+            bold = all(span.get("flags", 0) & PYMUPDF_BOLD or 'Bold' in span.get("font", '') for span in spans)
+            lines.append((text, size, bold))
+
+    repair = any(is_garbled(text) for text, _, _ in lines)
+    return [(normalize_glyphs(text, repair), size, bold) for text, size, bold in lines]
+
+
+def pdf_lines(pdf_doc):
+    """
+    单次遍历PDF，逐行取出文本和字体信息
+
+    Yields:
+        (page_num, text, size, bold)，page_num 从1开始；size 为该行最大span字号
+    """
+    for page_index, page in enumerate(pdf_doc):
+        for text, size, bold in page_lines(page):
+            yield page_index + 1, text, size, bold
+
+
+def body_font_size(lines):
+    """正文字号：按字符数加权出现最多的字号"""
+    sizes = Counter()
+    for _, text, size, _ in lines:
+        sizes[round(size, 1)] += len(text)
+    return sizes.most_common(1)[0][0] if sizes else None
+
+
+def docx_body_size(doc):
+    """Word 正文（Normal 样式）字号(pt)"""
+    try:
+        size = doc.styles['Normal'].font.size
+    except KeyError:
+        size = None
+    return size.pt if size else DOCX_BODY_SIZE
+
+
+class DocxStyleNames:
+    """
+    按样式ID缓存的 Word 段落样式名
+
+    python-docx 的 paragraph.style 每次都在全部样式中查找（未设置样式的段落还要逐个检查默认样式），
+    逐段读取样式名时占转换耗时的大部分；同一文档内样式ID到样式名的对应不变
+
+    用法:
+        style_names = DocxStyleNames()
+        if style_names(paragraph).startswith('Heading'):
+            ...
+    """
+
+    def __init__(self):
+        self.names = {}
+
+    def __call__(self, paragraph):
+        style_id = paragraph._p.style
+        if style_id not in self.names:
+            self.names[style_id] = paragraph.style.name
+        return self.names[style_id]
+
+
+def docx_paragraph_font(paragraph):
+    """Word 段落首个 run 的 (字号pt, 是否粗体)，字号未设置时为 None"""
+    if not paragraph.runs:
+        return None, False
+    first_run = paragraph.runs[0]
+    return (first_run.font.size.pt if first_run.font.size else None), bool(first_run.bold)
+
+
+def _follows(previous, number):
+    """number 是否可以紧接在标题编号 previous 之后"""
+    if previous is None:
+        return True
+
+    for depth in range(min(len(previous), len(number))):
+        if number[depth] != previous[depth]:
+            # 在 depth 级递增，其后各级从1开始
+            return (0 < number[depth] - previous[depth] <= MAX_NUMBER_GAP
+                    and all(n == 1 for n in number[depth + 1:]))
+
+    # 前缀相同：进入下一级（从1开始）
+    return len(number) > len(previous) and all(n == 1 for n in number[len(previous):])
+
+
+def chain_headings(numbers):
+    """
+    在按文档顺序排列的候选编号中选出标题（没有字体信息时使用）
+
+    每选一个标题得1分，不能紧接上一个选中的标题（_follows）时扣 CHAIN_BREAK_PENALTY 分，取总分最高的选法
+
+    Args:
+        numbers: 候选编号列表，如 [[1], [1, 1], [2], [1, 2]]
+
+    Returns:
+        选中候选的下标集合
+    """
+    scores = []
+    back = []
+    best_prefix = []  # best_prefix[i]: numbers[0..i] 中得分最高的 (score, index)
+    for i, number in enumerate(numbers):
+        # 作为第一个标题
+        best, previous = 1, None
+        start = max(0, i - CHAIN_WINDOW)
+        if start > 0:
+            score, j = best_prefix[start - 1]
+            if score + 1 - CHAIN_BREAK_PENALTY > best:
+                best, previous = score + 1 - CHAIN_BREAK_PENALTY, j
+        for j in range(start, i):
+            score = scores[j] + (1 if _follows(numbers[j], number) else 1 - CHAIN_BREAK_PENALTY)
+            if score > best:
+                best, previous = score, j
+        scores.append(best)
+        back.append(previous)
+        best_prefix.append(max(best_prefix[-1], (best, i)) if best_prefix else (best, i))
+
+    selected = set()
+    i = best_prefix[-1][1] if best_prefix else None
+    while i is not None:
+        selected.add(i)
+        i = back[i]
+    return selected
+
+
+class HeadingDetector:
+    """
+    编号标题检测器，按文档顺序逐行调用
+
+    用法:
+        detector = HeadingDetector(body_size=body_font_size(lines))
+        for page_num, text, size, bold in lines:
+            heading = detector.match(text, size, bold)
+            if heading:
+                number, title = heading
+
+    没有字体信息时 match() 只给出候选，需再经 chain_headings 选取（见 detect_text_headings）
+
+    min_depth: 编号最少级数（2 时只认 "1.1" 及更深的标题）
+    """
+
+    def __init__(self, body_size=None, min_depth=1):
+        self.body_size = body_size
+        self.min_depth = min_depth
+        self.rejected = 0
+
+    def styled(self, size=None, bold=None):
+        """按字体判断是否为标题格式；没有字体信息时返回 None"""
+        if bold:
+            return True
+        if size and self.body_size:
+            return size > self.body_size * HEADING_SIZE_RATIO
+        return None if bold is None else False
+
+    def match(self, text, size=None, bold=None, heading_style=False):
+        """
+        判断一行是否为编号标题
+
+        Args:
+            text: 行文本
+            size / bold: 字号和是否粗体，未知时为 None
+            heading_style: 已知为标题样式（如 Word 的 Heading 样式）
+
+        Returns:
+            (number, title)，不是标题时返回 None
+        """
+        text = text.strip()
+        match = NUMBERED_HEADING.match(text)
+        if not match or len(text) >= MAX_HEADING_LENGTH:
+            return None
+
+        number_text, title = match.group(1), match.group(2).strip()
+        number = [int(n) for n in number_text.split('.')]
+        if len(number) < self.min_depth:
+            return None
+
+        if title.endswith(SENTENCE_ENDINGS):
+            self.rejected += 1
+            return None
+
+        styled = True if heading_style else self.styled(size, bold)
+        if styled is False or (styled is None and not _plausible(number, title)):
+            self.rejected += 1
+            return None
+
+        return number_text, title
+
+
+def _plausible(number, title):
+    """没有字体信息时，编号行是否可能是标题（排除年份、数值）"""
+    return max(number) <= MAX_SECTION_NUMBER and not MEASURE_WORD.match(title)
+
+
+def detect_text_headings(lines, min_depth=1):
+    """
+    对没有字体信息的纯文本行（如 pdfplumber 提取的文本）判断标题：
+    逐行找出编号候选，再用 chain_headings 整体选出编号连续的标题
+
+    Args:
+        lines: [(page_num, text)]
+
+    Returns:
+        [(page_num, text, heading)]（格式同 detect_headings）
+    """
+    lines = list(lines)
+    detector = HeadingDetector(min_depth=min_depth)
+    candidates = []
+    for index, (_, text) in enumerate(lines):
+        heading = detector.match(text)
+        if heading:
+            candidates.append((index, heading))
+
+    selected = chain_headings([[int(n) for n in heading[0].split('.')] for _, heading in candidates])
+    headings = {index: heading for position, (index, heading) in enumerate(candidates) if position in selected}
+    return [(page_num, text, headings.get(index)) for index, (page_num, text) in enumerate(lines)]
+
+
+def detect_headings(lines, min_depth=1):
+    """
+    对 pdf_lines() 格式的行（也可来自 page_ir 缓存）判断标题
+
+    Returns:
+        [(page_num, text, heading)]，heading 为 (number, title) 或 None
+    """
+    lines = list(lines)
+    detector = HeadingDetector(body_font_size(lines), min_depth)
+    return [(page_num, text, detector.match(text, size, bold)) for page_num, text, size, bold in lines]
+
+
+def detect_pdf_headings(pdf_doc, min_depth=1):
+    """单次遍历PDF，返回全部行和标题判断结果（格式同 detect_headings）"""
+    return detect_headings(pdf_lines(pdf_doc), min_depth)
+
+
+def markdown_heading(line):
+    """
+    Markdown 标题行（# ~ ###）
+
+    Returns:
+        (level, title)，不是标题时返回 None
+    """
+    match = MARKDOWN_HEADING.match(line)
+    if not match:
+        return None
+    return len(match.group(1)), match.group(2).strip()
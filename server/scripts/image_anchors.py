@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+章节内容中的图片锚点（"如右图所示"、"见图"、"图示如下" 等）
+- 多个锚点模式合并为一个正则，单次扫描取出全部锚点位置和所属模式
+- 图片按各脚本的规则分配到锚点后，一次拼接生成带图片的内容
+- 替代逐图片 × 逐模式的 re.search / re.sub 和字符串切片重建（图片多时为平方级）
+"""
+
+import re
+
+_combined = {}
+
+
+def combined_pattern(patterns):
+    """将多个锚点模式合并为一个正则，每个模式一个命名分组（按模式顺序编号）"""
+    key = tuple(patterns)
+    if key not in _combined:
+        _combined[key] = re.compile('|'.join(f'(?P<p{i}>{pattern})' for i, pattern in enumerate(patterns)))
+    return _combined[key]
+
+
+def find_anchors(content, patterns):
+    """
+    单次扫描取出全部锚点
+
+    锚点之间不重叠：同一位置按模式顺序取第一个能匹配的模式，与依次对每个模式插入图片后
+    （插入的Markdown不含锚点文字）剩余的匹配一致
+
+    Returns:
+        [(start, end, pattern_index)]，按出现位置排序
+    """
+    anchors = []
+    for match in combined_pattern(patterns).finditer(content):
+        pattern_index = int(match.lastgroup[1:])
+        anchors.append((match.start(), match.end(), pattern_index))
+    return anchors
+
+
+def render_with_images(content, insertions):
+    """
+    在指定偏移处插入文本，一次拼接
+
+    Args:
+        insertions: {offset: [text, ...]}，同一偏移的文本按列表顺序插入
+    """
+    parts = []
+    last = 0
+    for offset in sorted(insertions):
+        parts.append(content[last:offset])
+        parts.extend(insertions[offset])
+        last = offset
+    parts.append(content[last:])
+    return ''.join(parts)
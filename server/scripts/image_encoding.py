@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+图片编码参数与WebP编码档位
+- fast: 最快，适合大量UI截图的导入
+- balanced: 速度与体积折中
+- max: 最小体积（libwebp method=6，原有默认值）
+"""
+
+from PIL import Image
+
+WEBP_PROFILES = {
+    'fast': {'format': 'WEBP', 'quality': 80, 'method': 2},
+    'balanced': {'format': 'WEBP', 'quality': 85, 'method': 4},
+    'max': {'format': 'WEBP', 'quality': 85, 'method': 6},
+}
+
+DEFAULT_WEBP_PROFILE = 'max'
+
+WEBP_ENCODER = WEBP_PROFILES[DEFAULT_WEBP_PROFILE]
+PNG_ENCODER = {'format': 'PNG'}
+
+
+def webp_profile(name=None):
+    """
+    按名称取WebP编码参数
+
+    Raises:
+        ValueError: 未知的档位名称
+    """
+    name = name or DEFAULT_WEBP_PROFILE
+    if name not in WEBP_PROFILES:
+        raise ValueError(f"未知的WebP编码档位: {name}（可选: {', '.join(WEBP_PROFILES)}）")
+    return WEBP_PROFILES[name]
+
+
+def profile_option(options):
+    """读取 --webp-profile=NAME 选项对应的编码参数"""
+    value = options.get('webp-profile')
+    return webp_profile(value if isinstance(value, str) else None)
+
+
+def to_rgb(img):
+    """转换为RGB，透明区域填充白色背景"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        bg = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        if img.mode in ('RGBA', 'LA'):
+            bg.paste(img, mask=img.split()[-1])
+        return bg
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def save_encoded(img, fp, encoder=WEBP_ENCODER):
+    """按编码参数保存图片（WebP先铺白底转RGB，PNG保留透明通道）；fp 可为路径或文件对象"""
+    fmt = encoder['format']
+    if fmt == 'WEBP':
+        img = to_rgb(img)
+    elif img.mode not in ('RGB', 'RGBA', 'L'):
+        img = img.convert('RGB')
+
+    params = {key: value for key, value in encoder.items() if key != 'format'}
+    img.save(fp, fmt, **params)
+
+
+def convert_image_file(input_path, output_path, encoder=WEBP_ENCODER):
+    """
+    转换单个图片文件（网页图片下载后转WebP；input_path 也可为文件对象）
+
+    Returns:
+        (width, height)
+    """
+    with Image.open(input_path) as img:
+        save_encoded(img, output_path, encoder)
+        return img.size
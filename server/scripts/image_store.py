@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+内容寻址图片库（跨运行、跨文档复用已编码的图片）
+- 以源图片字节的完整 BLAKE2b-128 哈希为键，文件名不再有截断哈希的碰撞风险
+- SQLite清单：源哈希 + 编码参数 → 输出文件、尺寸、文件大小
+- 命中且输出文件仍存在时直接复用，不再解码和编码
+- 被过滤的小图同样记录（filename 为空），下次无需再解码
+"""
+
+import os
+import io
+import json
+import sqlite3
+import hashlib
+from PIL import Image
+from image_encoding import WEBP_ENCODER, PNG_ENCODER, save_encoded
+
+MANIFEST_NAME = '.image_manifest.sqlite'
+
+# 每写入多少条记录提交一次
+COMMIT_EVERY = 50
+
+
+def content_key(image_bytes):
+    """源图片字节的内容哈希（BLAKE2b，128位，比md5更快）"""
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def encoder_id(encoder):
+    """编码参数的规范化字符串，作为清单键的一部分"""
+    return json.dumps(encoder, sort_keys=True, separators=(',', ':'))
+
+
+class ImageStore:
+    """
+    内容寻址图片库
+
+    用法:
+        with ImageStore(images_dir) as store:
+            entry = store.get_or_encode(image_bytes, min_size=50)
+    """
+
+    def __init__(self, images_dir, manifest_path=None, encoder=WEBP_ENCODER, prefix='img_'):
+        self.images_dir = images_dir
+        self.encoder = encoder
+        self.encoder_key = encoder_id(encoder)
+        self.prefix = prefix
+        self.manifest_path = manifest_path or os.path.join(images_dir, MANIFEST_NAME)
+        self.stats = {'hits': 0, 'encoded': 0, 'skipped_small': 0}
+        self._pending = 0
+
+        os.makedirs(images_dir, exist_ok=True)
+        self.conn = sqlite3.connect(self.manifest_path, timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                source_hash TEXT NOT NULL,
+                encoder TEXT NOT NULL,
+                filename TEXT,
+                width INTEGER,
+                height INTEGER,
+                source_size INTEGER,
+                output_size INTEGER,
+                created_at TEXT DEFAULT (datetime('now')),
+                PRIMARY KEY (source_hash, encoder)
+            )
+        """)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def filename_for(self, key):
+        fmt = self.encoder['format']
+        ext = 'webp' if fmt == 'WEBP' else fmt.lower()
+        if self.encoder in (WEBP_ENCODER, PNG_ENCODER):
+            return f"{self.prefix}{key}.{ext}"
+
+        # 非默认编码参数单独命名，避免覆盖默认参数生成的文件
+        tag = hashlib.blake2b(self.encoder_key.encode(), digest_size=4).hexdigest()
+        return f"{self.prefix}{key}_{tag}.{ext}"
+
+    def get(self, key):
+        """
+        查询清单
+
+        Returns:
+            命中时返回 {'filename', 'width', 'height', 'output_size', 'cached'}，
+            filename 为 None 表示该图被过滤过；未命中或输出文件已丢失时返回 None
+        """
+        row = self.conn.execute(
+            "SELECT filename, width, height, output_size FROM images WHERE source_hash = ? AND encoder = ?",
+            (key, self.encoder_key)
+        ).fetchone()
+        if not row:
+            return None
+
+        filename, width, height, output_size = row
+        if filename and not os.path.exists(os.path.join(self.images_dir, filename)):
+            return None
+
+        return {'filename': filename, 'width': width, 'height': height,
+                'output_size': output_size, 'cached': True}
+
+    def record(self, key, filename, width, height, source_size):
+        """写入清单；filename 为 None 表示被过滤的小图"""
+        output_size = None
+        if filename:
+            output_size = os.path.getsize(os.path.join(self.images_dir, filename))
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO images (source_hash, encoder, filename, width, height, source_size, output_size) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, self.encoder_key, filename, width, height, source_size, output_size)
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+        return {'filename': filename, 'width': width, 'height': height,
+                'output_size': output_size, 'cached': False}
+
+    def get_or_encode(self, image_bytes, key=None, min_size=0):
+        """
+        取出已编码的图片，未命中时解码并编码一次
+
+        Returns:
+            条目字典（同 get）；宽或高小于 min_size 时返回 None
+        """
+        key = key or content_key(image_bytes)
+
+        entry = self.get(key)
+        if entry is None:
+            img = Image.open(io.BytesIO(image_bytes))
+            width, height = img.size
+
+            if width < min_size or height < min_size:
+                entry = self.record(key, None, width, height, len(image_bytes))
+            else:
+                filename = self.filename_for(key)
+                save_encoded(img, os.path.join(self.images_dir, filename), self.encoder)
+                entry = self.record(key, filename, width, height, len(image_bytes))
+        elif entry['filename']:
+            self.stats['hits'] += 1
+
+        if not entry['filename']:
+            self.stats['skipped_small'] += 1
+            return None
+
+        if not entry['cached']:
+            self.stats['encoded'] += 1
+        return entry
+
+    def lookup(self, image_bytes):
+        """
+        查询清单并计入复用/过滤统计（供在其他线程编码的调用方使用，未命中时编码后调用 add_encoded）
+
+        Returns:
+            (key, entry)：entry 同 get，未命中时为 None
+        """
+        key = content_key(image_bytes)
+        entry = self.get(key)
+        if entry is not None:
+            self.stats['hits' if entry['filename'] else 'skipped_small'] += 1
+        return key, entry
+
+    def add_encoded(self, key, filename, width, height, source_size):
+        """记录在别处编码完成的图片（清单连接只在创建它的线程中使用）"""
+        self.stats['encoded'] += 1
+        return self.record(key, filename, width, height, source_size)
+
+    def format_stats(self):
+        return (f"图片库: 复用 {self.stats['hits']} 张，新编码 {self.stats['encoded']} 张，"
+                f"过滤小图 {self.stats['skipped_small']} 张")
+
+
+def open_image_store(options, images_dir, **kwargs):
+    """根据 --image-store[=manifest] 选项打开图片库，未指定时返回 None"""
+    value = options.get('image-store')
+    if not value:
+        return None
+    return ImageStore(images_dir, manifest_path=None if value is True else value, **kwargs)
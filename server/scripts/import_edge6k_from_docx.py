@@ -4,21 +4,23 @@
 - 提取文字和结构
 - 提取图片并保存
 - 准确匹配图片到文字位置
+- --report=path / --no-report / --profile[=path] / --trace-memory: 分阶段耗时与内存的JSON报告（默认写到
+  图片目录的 .ingest_reports/）和可选的 cProfile 文件（见 instrument）
 """
 
 import sys
-import os
 import sqlite3
-import hashlib
-import re
 from pathlib import Path
 from docx import Document
 from docx.oxml.text.paragraph import CT_P
 from docx.oxml.table import CT_Tbl
 from docx.table import Table
 from docx.text.paragraph import Paragraph
-from PIL import Image
-import io
+from image_store import ImageStore, PNG_ENCODER
+from headings import HeadingDetector, docx_body_size, docx_paragraph_font
+from sections import SectionBuilder
+from script_args import split_args
+from instrument import open_instrument
 
 # 配置
 DOCX_PATH = "/Users/Kine/Documents/Kinefinity/KineCore/Pool/qoder/Longhorn/input docs/MAVO Edge 6K操作说明书(KineOS8.0)_C34-102-8016_2024.12.19_v0.1_Jiulong.docx"
@@ -27,8 +29,8 @@ IMAGE_OUTPUT_DIR = "/Users/Kine/Documents/Kinefinity/KineCore/Pool/qoder/Longhor
 
 Path(IMAGE_OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
 
-def extract_images_from_docx(doc):
-    """从Word文档提取所有图片"""
+def extract_images_from_docx(doc, store):
+    """从Word文档提取所有图片（通过内容寻址图片库，已保存过的图片直接复用）"""
     images = []
     image_parts = {}
     
@@ -43,22 +45,14 @@ def extract_images_from_docx(doc):
     for rid, image_part in image_parts.items():
         try:
             image_bytes = image_part.blob
-            img = Image.open(io.BytesIO(image_bytes))
-            width, height = img.size
             
-            # 跳过小图标
-            if width < 50 or height < 50:
+            # 跳过小图标（同样记录在清单中，下次无需再解码）
+            entry = store.get_or_encode(image_bytes, min_size=50)
+            if entry is None:
                 continue
             
-            # 生成文件名
-            img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
-            filename = f"edge6k_docx_{img_hash}.png"
-            filepath = os.path.join(IMAGE_OUTPUT_DIR, filename)
-            
-            # 保存为PNG
-            if img.mode not in ('RGB', 'RGBA', 'L'):
-                img = img.convert('RGB')
-            img.save(filepath, "PNG")
+            filename = entry['filename']
+            width, height = entry['width'], entry['height']
             
             images.append({
                 'rid': rid,
@@ -68,7 +62,7 @@ def extract_images_from_docx(doc):
                 'path': f'/data/knowledge_images/{filename}'
             })
             
-            print(f"  ✓ {filename} ({width}x{height})")
+            print(f"  ✓ {filename} ({width}x{height}){' (复用)' if entry['cached'] else ''}")
             
         except Exception as e:
             print(f"  ⚠ 图片提取失败 ({rid}): {e}")
@@ -91,29 +85,17 @@ def get_paragraph_images(paragraph):
     
     return image_rids
 
-def is_heading(paragraph):
-    """判断段落是否为标题"""
-    if paragraph.style.name.startswith('Heading'):
-        return True
-    
-    # 检查是否有章节编号格式
-    text = paragraph.text.strip()
-    if re.match(r'^\d+(?:\.\d+)*\s+.+', text):
-        # 检查字体大小或加粗
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            if first_run.bold or (first_run.font.size and first_run.font.size.pt > 12):
-                return True
-    
-    return False
+def match_heading(detector, paragraph, text):
+    """判断段落是否为编号章节标题：Heading 样式，或首个run加粗/字号大于正文"""
+    size, bold = docx_paragraph_font(paragraph)
+    return detector.match(text, size, bold, heading_style=paragraph.style.name.startswith('Heading'))
 
 def parse_chapters_from_docx(doc, image_map):
     """从Word文档提取章节内容"""
     chapters = []
     current_chapter = None
     
-    # 章节标题模式
-    chapter_pattern = re.compile(r'^(\d+(?:\.\d+)*)\s+(.+)$')
+    detector = HeadingDetector(docx_body_size(doc))
     
     for element in doc.element.body:
         # 处理段落
@@ -125,24 +107,21 @@ def parse_chapters_from_docx(doc, image_map):
                 continue
             
             # 检查是否为章节标题
-            if is_heading(paragraph):
-                match = chapter_pattern.match(text)
-                if match:
-                    # 保存上一章节
-                    if current_chapter and current_chapter['content']:
-                        chapters.append(current_chapter)
-                    
-                    # 开始新章节
-                    chapter_num = match.group(1)
-                    chapter_title = match.group(2)
-                    current_chapter = {
-                        'number': chapter_num,
-                        'title': f"MAVO Edge 6K: {chapter_title}",
-                        'full_title': text,
-                        'content': "",
-                        'images': []
-                    }
-                    continue
+            heading = match_heading(detector, paragraph, text)
+            if heading:
+                # 保存上一章节
+                if current_chapter and current_chapter.has_content:
+                    chapters.append(current_chapter.finalize())
+                
+                # 开始新章节
+                chapter_num, chapter_title = heading
+                current_chapter = SectionBuilder(
+                    track_images=True,
+                    number=chapter_num,
+                    title=f"MAVO Edge 6K: {chapter_title}",
+                    full_title=text
+                )
+                continue
             
             # 添加到当前章节
             if current_chapter:
@@ -150,39 +129,47 @@ def parse_chapters_from_docx(doc, image_map):
                 img_rids = get_paragraph_images(paragraph)
                 
                 # 添加文字
-                current_chapter['content'] += text + "\n\n"
+                current_chapter.append(text + "\n\n")
                 
                 # 添加图片引用
                 for rid in img_rids:
                     if rid in image_map:
                         img_info = image_map[rid]
-                        current_chapter['content'] += f"![{img_info['filename']}]({img_info['path']})\n\n"
-                        current_chapter['images'].append(img_info)
+                        current_chapter.append(f"![{img_info['filename']}]({img_info['path']})\n\n")
+                        current_chapter.add_image(img_info)
         
         # 处理表格（暂时跳过，可以后续增强）
         elif isinstance(element, CT_Tbl):
             pass
     
     # 保存最后一章
-    if current_chapter and current_chapter['content']:
-        chapters.append(current_chapter)
+    if current_chapter and current_chapter.has_content:
+        chapters.append(current_chapter.finalize())
     
     return chapters
 
 def main():
+    args, options = split_args(sys.argv[1:])
+    
     print("=" * 70)
     print("从Word文档导入 MAVO Edge 6K 操作说明书")
     print("=" * 70)
+    instrument = open_instrument(options, 'import_edge6k_from_docx', IMAGE_OUTPUT_DIR)
     
     # 1. 打开Word文档
     print(f"\n📄 打开Word文档...")
-    doc = Document(DOCX_PATH)
+    with instrument.stage('open'):
+        doc = Document(DOCX_PATH)
     print(f"   段落数: {len(doc.paragraphs)}")
     print(f"   表格数: {len(doc.tables)}")
     
     # 2. 提取图片
     print(f"\n📸 提取图片...")
-    images = extract_images_from_docx(doc)
+    with instrument.stage('images') as s, \
+            ImageStore(IMAGE_OUTPUT_DIR, encoder=PNG_ENCODER, prefix='edge6k_docx_') as store:
+        images = extract_images_from_docx(doc, store)
+        s.count(images=len(images))
+        print(f"   {store.format_stats()}")
     print(f"   共提取 {len(images)} 张有效图片")
     
     # 创建图片映射
@@ -190,8 +177,10 @@ def main():
     
     # 3. 提取章节
     print(f"\n📖 提取章节内容...")
-    chapters = parse_chapters_from_docx(doc, image_map)
-    print(f"   共提取 {len(chapters)} 个章节")
+    with instrument.stage('sections', paragraphs=len(doc.paragraphs)) as s:
+        chapters = parse_chapters_from_docx(doc, image_map)
+        s.count(sections=len(chapters))
+    print(f"   共提取 {len(chapters)} 个章节，{sum(ch['content_bytes'] for ch in chapters) / 1024:.1f}KB")
     
     # 显示章节预览
     for i, ch in enumerate(chapters[:5]):
@@ -222,47 +211,48 @@ def main():
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, datetime('now'))
     """
     
-    for i, chapter in enumerate(chapters):
-        # 生成slug
-        slug = f"edge-6k-{chapter['number'].replace('.', '-')}"
+    with instrument.stage('db_write', articles=len(chapters)):
+        for i, chapter in enumerate(chapters):
+            # 生成slug
+            slug = f"edge-6k-{chapter['number'].replace('.', '-')}"
         
-        # 生成摘要（取前200字符）
-        summary = chapter['content'][:200].replace('\n', ' ').strip()
+            # 生成摘要（取前200字符）
+            summary = chapter['content'][:200].replace('\n', ' ').strip()
         
-        try:
-            cursor.execute(insert_sql, (
-                chapter['title'],
-                slug,
-                summary,
-                chapter['content'],
-                'Manual',
-                '操作手册',
-                'MAVO Edge',
-                'MAVO Edge 6K',
-                'Public',
-                'Published',
-                admin_id
-            ))
-            print(f"   ✓ {chapter['number']} {chapter['title'][:50]}")
-        except sqlite3.IntegrityError as e:
-            # 如果slug重复，添加序号
-            slug = f"{slug}-{i+1:03d}"
-            cursor.execute(insert_sql, (
-                chapter['title'],
-                slug,
-                summary,
-                chapter['content'],
-                'Manual',
-                '操作手册',
-                'MAVO Edge',
-                'MAVO Edge 6K',
-                'Public',
-                'Published',
-                admin_id
-            ))
-            print(f"   ✓ {chapter['number']} {chapter['title'][:50]} (slug: {slug})")
+            try:
+                cursor.execute(insert_sql, (
+                    chapter['title'],
+                    slug,
+                    summary,
+                    chapter['content'],
+                    'Manual',
+                    '操作手册',
+                    'MAVO Edge',
+                    'MAVO Edge 6K',
+                    'Public',
+                    'Published',
+                    admin_id
+                ))
+                print(f"   ✓ {chapter['number']} {chapter['title'][:50]}")
+            except sqlite3.IntegrityError as e:
+                # 如果slug重复，添加序号
+                slug = f"{slug}-{i+1:03d}"
+                cursor.execute(insert_sql, (
+                    chapter['title'],
+                    slug,
+                    summary,
+                    chapter['content'],
+                    'Manual',
+                    '操作手册',
+                    'MAVO Edge',
+                    'MAVO Edge 6K',
+                    'Public',
+                    'Published',
+                    admin_id
+                ))
+                print(f"   ✓ {chapter['number']} {chapter['title'][:50]} (slug: {slug})")
     
-    conn.commit()
+        conn.commit()
     
     # 8. 验证
     count = cursor.execute("SELECT COUNT(*) FROM knowledge_articles WHERE category = 'Manual'").fetchone()[0]
@@ -283,6 +273,7 @@ def main():
         print(f"   内容: {test[1][:100]}...")
     
     conn.close()
+    instrument.finish(images=len(images), articles=count)
     print("\n" + "=" * 70)
 
 if __name__ == '__main__':
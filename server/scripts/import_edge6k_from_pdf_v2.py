@@ -4,16 +4,27 @@
 - 正确提取文字（无编码问题）
 - 提取图片并保存
 - 智能匹配图片到章节
+- --page-ir[=dir]: 缓存逐页解析结果和图片提取结果（page_ir），PDF未变时调整章节切分和图片放置
+  不再重新解析PDF、解码图片
+- --report=path / --no-report / --profile[=path] / --trace-memory: 分阶段耗时与内存的JSON报告（默认写到
+  图片目录的 .ingest_reports/）和可选的 cProfile 文件（见 instrument）
 """
 
+import sys
 import fitz  # PyMuPDF
 import sqlite3
 import os
 import hashlib
-import re
 from pathlib import Path
 from PIL import Image
 import io
+from pdf_images import candidate_images, new_scan_stats, format_scan_stats
+from headings import detect_headings
+from page_ir import open_page_ir
+from sections import SectionBuilder
+from image_anchors import find_anchors, render_with_images
+from script_args import split_args
+from instrument import open_instrument
 
 # 配置
 PDF_PATH = "/Users/Kine/Documents/Kinefinity/KineCore/Pool/qoder/Longhorn/input docs/MAVO Edge 6K操作说明书(KineOS8.0)_C34-102-8016_2024.12.19_v0.1_Jiulong.pdf"
@@ -26,17 +37,18 @@ def extract_images_from_pdf(pdf_doc):
     """提取PDF中的所有图片"""
     images = []
     extracted_hashes = set()
-    page_images = {}  # {page_num: [images]}
+    seen_xrefs = set()
+    scan_stats = new_scan_stats()
     
     for page_num in range(pdf_doc.page_count):
         page = pdf_doc[page_num]
-        image_list = page.get_images(full=True)
-        page_images[page_num + 1] = []
         
-        for img_index, img_info in enumerate(image_list):
+        # 解码前按xref去重、按元数据过滤小图
+        for img_info in candidate_images(page, seen_xrefs, scan_stats, min_size=80):
             xref = img_info[0]
             
             try:
+                scan_stats['decoded'] += 1
                 base_image = pdf_doc.extract_image(xref)
                 image_bytes = base_image["image"]
                 image_ext = base_image["ext"]
@@ -44,6 +56,7 @@ def extract_images_from_pdf(pdf_doc):
                 # 计算hash避免重复
                 img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
                 if img_hash in extracted_hashes:
+                    scan_stats['skipped_duplicate'] += 1
                     continue
                 extracted_hashes.add(img_hash)
                 
@@ -77,7 +90,6 @@ def extract_images_from_pdf(pdf_doc):
                 }
                 
                 images.append(img_info_dict)
-                page_images[page_num + 1].append(img_info_dict)
                 
                 print(f"  ✓ 第{page_num + 1}页: {filename} ({width}x{height})")
                 
@@ -85,64 +97,45 @@ def extract_images_from_pdf(pdf_doc):
                 print(f"  ⚠ 第{page_num + 1}页图片提取失败: {e}")
                 continue
     
-    return images, page_images
+    print(f"   {format_scan_stats(scan_stats)}")
+    return images
 
-def parse_chapters_from_pdf(pdf_doc, page_images):
-    """从PDF提取章节内容"""
+def parse_chapters_from_pdf(page_ir, page_images):
+    """从页面IR提取章节内容（标题按编号和字号/粗体判断，匹配 "1.1 端口说明" 等）"""
     chapters = []
     current_chapter = None
     
-    # 章节标题模式（匹配 "1.1 端口说明" 等）
-    chapter_pattern = re.compile(r'^(\d+(?:\.\d+)+)\s+(.+)$')
+    def save_chapter(chapter):
+        if chapter and chapter.has_content:
+            # 为章节匹配页码范围内的图片
+            for page in range(chapter.page_start, chapter.page_end + 1):
+                chapter.add_images(page_images.get(page, []))
+            chapters.append(chapter.finalize())
     
-    for page_num in range(pdf_doc.page_count):
-        page = pdf_doc[page_num]
-        text = page.get_text()
-        
-        # 按行处理
-        lines = text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+    for page_num, line, heading in detect_headings(page_ir.lines(), min_depth=2):
+        # 检测章节标题
+        if heading:
+            # 保存上一章节
+            save_chapter(current_chapter)
             
-            # 检测章节标题
-            match = chapter_pattern.match(line)
-            if match:
-                # 保存上一章节
-                if current_chapter and current_chapter['content'].strip():
-                    chapters.append(current_chapter)
-                
-                # 开始新章节
-                chapter_num = match.group(1)
-                chapter_title = match.group(2)
-                
-                current_chapter = {
-                    'number': chapter_num,
-                    'title': f"MAVO Edge 6K: {chapter_title}",
-                    'full_title': line,
-                    'content': "",
-                    'page_start': page_num + 1,
-                    'page_end': page_num + 1,
-                    'images': []
-                }
-                continue
+            # 开始新章节
+            chapter_num, chapter_title = heading
             
-            # 添加到当前章节
-            if current_chapter:
-                current_chapter['content'] += line + "\n"
-                current_chapter['page_end'] = page_num + 1
+            current_chapter = SectionBuilder(
+                page_num=page_num,
+                track_images=True,
+                number=chapter_num,
+                title=f"MAVO Edge 6K: {chapter_title}",
+                full_title=line
+            )
+            continue
+        
+        # 添加到当前章节
+        if current_chapter:
+            current_chapter.append(line + "\n", page_num=page_num)
     
     # 保存最后一章
-    if current_chapter and current_chapter['content'].strip():
-        chapters.append(current_chapter)
-    
-    # 为每个章节匹配图片
-    for chapter in chapters:
-        for page in range(chapter['page_start'], chapter['page_end'] + 1):
-            if page in page_images:
-                chapter['images'].extend(page_images[page])
+    save_chapter(current_chapter)
     
     return chapters
 
@@ -161,46 +154,66 @@ def insert_images_to_content(chapter):
         (r'(图示如下[。，：]?)', '\n\n![示意图]({})\n\n'),
     ]
     
+    # 单次扫描取出全部锚点；图片依次分配给：先按模式顺序，同一模式内从后往前的锚点
+    anchors = find_anchors(content, [pattern for pattern, _ in patterns])
+    anchors.sort(key=lambda anchor: (anchor[2], -anchor[0]))
+    
+    unique_images = {}
+    for img in images:
+        unique_images.setdefault(img['filename'], img)
+    
+    insertions = {}
     images_inserted = set()
+    for (start, end, pattern_index), img in zip(anchors, unique_images.values()):
+        insertions[end] = [patterns[pattern_index][1].format(img['path'])]
+        images_inserted.add(img['filename'])
     
-    for pattern, replacement_template in patterns:
-        matches = list(re.finditer(pattern, content))
-        if matches:
-            # 从后往前替换，避免索引变化
-            for match in reversed(matches):
-                for img in images:
-                    if img['filename'] not in images_inserted:
-                        replacement = match.group(1) + replacement_template.format(img['path'])
-                        content = content[:match.start()] + replacement + content[match.end():]
-                        images_inserted.add(img['filename'])
-                        break
+    parts = [render_with_images(content, insertions)]
     
     # 如果还有未插入的图片，在章节末尾添加
     for img in images:
         if img['filename'] not in images_inserted:
-            content += f'\n\n![配图]({img["path"]})\n'
+            parts.append(f'\n\n![配图]({img["path"]})\n')
     
-    return content
+    return ''.join(parts)
 
 def main():
+    args, options = split_args(sys.argv[1:])
+    
     print("=" * 70)
     print("从原版PDF导入 MAVO Edge 6K 操作说明书")
     print("=" * 70)
+    instrument = open_instrument(options, 'import_edge6k_from_pdf_v2', IMAGE_OUTPUT_DIR)
     
     # 1. 打开PDF
     print(f"\n📄 打开PDF...")
-    pdf_doc = fitz.open(PDF_PATH)
+    with instrument.stage('open'):
+        pdf_doc = fitz.open(PDF_PATH)
     print(f"   总页数: {pdf_doc.page_count}")
     
-    # 2. 提取图片
+    # 2. 逐页解析（--page-ir 时PDF未变直接读取缓存）
+    print(f"\n📖 解析页面...")
+    with instrument.stage('text', pages=pdf_doc.page_count):
+        page_ir = open_page_ir(options, PDF_PATH, IMAGE_OUTPUT_DIR, pdf_doc)
+    
+    # 3. 提取图片（缓存中有本方式的提取结果且图片文件都在时不再解码）
     print(f"\n📸 提取图片...")
-    images, page_images = extract_images_from_pdf(pdf_doc)
+    with instrument.stage('images', pages=pdf_doc.page_count) as s:
+        images = page_ir.images('edge6k_v2_png', lambda: extract_images_from_pdf(pdf_doc), IMAGE_OUTPUT_DIR)
+        s.count(images=len(images))
     print(f"   共提取 {len(images)} 张有效图片")
+    print(f"   {page_ir.format_stats()}")
     
-    # 3. 提取章节
+    page_images = {}  # {page_num: [images]}
+    for img in images:
+        page_images.setdefault(img['page'], []).append(img)
+    
+    # 4. 提取章节
     print(f"\n📖 提取章节内容...")
-    chapters = parse_chapters_from_pdf(pdf_doc, page_images)
-    print(f"   共提取 {len(chapters)} 个章节")
+    with instrument.stage('sections') as s:
+        chapters = parse_chapters_from_pdf(page_ir, page_images)
+        s.count(sections=len(chapters))
+    print(f"   共提取 {len(chapters)} 个章节，{sum(ch['content_bytes'] for ch in chapters) / 1024:.1f}KB")
     
     # 显示前5个章节
     for i, ch in enumerate(chapters[:5]):
@@ -210,27 +223,28 @@ def main():
     
     pdf_doc.close()
     
-    # 4. 处理章节内容（插入图片）
+    # 5. 处理章节内容（插入图片）
     print(f"\n🖼️  处理章节内容...")
-    for chapter in chapters:
-        chapter['content_with_images'] = insert_images_to_content(chapter)
-        summary = chapter['content'][:200].replace('\n', ' ').strip()
-        chapter['summary'] = summary
+    with instrument.stage('anchors', sections=len(chapters)):
+        for chapter in chapters:
+            chapter['content_with_images'] = insert_images_to_content(chapter)
+            summary = chapter['content'][:200].replace('\n', ' ').strip()
+            chapter['summary'] = summary
     
-    # 5. 连接数据库
+    # 6. 连接数据库
     print(f"\n💾 连接数据库...")
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    # 6. 确认清空
+    # 7. 确认清空
     cursor.execute("DELETE FROM knowledge_articles WHERE category = 'Manual'")
     print(f"   已清空Manual分类")
     
-    # 7. 获取admin用户ID
+    # 8. 获取admin用户ID
     admin_user = cursor.execute("SELECT id FROM users WHERE username = 'admin' LIMIT 1").fetchone()
     admin_id = admin_user[0] if admin_user else 1
     
-    # 8. 插入新文章
+    # 9. 插入新文章
     print(f"\n✍️  插入文章...")
     insert_sql = """
         INSERT INTO knowledge_articles (
@@ -240,45 +254,46 @@ def main():
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, datetime('now'))
     """
     
-    for i, chapter in enumerate(chapters):
-        slug = f"edge-6k-{chapter['number'].replace('.', '-')}"
+    with instrument.stage('db_write', articles=len(chapters)):
+        for i, chapter in enumerate(chapters):
+            slug = f"edge-6k-{chapter['number'].replace('.', '-')}"
         
-        try:
-            cursor.execute(insert_sql, (
-                chapter['title'],
-                slug,
-                chapter['summary'],
-                chapter['content_with_images'],
-                'Manual',
-                '操作手册',
-                'A',  # 产品线代码
-                '["MAVO Edge 6K"]',  # JSON数组
-                'Public',
-                'Published',
-                admin_id
-            ))
-            print(f"   ✓ {chapter['number']} {chapter['title']}")
-        except sqlite3.IntegrityError:
-            # slug重复，添加序号
-            slug = f"{slug}-{i+1:03d}"
-            cursor.execute(insert_sql, (
-                chapter['title'],
-                slug,
-                chapter['summary'],
-                chapter['content_with_images'],
-                'Manual',
-                '操作手册',
-                'MAVO Edge',
-                'MAVO Edge 6K',
-                'Public',
-                'Published',
-                admin_id
-            ))
-            print(f"   ✓ {chapter['number']} {chapter['title']} (slug: {slug})")
-    
-    conn.commit()
-    
-    # 9. 验证
+            try:
+                cursor.execute(insert_sql, (
+                    chapter['title'],
+                    slug,
+                    chapter['summary'],
+                    chapter['content_with_images'],
+                    'Manual',
+                    '操作手册',
+                    'A',  # 产品线代码
+                    '["MAVO Edge 6K"]',  # JSON数组
+                    'Public',
+                    'Published',
+                    admin_id
+                ))
+                print(f"   ✓ {chapter['number']} {chapter['title']}")
+            except sqlite3.IntegrityError:
+                # slug重复，添加序号
+                slug = f"{slug}-{i+1:03d}"
+                cursor.execute(insert_sql, (
+                    chapter['title'],
+                    slug,
+                    chapter['summary'],
+                    chapter['content_with_images'],
+                    'Manual',
+                    '操作手册',
+                    'MAVO Edge',
+                    'MAVO Edge 6K',
+                    'Public',
+                    'Published',
+                    admin_id
+                ))
+                print(f"   ✓ {chapter['number']} {chapter['title']} (slug: {slug})")
+    
+        conn.commit()
+    
+    # 10. 验证
     count = cursor.execute("SELECT COUNT(*) FROM knowledge_articles WHERE category = 'Manual'").fetchone()[0]
     with_images = cursor.execute("SELECT COUNT(*) FROM knowledge_articles WHERE category = 'Manual' AND content LIKE '%![%'").fetchone()[0]
     
@@ -301,6 +316,7 @@ def main():
         print(f"   内容: {test[1]}...")
     
     conn.close()
+    instrument.finish(pages=page_ir.page_count, images=len(images), articles=count)
     print("\n" + "=" * 70)
 
 if __name__ == '__main__':
@@ -4,6 +4,8 @@
 - 按标题层级分割章节
 - 保留完整Markdown格式
 - 图片、表格、列表原生支持
+- --report=path / --no-report / --profile[=path] / --trace-memory: 分阶段耗时与内存的JSON报告（默认写到
+  Markdown所在目录的 .ingest_reports/）和可选的 cProfile 文件（见 instrument）
 """
 
 import sys
@@ -11,6 +13,10 @@ import os
 import sqlite3
 import re
 from pathlib import Path
+from headings import markdown_heading
+from sections import SectionBuilder
+from script_args import split_args
+from instrument import open_instrument
 
 def generate_slug(title):
     """生成URL友好的slug"""
@@ -19,49 +25,46 @@ def generate_slug(title):
     return slug.lower()[:100]
 
 def parse_markdown_sections(md_content):
-    """按标题解析Markdown章节"""
+    """按标题解析Markdown章节（支持# ## ###，单次逐行遍历）"""
     sections = []
-    
-    # 按标题分割（支持# ## ###）
-    parts = re.split(r'^(#{1,3}\s+.+)$', md_content, flags=re.MULTILINE)
-    
     current_section = None
+    body_lines = []
     
-    for i, part in enumerate(parts):
-        part = part.strip()
-        if not part:
-            continue
-        
+    def flush_body():
+        # 标题之间的正文整体去除首尾空白后加入当前章节
+        part = '\n'.join(body_lines).strip()
+        body_lines.clear()
+        if part and current_section:
+            current_section.append(part + '\n\n')
+    
+    for line in md_content.split('\n'):
         # 检测是否是标题
-        heading_match = re.match(r'^(#{1,3})\s+(.+)$', part)
+        heading = markdown_heading(line)
         
-        if heading_match:
+        if heading:
+            flush_body()
+            
             # 保存上一个章节
-            if current_section and current_section['content'].strip():
-                sections.append(current_section)
+            if current_section and current_section.has_content:
+                sections.append(current_section.finalize())
             
             # 开始新章节
-            level = len(heading_match.group(1))
-            title = heading_match.group(2).strip()
+            level, title = heading
             
             # 清理标题中的锚点链接
             title = re.sub(r'<a id="[^"]+"></a>', '', title)
             title = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', title)
             title = title.strip()
             
-            current_section = {
-                'title': title,
-                'level': level,
-                'content': f"{'#' * level} {title}\n\n"
-            }
+            current_section = SectionBuilder(f"{'#' * level} {title}\n\n", title=title, level=level)
         else:
-            # 添加到当前章节内容
-            if current_section:
-                current_section['content'] += part + '\n\n'
+            body_lines.append(line)
+    
+    flush_body()
     
     # 保存最后一个章节
-    if current_section and current_section['content'].strip():
-        sections.append(current_section)
+    if current_section and current_section.has_content:
+        sections.append(current_section.finalize())
     
     return sections
 
@@ -121,12 +124,14 @@ def import_to_database(sections, db_path, product_line='A', product_models='["MA
     return imported
 
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python3 import_from_markdown.py <md_path> <db_path> [--remote]")
+    args, options = split_args(sys.argv[1:])
+    
+    if len(args) < 2:
+        print("Usage: python3 import_from_markdown.py <md_path> <db_path> [--remote] [--report=path] [--no-report] [--profile[=path]] [--trace-memory]")
         sys.exit(1)
     
-    md_path = sys.argv[1]
-    db_path = sys.argv[2]
+    md_path = args[0]
+    db_path = args[1]
     
     if not os.path.exists(md_path):
         print(f"❌ Markdown文件不存在: {md_path}")
@@ -136,19 +141,26 @@ def main():
         print(f"❌ 数据库不存在: {db_path}")
         sys.exit(1)
     
+    instrument = open_instrument(options, 'import_from_markdown', os.path.dirname(os.path.abspath(md_path)))
+    
     print(f"[1/3] 读取Markdown文件: {md_path}")
-    with open(md_path, 'r', encoding='utf-8') as f:
-        md_content = f.read()
+    with instrument.stage('open'):
+        with open(md_path, 'r', encoding='utf-8') as f:
+            md_content = f.read()
     
     print(f"[2/3] 解析章节...")
-    sections = parse_markdown_sections(md_content)
+    with instrument.stage('sections', bytes=len(md_content)) as s:
+        sections = parse_markdown_sections(md_content)
+        s.count(sections=len(sections))
     print(f"✅ 解析了 {len(sections)} 个章节")
     
     print(f"[3/3] 导入到数据库...")
-    imported = import_to_database(sections, db_path)
+    with instrument.stage('db_write', articles=len(sections)):
+        imported = import_to_database(sections, db_path)
     
     print(f"\n✅ 成功导入 {imported} 篇文章到数据库")
-    print(f"📊 统计: {len(sections)} 个章节")
+    print(f"📊 统计: {len(sections)} 个章节，{sum(s['content_bytes'] for s in sections) / 1024:.1f}KB")
+    instrument.finish(sections=len(sections), articles=imported)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+后台导入任务执行器（import_jobs 表，见 service/migrations/050_import_jobs.sql）
+- 服务端写入 status='queued' 的任务后轮询进度，转换不再占用服务端的请求处理
+- 本进程轮询取出任务，--concurrency=N 限制同时执行的任务数，每个任务在进程池中执行
+- 执行中按阶段写回进度（阶段、已处理页数、已编码图片数），最多每秒写一次；文章写入数由服务端更新
+- 转换完成后 status='converted'，result 为转换结果 JSON；失败时 status='failed'，error 为原因
+- 取任务时记录本进程 pid；启动时只把执行器进程已不存在的 running 任务标记为失败
+- stdin 关闭（服务端退出或重启）后不再取新任务，进行中的任务完成后标记为失败（服务端不会再写入文章）并退出
+- 服务端等待超时后已标记为失败的任务：尚未开始的取消，已在执行的记录日志，完成时结果忽略
+- 队列为空时只做普通查询，有排队任务时才开写事务取任务
+
+任务类型与参数（与 conversion_worker 的同名方法相同）:
+    docx_to_html        {docx_path, output_html_path, images_dir, options}
+    extract_pdf_images  {pdf_path, output_dir, options}
+
+用法:
+    python3 import_jobs.py <db_path> [--concurrency=N] [--poll=秒] [--once]
+    --once: 执行完当前队列后退出
+    stdin 关闭时也会停止（服务端以管道启动本进程，退出时管道随之关闭）
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from script_args import split_args, int_option
+
+DEFAULT_CONCURRENCY = 1
+
+# 队列为空时的轮询间隔（秒）
+DEFAULT_POLL = 1.0
+
+# 进度最多每隔多少秒写一次数据库
+PROGRESS_INTERVAL = 1.0
+
+
+def log(message):
+    """输出到 stderr（服务端已退出、管道已关闭时忽略）"""
+    try:
+        print(message, file=sys.stderr, flush=True)
+    except (BrokenPipeError, ValueError):
+        pass
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class JobProgress:
+    """
+    任务进度写回（在执行任务的进程中使用，单独的数据库连接）
+
+    用法:
+        progress = JobProgress(db_path, job_id)
+        progress.update(stage='提取图片', pages_total=120)
+        progress.update(pages_done=3, images_encoded=7)
+        progress.close()
+    """
+
+    FIELDS = ('stage', 'pages_total', 'pages_done', 'images_encoded')
+
+    def __init__(self, db_path, job_id):
+        self.conn = connect(db_path)
+        self.job_id = job_id
+        self.values = {}
+        self.dirty = False
+        self.last_write = 0.0
+
+    def update(self, force=False, **fields):
+        self.values.update(fields)
+        self.dirty = True
+        # 阶段变化立即写入，计数按间隔合并写入
+        if force or 'stage' in fields or time.monotonic() - self.last_write >= PROGRESS_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self.dirty:
+            return
+        columns = [key for key in self.FIELDS if key in self.values]
+        self.conn.execute(
+            f"UPDATE import_jobs SET {', '.join(f'{key} = ?' for key in columns)}, updated_at = datetime('now') "
+            f"WHERE id = ?", [self.values[key] for key in columns] + [self.job_id])
+        self.dirty = False
+        self.last_write = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def _docx_to_html_job(progress, docx_path, output_html_path, images_dir, options=None):
+    from docx_to_html import run_conversion
+
+    progress.update(stage='转换DOCX')
+    stats = run_conversion(docx_path, output_html_path, images_dir, options or {})
+    progress.update(stage='转换完成', images_encoded=stats['image_count'])
+    return stats
+
+
+def _extract_pdf_images_job(progress, pdf_path, output_dir, options=None):
+    import fitz  # PyMuPDF
+    from extract_pdf_images import run_extraction
+
+    with fitz.open(pdf_path) as pdf_doc:
+        pages_total = pdf_doc.page_count
+    progress.update(stage='提取图片', pages_total=pages_total)
+
+    def on_image(img):
+        # 串行提取按页顺序输出图片，图片所在页即已处理到的页
+        progress.update(images_encoded=progress.values.get('images_encoded', 0) + 1,
+                        pages_done=max(progress.values.get('pages_done', 0), img['page']))
+
+    images = run_extraction(pdf_path, output_dir, options or {}, on_image)
+    progress.update(stage='转换完成', pages_done=pages_total)
+    return {'images': images}
+
+
+JOB_TYPES = {
+    'docx_to_html': _docx_to_html_job,
+    'extract_pdf_images': _extract_pdf_images_job,
+}
+
+
+def run_job(db_path, job_id, job_type, params):
+    """在池进程中执行一个任务，返回转换结果"""
+    progress = JobProgress(db_path, job_id)
+    try:
+        return JOB_TYPES[job_type](progress, **params)
+    finally:
+        progress.close()
+
+
+def claim_job(conn):
+    """取出最早的排队任务并标记为 running，队列为空时返回 None"""
+    # 空闲轮询只做普通查询；有排队任务时才开写事务，不会每次轮询都占用服务端数据库的写锁
+    if conn.execute("SELECT 1 FROM import_jobs WHERE status = 'queued' LIMIT 1").fetchone() is None:
+        return None
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        job = conn.execute(
+            "SELECT id, job_type, params FROM import_jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if job:
+            conn.execute(
+                "UPDATE import_jobs SET status = 'running', stage = '等待执行', runner_pid = ?, "
+                "started_at = datetime('now'), updated_at = datetime('now') WHERE id = ?", (os.getpid(), job['id']))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return job
+
+
+def finish_job(conn, job_id, result=None, error=None):
+    """
+    写回任务结果；任务已不在执行中（服务端等待超时后已标记为失败）时忽略，返回 False
+    """
+    if error is None:
+        cursor = conn.execute(
+            "UPDATE import_jobs SET status = 'converted', result = ?, finished_at = datetime('now'), "
+            "updated_at = datetime('now') WHERE id = ? AND status = 'running'",
+            (json.dumps(result, ensure_ascii=False), job_id))
+    else:
+        cursor = conn.execute(
+            "UPDATE import_jobs SET status = 'failed', error = ?, finished_at = datetime('now'), "
+            "updated_at = datetime('now') WHERE id = ? AND status = 'running'", (error, job_id))
+    return cursor.rowcount > 0
+
+
+def runner_alive(pid):
+    """执行器进程是否仍在运行"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def fail_stale_jobs(conn):
+    """
+    执行器进程已不存在的 running 任务不会再有结果，标记为失败
+    （服务端重启时上一个执行器可能仍在完成进行中的任务，这些任务不受影响）
+    """
+    jobs = conn.execute("SELECT id, runner_pid FROM import_jobs WHERE status = 'running'").fetchall()
+    stale = [job['id'] for job in jobs if not runner_alive(job['runner_pid'])]
+    for job_id in stale:
+        conn.execute(
+            "UPDATE import_jobs SET status = 'failed', error = '任务执行器异常退出', finished_at = datetime('now'), "
+            "updated_at = datetime('now') WHERE id = ? AND status = 'running'", (job_id,))
+    if stale:
+        log(f"⚠ {len(stale)} 个任务的执行器已退出，已标记为失败")
+
+
+def job_statuses(conn, job_ids):
+    """{job_id: status}"""
+    placeholders = ', '.join('?' * len(job_ids))
+    rows = conn.execute(f"SELECT id, status FROM import_jobs WHERE id IN ({placeholders})", list(job_ids))
+    return {row['id']: row['status'] for row in rows}
+
+
+class JobRunner:
+    """
+    任务轮询与调度
+
+    用法:
+        runner = JobRunner(db_path, concurrency=2)
+        runner.run(poll=1.0, once=False, stop=threading.Event())
+    """
+
+    def __init__(self, db_path, concurrency=DEFAULT_CONCURRENCY):
+        self.db_path = db_path
+        self.concurrency = concurrency
+        self.conn = connect(db_path)
+        self.running = {}  # future -> (job_id, job_type, started)
+        self.abandoned = set()  # 服务端已放弃等待、仍在执行的任务
+        self.stopping = False
+        self.stats = {'converted': 0, 'failed': 0}
+
+    def submit(self, pool):
+        """在并发上限内提交排队的任务，返回提交数"""
+        submitted = 0
+        while len(self.running) < self.concurrency:
+            job = claim_job(self.conn)
+            if job is None:
+                break
+            job_id, job_type = job['id'], job['job_type']
+            try:
+                params = json.loads(job['params'])
+                if job_type not in JOB_TYPES or not isinstance(params, dict):
+                    raise ValueError(f"无效的任务: {job_type}")
+            except ValueError as e:
+                finish_job(self.conn, job_id, error=str(e))
+                self.stats['failed'] += 1
+                continue
+
+            log(f"▶ 任务 {job_id}: {job_type}")
+            try:
+                future = pool.submit(run_job, self.db_path, job_id, job_type, params)
+            except BrokenProcessPool:
+                # 任务放回队列，由 run() 重建进程池后再执行
+                self.conn.execute("UPDATE import_jobs SET status = 'queued' WHERE id = ?", (job_id,))
+                raise
+            self.running[future] = (job_id, job_type, time.perf_counter())
+            submitted += 1
+        return submitted
+
+    def check_abandoned(self):
+        """服务端等待超时后会把任务标记为失败：尚未开始的取消，已在执行的只能等它完成（结果忽略）"""
+        running = {job_id: future for future, (job_id, _, _) in self.running.items()
+                   if job_id not in self.abandoned}
+        if not running:
+            return
+        for job_id, status in job_statuses(self.conn, running).items():
+            if status == 'running':
+                continue
+            self.abandoned.add(job_id)
+            if running[job_id].cancel():
+                log(f"⚠ 任务 {job_id}: 服务端已放弃等待，已取消")
+            else:
+                log(f"⚠ 任务 {job_id}: 服务端已放弃等待，任务仍在执行，完成前占用一个并发名额")
+
+    def reap(self):
+        """写回已完成任务的结果"""
+        for future in [f for f in self.running if f.done()]:
+            job_id, job_type, started = self.running.pop(future)
+            self.abandoned.discard(job_id)
+            elapsed = time.perf_counter() - started
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                finish_job(self.conn, job_id, error=f"{type(e).__name__}: {e}")
+                self.stats['failed'] += 1
+                log(f"❌ 任务 {job_id}: {job_type} 失败 ({elapsed:.1f}s): {e}")
+                continue
+
+            if self.stopping:
+                # 服务端已退出，等待这个结果的请求已不存在，不会再写入文章
+                finish_job(self.conn, job_id, error='服务端已退出，转换结果未写入')
+                self.stats['failed'] += 1
+                log(f"⚠ 任务 {job_id}: {job_type} 完成 ({elapsed:.1f}s)，但服务端已退出，标记为失败")
+            elif not finish_job(self.conn, job_id, result=result):
+                log(f"⚠ 任务 {job_id}: {job_type} 完成 ({elapsed:.1f}s)，但服务端已放弃等待，结果忽略")
+            else:
+                self.stats['converted'] += 1
+                log(f"✓ 任务 {job_id}: {job_type} 完成 ({elapsed:.1f}s)")
+
+    def run(self, poll=DEFAULT_POLL, once=False, stop=None):
+        """
+        轮询执行任务；stop（threading.Event）置位后不再取新任务，进行中的任务完成后返回
+        """
+        stop = stop or threading.Event()
+        fail_stale_jobs(self.conn)
+
+        pool = ProcessPoolExecutor(max_workers=self.concurrency)
+        try:
+            while True:
+                self.stopping = stop.is_set()
+                self.reap()
+                if self.stopping:
+                    if not self.running:
+                        break
+                    time.sleep(min(poll, 0.2))
+                    continue
+
+                self.check_abandoned()
+                try:
+                    self.submit(pool)
+                except BrokenProcessPool:
+                    # 池进程异常退出（如解析PDF时崩溃）后重建进程池
+                    log("⚠ 任务进程池已损坏，重新启动")
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=self.concurrency)
+                    continue
+                if once and not self.running:
+                    break
+                stop.wait(poll if not self.running else min(poll, 0.2))
+        finally:
+            pool.shutdown(wait=True)
+
+    def format_stats(self):
+        return f"导入任务: 完成 {self.stats['converted']}，失败 {self.stats['failed']}"
+
+
+def watch_stdin(stop):
+    """stdin 关闭（服务端退出、重启或调用 stop()）时置位 stop"""
+    # 直接读文件描述符：本线程阻塞在 sys.stdin 上时持有其缓冲锁，fork 出的池进程关闭 stdin 时会死锁
+    fd = sys.stdin.fileno()
+    while os.read(fd, 4096):
+        pass
+    stop.set()
+
+
+def main():
+    args, options = split_args(sys.argv[1:])
+
+    if not args:
+        print("Usage: python3 import_jobs.py <db_path> [--concurrency=N] [--poll=秒] [--once]")
+        sys.exit(1)
+
+    concurrency = max(1, int_option(options, 'concurrency', DEFAULT_CONCURRENCY))
+    try:
+        poll = float(options.get('poll', DEFAULT_POLL))
+    except ValueError:
+        poll = DEFAULT_POLL
+
+    runner = JobRunner(args[0], concurrency)
+    log(f"导入任务执行器已启动 (pid {os.getpid()}, {concurrency} 并发)")
+
+    # 服务端退出时 stdin 随之关闭，执行器不会遗留下来与新的执行器争抢任务
+    stop = threading.Event()
+    threading.Thread(target=watch_stdin, args=(stop,), daemon=True).start()
+
+    try:
+        runner.run(poll, once=bool(options.get('once')), stop=stop)
+    except KeyboardInterrupt:
+        pass
+    except sqlite3.OperationalError as e:
+        log(f"❌ 数据库错误（是否已执行 050_import_jobs 迁移？）: {e}")
+        sys.exit(1)
+    finally:
+        log(runner.format_stats())
+
+
+if __name__ == '__main__':
+    main()
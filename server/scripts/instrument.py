@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+导入脚本的分阶段计时与内存统计
+- 每个阶段记录：调用次数、墙钟时间、CPU时间（本进程全部线程）、已回收子进程的CPU时间、峰值内存、处理数量
+- 峰值内存默认为阶段结束时本进程的峰值RSS；--trace-memory 时用 tracemalloc 记录阶段内的Python分配峰值
+  （嵌套阶段的峰值计入外层阶段；tracemalloc 会明显拖慢运行，只在排查内存时使用）
+- 同名阶段多次进入时累加（如逐页的 text / tables），报告中按首次进入的顺序排列
+- 运行结束（包括出错退出）时写出JSON报告：--report=path 指定路径，
+  默认写到 <输出目录>/.ingest_reports/<脚本>_<时间>.json，--no-report 不写
+- --profile[=path]: 同时用 cProfile 记录整个运行，写出 .prof 文件（默认与报告同名），可用 pstats / snakeviz 查看
+- 库函数通过模块级 stage() / count() 记录，未启用统计的进程（如进程池worker）中为空操作；
+  worker的CPU时间在进程池关闭、子进程被回收后计入当时所在的阶段
+
+用法:
+    instrument = open_instrument(options, 'extract_pdf_with_toc', output_dir)
+    with instrument.stage('toc') as s:
+        toc = pdf_doc.get_toc()
+        s.count(bookmarks=len(toc))
+    instrument.finish(pages=page_count)
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import resource
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+REPORT_DIR = '.ingest_reports'
+
+# 报告格式变化时递增
+REPORT_VERSION = 1
+
+# 当前进程中启用的统计（open_instrument 设置）
+_active = None
+
+
+def current_rss_mb():
+    """当前常驻内存(MB)；无法读取 /proc 时退回峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """本进程峰值常驻内存(MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为KB
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def children_cpu_seconds():
+    """已回收子进程的CPU时间（用户态 + 内核态）"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageStats:
+    """一个阶段的累计统计"""
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.children_cpu = 0.0
+        self.peak_mb = 0.0
+        self.counts = {}
+
+    def count(self, **counts):
+        """累加处理数量（如 pages=1, images=3）"""
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'calls': self.calls,
+            'wall_ms': round(self.wall * 1000, 1),
+            'cpu_ms': round(self.cpu * 1000, 1),
+            'children_cpu_ms': round(self.children_cpu * 1000, 1),
+            'peak_mb': round(self.peak_mb, 1),
+            'counts': self.counts,
+        }
+
+
+class _NullStage:
+    def count(self, **counts):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Instrument:
+    """
+    一次脚本运行的分阶段统计
+
+    report_path 为 None 时不写报告；profile_path 不为 None 时记录 cProfile
+    """
+
+    def __init__(self, script, report_path=None, profile_path=None, trace_memory=False):
+        self.script = script
+        self.report_path = report_path
+        self.profile_path = profile_path
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.stack = []  # [StageStats, 子阶段的内存峰值]
+        self.summary = {}
+        self.pid = os.getpid()
+        self.profiler = None
+        self.finished = False
+        self.started_at = None
+
+    @property
+    def active(self):
+        # fork 出的worker继承了对象，但不应记录
+        return not self.finished and os.getpid() == self.pid
+
+    def start(self):
+        global _active
+        self.started_at = datetime.now()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children_cpu = children_cpu_seconds()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile_path:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        _active = self
+        # 出错退出（sys.exit / 未捕获异常）时也写出报告
+        atexit.register(self.finish, success=False)
+        return self
+
+    def _traced_peak_mb(self):
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        记录一个阶段，返回的对象可继续 count(**counts) 累加处理数量
+
+        阶段可以嵌套，同名阶段多次进入时累加
+        """
+        if not self.active:
+            yield _NULL_STAGE
+            return
+
+        stats = self.stages.get(name)
+        if stats is None:
+            parent = self.stack[-1][0].name if self.stack else None
+            stats = self.stages[name] = StageStats(name, parent)
+        stats.count(**counts)
+
+        if self.trace_memory:
+            # 重置前把外层阶段到目前为止的峰值记下
+            if self.stack:
+                self.stack[-1][1] = max(self.stack[-1][1], self._traced_peak_mb())
+            tracemalloc.reset_peak()
+        frame = [stats, 0.0]
+        self.stack.append(frame)
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        children_cpu = children_cpu_seconds()
+        try:
+            yield stats
+        finally:
+            stats.calls += 1
+            stats.wall += time.perf_counter() - wall
+            stats.cpu += time.process_time() - cpu
+            stats.children_cpu += children_cpu_seconds() - children_cpu
+            self.stack.pop()
+
+            if self.trace_memory:
+                peak = max(self._traced_peak_mb(), frame[1])
+                if self.stack:
+                    self.stack[-1][1] = max(self.stack[-1][1], peak)
+            else:
+                peak = peak_rss_mb()
+            stats.peak_mb = max(stats.peak_mb, peak)
+
+    def count(self, name, **counts):
+        """不计时，只累加某个阶段的处理数量"""
+        if not self.active:
+            return
+        stats = self.stages.get(name)
+        if stats is None:
+            parent = self.stack[-1][0].name if self.stack else None
+            stats = self.stages[name] = StageStats(name, parent)
+        stats.count(**counts)
+
+    def report(self, success=True):
+        """报告内容（字典）"""
+        wall = time.perf_counter() - self._wall
+        report = {
+            'version': REPORT_VERSION,
+            'script': self.script,
+            'argv': sys.argv[1:],
+            'pid': self.pid,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'success': success,
+            'wall_ms': round(wall * 1000, 1),
+            'cpu_ms': round((time.process_time() - self._cpu) * 1000, 1),
+            'children_cpu_ms': round((children_cpu_seconds() - self._children_cpu) * 1000, 1),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'memory': 'tracemalloc' if self.trace_memory else 'rss',
+            'stages': [stats.to_dict() for stats in self.stages.values()],
+            'summary': self.summary,
+            'profile': self.profile_path,
+        }
+        if self.trace_memory:
+            report['traced_peak_mb'] = round(self._traced_peak_mb(), 1)
+        return report
+
+    def finish(self, success=True, **summary):
+        """
+        结束统计，写出报告和 cProfile 文件（重复调用时忽略）
+
+        summary 为写入报告的运行摘要（页数、章节数等）
+        """
+        if not self.active:
+            return None
+        global _active
+        self.summary.update(summary)
+        if self.profiler is not None:
+            self.profiler.disable()
+
+        report = self.report(success)
+        self.finished = True
+        if _active is self:
+            _active = None
+        atexit.unregister(self.finish)
+
+        try:
+            if self.profiler is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.profile_path)), exist_ok=True)
+                self.profiler.dump_stats(self.profile_path)
+            if self.report_path:
+                _write_report(self.report_path, report)
+        except OSError as e:
+            print(f"⚠ 运行报告写入失败: {e}", file=sys.stderr)
+            return report
+
+        if self.report_path:
+            print(f"      {self.format_stats(report)}", file=sys.stderr)
+            print(f"      运行报告: {self.report_path}", file=sys.stderr)
+        return report
+
+    def format_stats(self, report=None):
+        report = report or self.report()
+        stages = '，'.join(f"{stage['name']} {stage['wall_ms'] / 1000:.2f}s"
+                          for stage in report['stages'] if stage['parent'] is None)
+        return f"阶段耗时: {stages or '无'}（共 {report['wall_ms'] / 1000:.2f}s）"
+
+
+def _write_report(path, report):
+    """先写临时文件再原子替换"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def stage(name, **counts):
+    """在当前启用的统计中记录一个阶段，未启用时为空操作"""
+    if _active is None or not _active.active:
+        return nullcontext(_NULL_STAGE)
+    return _active.stage(name, **counts)
+
+
+def count(name, **counts):
+    """在当前启用的统计中累加某个阶段的处理数量，未启用时为空操作"""
+    if _active is not None:
+        _active.count(name, **counts)
+
+
+def open_instrument(options, script, report_dir):
+    """
+    根据 --report[=path] / --no-report / --profile[=path] / --trace-memory 选项开始统计
+
+    report_dir 为默认的报告目录（通常为输出目录），报告写到其下的 .ingest_reports/
+    """
+    report_path = None
+    if not options.get('no-report'):
+        value = options.get('report')
+        if value and value is not True:
+            report_path = value
+        else:
+            timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            report_path = os.path.join(report_dir or '.', REPORT_DIR, f'{script}_{timestamp}_{os.getpid()}.json')
+
+    profile_path = options.get('profile')
+    if profile_path is True:
+        base = os.path.splitext(report_path)[0] if report_path else os.path.join(report_dir or '.', script)
+        profile_path = base + '.prof'
+
+    return Instrument(script, report_path, profile_path, bool(options.get('trace-memory'))).start()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+NDJSON流式输出（--ndjson）
+- 每条记录单独一行JSON，生成后立即写出并刷新stdout
+- 记录带 type 字段：toc / image / section / stats / error
+- 调用方可以边读边处理，不必等待整份文档提取完成再解析一个大JSON
+"""
+
+import sys
+import json
+
+
+def emit_record(record_type, **fields):
+    """写出一条NDJSON记录"""
+    record = {'type': record_type}
+    record.update(fields)
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+    sys.stdout.flush()
+
+
+def emit_image(page_num, img):
+    """on_image 回调：写出一条图片记录"""
+    emit_record('image', page=page_num, **img)
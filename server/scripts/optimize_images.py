@@ -3,15 +3,19 @@
 优化知识库图片
 - 压缩PNG图片（保持视觉质量）
 - 转换为WebP格式（更小体积）
+- --webp-profile=fast|balanced|max 选择编码档位（默认max）
 """
 
 import os
+import sys
 from pathlib import Path
 from PIL import Image
+from image_encoding import WEBP_ENCODER, profile_option, save_encoded
+from script_args import split_args
 
 IMAGE_DIR = "/Users/Kine/Documents/Kinefinity/KineCore/Pool/qoder/Longhorn/server/data/knowledge_images"
 
-def optimize_image(filepath):
+def optimize_image(filepath, encoder=WEBP_ENCODER):
     """压缩单个图片"""
     try:
         img = Image.open(filepath)
@@ -19,21 +23,11 @@ def optimize_image(filepath):
         # 原始大小
         original_size = os.path.getsize(filepath)
         
-        # 转换为RGB（WebP不支持RGBA透明度）
-        if img.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-        
         # 生成WebP文件名
         webp_path = filepath.rsplit('.', 1)[0] + '.webp'
         
-        # 保存为WebP（质量85，平衡体积和质量）
-        img.save(webp_path, 'WEBP', quality=85, method=6)
+        # 保存为WebP（透明区域铺白底，质量/速度由编码档位决定）
+        save_encoded(img, webp_path, encoder)
         
         webp_size = os.path.getsize(webp_path)
         reduction = (1 - webp_size / original_size) * 100
@@ -51,6 +45,13 @@ def optimize_image(filepath):
         return 0, 0
 
 def main():
+    _, options = split_args(sys.argv[1:])
+    try:
+        encoder = profile_option(options)
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    
     print("=" * 60)
     print("优化知识库图片")
     print("=" * 60)
@@ -67,7 +68,7 @@ def main():
     total_optimized = 0
     
     for png_file in png_files:
-        optimized, original = optimize_image(str(png_file))
+        optimized, original = optimize_image(str(png_file), encoder)
         total_optimized += optimized
         total_original += original
     
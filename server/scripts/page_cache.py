@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+按页指纹的增量提取缓存（同一手册的新版本只重新处理改动过的页）
+- 页指纹 = 页面文本哈希 + 页内各图片原始流(xref stream)的哈希，不依赖页码，
+  插入/删除页面后其余页面仍可命中
+- SQLite缓存：指纹 + 种类（图片映射 / pdfplumber文本表格 / PyMuPDF文本表格）→ JSON
+- 图片映射记录该页"认领"的图片和依赖前面页面已出现的图片，复用时按本次的页序重新校验，
+  跨页去重结果与完整提取一致；校验不通过或输出文件已丢失时重新提取该页
+- 结束时报告复用页数与重新提取页数
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import fitz  # PyMuPDF
+from image_store import encoder_id
+
+CACHE_NAME = '.page_cache.sqlite'
+
+# 提取逻辑变化时递增，使旧缓存失效
+CACHE_VERSION = 2
+
+# 每写入多少条记录提交一次
+COMMIT_EVERY = 50
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def page_fingerprints(pdf_doc):
+    """
+    计算每页指纹
+
+    Returns:
+        [(fingerprint, xrefs, raw_hashes)]，按页序；raw_hashes 与 get_images 顺序一致
+    """
+    pages = []
+    stream_hashes = {}
+
+    for page in pdf_doc:
+        xrefs = [img_info[0] for img_info in page.get_images(full=True)]
+        raw_hashes = []
+        for xref in xrefs:
+            if xref not in stream_hashes:
+                try:
+                    stream_hashes[xref] = _digest(pdf_doc.xref_stream_raw(xref) or b'')
+                except Exception:
+                    stream_hashes[xref] = f'xref{xref}'
+            raw_hashes.append(stream_hashes[xref])
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update(page.get_text().encode('utf-8', 'surrogatepass'))
+        for raw_hash in raw_hashes:
+            h.update(raw_hash.encode())
+        pages.append((h.hexdigest(), xrefs, raw_hashes))
+
+    return pages
+
+
+class PageCache:
+    """
+    单次提取运行使用的页缓存
+
+    用法:
+        with PageCache(cache_path, pdf_path) as cache:
+            images = cache.page_images(kind, page_num, extract, seen_xrefs, extracted_hashes, images_dir)
+            text, tables = cache.page_content('pdfplumber', page_num, extract)
+    """
+
+    def __init__(self, cache_path, pdf_path):
+        self.cache_path = cache_path
+        self.reused = set()
+        self.recomputed = set()
+        self._claimed = set()
+        self._pending = 0
+
+        with fitz.open(pdf_path) as pdf_doc:
+            self.pages = page_fingerprints(pdf_doc)
+
+        self.conn = sqlite3.connect(cache_path, timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                fingerprint TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at TEXT DEFAULT (datetime('now')),
+                PRIMARY KEY (fingerprint, kind)
+            )
+        """)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def _key(self, kind, page_num):
+        return self.pages[page_num - 1][0], f'v{CACHE_VERSION}:{kind}'
+
+    def lookup(self, kind, page_num):
+        """取出缓存的数据，未命中返回 None"""
+        row = self.conn.execute(
+            "SELECT data FROM pages WHERE fingerprint = ? AND kind = ?", self._key(kind, page_num)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, kind, page_num, data):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (fingerprint, kind, data) VALUES (?, ?, ?)",
+            self._key(kind, page_num) + (json.dumps(data, ensure_ascii=False),)
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+    def mark(self, page_num, reused):
+        (self.reused if reused else self.recomputed).add(page_num)
+
+    def page_content(self, kind, page_num, extract):
+        """
+        取出页面的 (text, tables)，未命中时调用 extract() 提取并写入缓存
+        """
+        cached = self.lookup(kind, page_num)
+        if cached is not None:
+            self.mark(page_num, True)
+            return cached['text'], cached['tables']
+
+        text, tables = extract()
+        self.save(kind, page_num, {'text': text, 'tables': tables})
+        self.mark(page_num, False)
+        return text, tables
+
+    def page_images(self, kind, page_num, extract, seen_xrefs, extracted_hashes, images_dir):
+        """
+        取出页面的图片映射，未命中或校验不通过时调用 extract() 提取并写入缓存
+
+        必须按页序调用；seen_xrefs / extracted_hashes 为提取函数使用的跨页去重集合，
+        复用时同步更新，后续重新提取的页面去重结果不受影响
+        """
+        _, xrefs, raw_hashes = self.pages[page_num - 1]
+        cached = self.lookup(kind, page_num)
+
+        if cached is not None and self._images_reusable(cached, images_dir):
+            seen_xrefs.update(xrefs)
+            extracted_hashes.update(cached['keys'])
+            self._claimed.update(cached['claims'])
+            self.mark(page_num, True)
+            return cached['images']
+
+        # 依赖前面页面（或本页更早位置）已出现的图片 / 本页首次出现的图片
+        needs = []
+        claims = []
+        for raw_hash in raw_hashes:
+            if raw_hash in self._claimed or raw_hash in claims:
+                needs.append(raw_hash)
+            else:
+                claims.append(raw_hash)
+
+        known_hashes = set(extracted_hashes)
+        images = extract()
+        self._claimed.update(claims)
+
+        self.save(kind, page_num, {
+            'images': images,
+            'needs': needs,
+            'claims': claims,
+            'keys': sorted(extracted_hashes - known_hashes)
+        })
+        self.mark(page_num, False)
+        return images
+
+    def _images_reusable(self, cached, images_dir):
+        # 依赖的图片必须已由前面的页面认领，本页认领的图片不能已被认领（否则本次应视为重复）
+        claims = set(cached['claims'])
+        if not all(raw_hash in self._claimed or raw_hash in claims for raw_hash in cached['needs']):
+            return False
+        if any(raw_hash in self._claimed for raw_hash in cached['claims']):
+            return False
+        return all(os.path.exists(os.path.join(images_dir, img['filename'])) for img in cached['images'])
+
+    def format_stats(self):
+        reused = len(self.reused - self.recomputed)
+        return f"页缓存: 复用 {reused} 页，重新提取 {len(self.recomputed)} 页"
+
+
+def images_kind(encoder, store=None):
+    """图片映射的缓存种类：编码参数和是否使用图片库都会影响文件名"""
+    if store is not None:
+        return 'images:store:' + encoder_id(store.encoder)
+    return 'images:' + encoder_id(encoder)
+
+
+def open_page_cache(options, pdf_path, output_dir):
+    """根据 --page-cache[=path] 选项打开页缓存，未指定时返回 None"""
+    value = options.get('page-cache')
+    if not value:
+        return None
+    return PageCache(os.path.join(output_dir, CACHE_NAME) if value is True else value, pdf_path)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+PDF逐页中间表示（IR）缓存：调整章节切分或图片放置时不必重新解析PDF、重新解码图片
+- 每页记录文本行（文本、字号、是否粗体，与 headings.pdf_lines 相同）
+- 另记录各脚本的图片提取结果（页码、文件名、尺寸、路径，按脚本自定的 kind 区分）：
+  PDF未变且图片文件都在时直接复用，不再逐张解码
+- 以PDF内容哈希为键写入 gzip 压缩的 JSON（每页用数组而非字典，体积小），
+  PDF内容变化时哈希不同，IR_VERSION 变化时旧文件作废，都会重新解析
+- 未指定 --page-ir 时照常解析、提取，不写缓存；文本行与缓存的完全相同
+
+用法:
+    page_ir = open_page_ir(options, pdf_path, output_dir)
+    images = page_ir.images('edge6k_png', lambda: extract_images_from_pdf(pdf_doc), output_dir)
+    for page_num, line, heading in detect_headings(page_ir.lines()):
+        ...
+"""
+
+import os
+import sys
+import gzip
+import json
+import hashlib
+import fitz  # PyMuPDF
+from headings import page_lines
+
+IR_PREFIX = '.page_ir_'
+
+# 解析逻辑或格式变化时递增，使旧缓存失效
+IR_VERSION = 3
+
+
+def pdf_content_hash(pdf_path):
+    """PDF文件内容哈希（BLAKE2b，分块读取）"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_page(page):
+    """
+    解析一页
+
+    Returns:
+        [[text, size, bold], ...]
+    """
+    return [[text, size, bold] for text, size, bold in page_lines(page)]
+
+
+class PageIR:
+    """
+    整份PDF的逐页中间表示
+
+    pages[i] 为第 i+1 页的文本行（见 parse_page）；extracted 为 {kind: 图片提取结果}；
+    path 为缓存文件路径（未指定 --page-ir 时为 None，不写缓存）
+    """
+
+    def __init__(self, pages, pdf_hash, extracted=None, path=None, cached=False):
+        self.pages = pages
+        self.pdf_hash = pdf_hash
+        self.extracted = extracted or {}
+        self.path = path
+        self.cached = cached
+        self.images_cached = False
+
+    @property
+    def page_count(self):
+        return len(self.pages)
+
+    def lines(self):
+        """
+        Yields:
+            (page_num, text, size, bold)，与 headings.pdf_lines 相同
+        """
+        for page_index, lines in enumerate(self.pages):
+            for text, size, bold in lines:
+                yield page_index + 1, text, size, bold
+
+    def images(self, kind, extract, images_dir):
+        """
+        图片提取结果：缓存中有 kind 的结果且其中的图片文件都在 images_dir 中时直接返回，
+        否则调用 extract() 提取（并写入缓存）
+
+        Args:
+            kind: 提取方式的名称（文件名规则、过滤条件不同的提取用不同的 kind）
+            extract: 返回 [{'page', 'filename', ...}] 的函数
+
+        Returns:
+            extract() 的结果
+        """
+        cached = self.extracted.get(kind)
+        if cached is not None and all(os.path.exists(os.path.join(images_dir, img['filename'])) for img in cached):
+            self.images_cached = True
+            return cached
+
+        images = extract()
+        self.extracted[kind] = images
+        if self.path is not None:
+            save_page_ir(self.path, self)
+        return images
+
+    def format_stats(self):
+        source = "复用缓存" if self.cached else "重新解析"
+        lines = sum(len(page) for page in self.pages)
+        stats = f"页面IR: {source}，{self.page_count} 页，{lines} 行"
+        if self.images_cached:
+            stats += "，图片复用缓存"
+        return stats
+
+
+def build_page_ir(pdf_doc, pdf_hash, path=None):
+    """逐页解析PDF"""
+    return PageIR([parse_page(page) for page in pdf_doc], pdf_hash, path=path)
+
+
+def ir_path(cache_dir, pdf_hash):
+    return os.path.join(cache_dir, f'{IR_PREFIX}{pdf_hash}.json.gz')
+
+
+def load_page_ir(path, pdf_hash):
+    """读取缓存，文件不存在、版本或哈希不符时返回 None"""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8', errors='surrogatepass') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠ 页面IR缓存无法读取，重新解析: {e}", file=sys.stderr)
+        return None
+
+    if data.get('version') != IR_VERSION or data.get('pdf_hash') != pdf_hash:
+        return None
+    return PageIR(data['pages'], pdf_hash, data.get('extracted'), path, cached=True)
+
+
+def save_page_ir(path, page_ir):
+    """先写临时文件再原子替换"""
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', errors='surrogatepass', compresslevel=6) as f:
+        json.dump({'version': IR_VERSION, 'pdf_hash': page_ir.pdf_hash, 'pages': page_ir.pages,
+                   'extracted': page_ir.extracted},
+                  f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def open_page_ir(options, pdf_path, output_dir, pdf_doc=None):
+    """
+    根据 --page-ir[=dir] 选项取得页面IR：命中缓存时直接读取，否则解析PDF（并写入缓存）
+
+    未指定 --page-ir 时只解析文本行，不缓存；pdf_doc 为已打开的文档，未传入时按需打开
+    """
+    value = options.get('page-ir')
+    pdf_hash = None
+    path = None
+
+    if value:
+        cache_dir = output_dir if value is True else value
+        os.makedirs(cache_dir, exist_ok=True)
+        pdf_hash = pdf_content_hash(pdf_path)
+        path = ir_path(cache_dir, pdf_hash)
+        page_ir = load_page_ir(path, pdf_hash)
+        if page_ir is not None:
+            return page_ir
+
+    if pdf_doc is not None:
+        page_ir = build_page_ir(pdf_doc, pdf_hash, path)
+    else:
+        with fitz.open(pdf_path) as doc:
+            page_ir = build_page_ir(doc, pdf_hash, path)
+
+    if path is not None:
+        save_page_ir(path, page_ir)
+    return page_ir
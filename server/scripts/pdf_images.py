@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+PDF图片提取公共逻辑
+- 解码前预过滤：按xref去重，直接用 get_images(full=True) 中的宽高过滤小图
+- 并行提取：按页码范围分片，每个worker进程持有一个独立的fitz句柄
+- 第一阶段：各分片提取图片字节，计算hash和尺寸
+- 第二阶段：主进程按页序全局去重，只把首次出现的图片分发给worker转WebP
+- 去重结果、文件名和输出顺序与串行路径完全一致
+- 可选接入内容寻址图片库（image_store），已编码过的图片直接复用
+"""
+
+import os
+import io
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+from PIL import Image
+from image_encoding import WEBP_ENCODER, save_encoded
+from image_store import content_key
+
+MIN_IMAGE_SIZE = 50
+
+# worker进程内的PDF句柄（由 _init_worker 打开）
+_worker_doc = None
+
+
+def new_scan_stats():
+    """图片扫描计数：跳过的重复xref / 小图 / 重复内容，以及实际解码数"""
+    return {'skipped_xref': 0, 'skipped_small': 0, 'skipped_duplicate': 0, 'decoded': 0}
+
+
+def merge_scan_stats(total, stats):
+    for key, value in stats.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def format_scan_stats(stats):
+    skipped = stats['skipped_xref'] + stats['skipped_small'] + stats['skipped_duplicate']
+    return (f"跳过 {skipped} 张（重复xref {stats['skipped_xref']}，小图 {stats['skipped_small']}，"
+            f"重复内容 {stats['skipped_duplicate']}），解码 {stats['decoded']} 张")
+
+
+def candidate_images(page, seen_xrefs, stats, min_size=MIN_IMAGE_SIZE):
+    """
+    解码前预过滤页面图片
+
+    - 同一xref在文档内只处理一次（Logo、图标等跨页复用的图片）
+    - 使用 get_images(full=True) 元组中的宽高过滤小图，无需提取字节
+
+    Returns:
+        通过过滤的 img_info 列表
+    """
+    candidates = []
+
+    for img_info in page.get_images(full=True):
+        xref, width, height = img_info[0], img_info[2], img_info[3]
+
+        if xref in seen_xrefs:
+            stats['skipped_xref'] += 1
+            continue
+        seen_xrefs.add(xref)
+
+        if width < min_size or height < min_size:
+            stats['skipped_small'] += 1
+            continue
+
+        candidates.append(img_info)
+
+    return candidates
+
+
+def store_image(store, image_bytes, extracted_hashes, scan_stats, min_size=MIN_IMAGE_SIZE):
+    """
+    通过内容寻址图片库处理一张图片（串行路径共用）
+
+    Returns:
+        (filename, width, height)；重复或小图返回 None
+    """
+    key = content_key(image_bytes)
+    if key in extracted_hashes:
+        scan_stats['skipped_duplicate'] += 1
+        return None
+    extracted_hashes.add(key)
+
+    entry = store.get_or_encode(image_bytes, key=key, min_size=min_size)
+    if entry is None:
+        return None
+    return entry['filename'], entry['width'], entry['height']
+
+
+def _init_worker(pdf_path):
+    global _worker_doc
+    _worker_doc = fitz.open(pdf_path)
+
+
+def _scan_pages(page_start, page_end, full_hash=False):
+    """
+    扫描 [page_start, page_end) 范围内的图片
+
+    Args:
+        full_hash: 使用图片库的完整内容哈希（否则为md5前12位）
+
+    Returns:
+        (records, stats): records 为 [(page_num, xref, img_hash, size, nbytes, error)]，
+        按页序和页内顺序排列；extract_image失败时 img_hash 为 None，
+        无法识别尺寸时 size 为 None
+    """
+    records = []
+    seen_xrefs = set()
+    stats = new_scan_stats()
+
+    for page_num in range(page_start, page_end):
+        page = _worker_doc[page_num]
+        for img_info in candidate_images(page, seen_xrefs, stats):
+            xref = img_info[0]
+            stats['decoded'] += 1
+            try:
+                image_bytes = _worker_doc.extract_image(xref)["image"]
+            except Exception as e:
+                records.append((page_num, xref, None, None, 0, str(e)))
+                continue
+
+            if full_hash:
+                img_hash = content_key(image_bytes)
+            else:
+                img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
+            try:
+                size = Image.open(io.BytesIO(image_bytes)).size
+            except Exception as e:
+                records.append((page_num, xref, img_hash, None, len(image_bytes), str(e)))
+                continue
+
+            records.append((page_num, xref, img_hash, size, len(image_bytes), None))
+
+    return records, stats
+
+
+def _encode_images(tasks, output_dir, encoder=WEBP_ENCODER):
+    """
+    将一批图片按编码参数保存（默认WebP）
+
+    Args:
+        tasks: [(page_num, xref, filename)]
+
+    Returns:
+        [(filename, error)]，成功时 error 为 None
+    """
+    results = []
+
+    for page_num, xref, filename in tasks:
+        try:
+            image_bytes = _worker_doc.extract_image(xref)["image"]
+            img = Image.open(io.BytesIO(image_bytes))
+            save_encoded(img, os.path.join(output_dir, filename), encoder)
+            results.append((filename, None))
+        except Exception as e:
+            results.append((filename, str(e)))
+
+    return results
+
+
+def _chunk_ranges(total, chunks):
+    """将 [0, total) 切分为最多 chunks 段连续区间"""
+    chunks = max(1, min(chunks, total))
+    step, extra = divmod(total, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        end = start + step + (1 if i < extra else 0)
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def extract_images_parallel(pdf_path, output_dir, workers, on_error=None, scan_stats=None, store=None,
+                            encoder=WEBP_ENCODER):
+    """
+    多进程提取PDF图片并转WebP
+
+    Args:
+        pdf_path: PDF文件路径
+        output_dir: 图片输出目录
+        workers: 进程数
+        on_error: 可选回调 on_error(page_num, message)，page_num 从1开始
+        scan_stats: 可选计数字典（new_scan_stats），累加各分片的预过滤计数
+        store: 可选 ImageStore；命中的图片不再编码，文件名由图片库决定
+        encoder: 编码参数（未使用图片库时生效，见 image_encoding.WEBP_PROFILES）
+
+    Returns:
+        [{'page', 'filename', 'path', 'width', 'height'}]，顺序与串行提取一致
+    """
+    with fitz.open(pdf_path) as pdf_doc:
+        page_count = pdf_doc.page_count
+
+    if page_count == 0:
+        return []
+
+    # 切得比进程数更细，平衡图片分布不均的页面
+    page_ranges = _chunk_ranges(page_count, workers * 4)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pdf_path,)) as pool:
+        scan_futures = [pool.submit(_scan_pages, start, end, store is not None) for start, end in page_ranges]
+
+        # 按页序全局去重（与串行路径相同：小图和无法识别的图片同样占用hash）
+        extracted_hashes = set()
+        selected = []
+        for future in scan_futures:
+            records, stats = future.result()
+            if scan_stats is not None:
+                merge_scan_stats(scan_stats, stats)
+
+            for page_num, xref, img_hash, size, nbytes, error in records:
+                if img_hash is None:
+                    if on_error:
+                        on_error(page_num + 1, error)
+                    continue
+                if img_hash in extracted_hashes:
+                    if scan_stats is not None:
+                        scan_stats['skipped_duplicate'] += 1
+                    continue
+                extracted_hashes.add(img_hash)
+
+                if size is None:
+                    if on_error:
+                        on_error(page_num + 1, error)
+                    continue
+
+                width, height = size
+                entry = store.get(img_hash) if store is not None else None
+
+                if entry is not None and not entry['filename']:
+                    store.stats['skipped_small'] += 1
+                    continue
+
+                if width < MIN_IMAGE_SIZE or height < MIN_IMAGE_SIZE:
+                    if store is not None:
+                        store.record(img_hash, None, width, height, nbytes)
+                        store.stats['skipped_small'] += 1
+                    continue
+
+                if store is not None:
+                    filename = store.filename_for(img_hash)
+                else:
+                    filename = f"img_p{page_num + 1}_{img_hash}.webp"
+
+                selected.append({
+                    'page': page_num + 1,
+                    'xref': xref,
+                    'key': img_hash,
+                    'nbytes': nbytes,
+                    'filename': filename,
+                    'width': width,
+                    'height': height,
+                    'cached': entry is not None
+                })
+
+        if store is not None:
+            encoder = store.encoder
+        tasks = [(img['page'] - 1, img['xref'], img['filename']) for img in selected if not img['cached']]
+        encode_futures = [
+            pool.submit(_encode_images, tasks[start:end], output_dir, encoder)
+            for start, end in _chunk_ranges(len(tasks), workers * 4)
+        ]
+
+        failed = {}
+        for future in encode_futures:
+            for filename, error in future.result():
+                if error is not None:
+                    failed[filename] = error
+
+    images = []
+    for img in selected:
+        if img['filename'] in failed:
+            if on_error:
+                on_error(img['page'], failed[img['filename']])
+            continue
+        if store is not None:
+            if img['cached']:
+                store.stats['hits'] += 1
+            else:
+                store.record(img['key'], img['filename'], img['width'], img['height'], img['nbytes'])
+                store.stats['encoded'] += 1
+        images.append({
+            'page': img['page'],
+            'filename': img['filename'],
+            'path': f"/data/knowledge_images/{img['filename']}",
+            'width': img['width'],
+            'height': img['height']
+        })
+
+    return images
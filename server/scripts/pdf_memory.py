@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+pdfplumber逐页读取与内存控制
+- pdfplumber 会缓存每个访问过的页面的布局对象（chars / rects / layout ...），
+  整份文档只用一个 pdfplumber.open 时常驻内存随页数线性增长
+- 低内存模式：每页的文本和表格取出后立即 page.close() 释放该页缓存
+- 可选RSS上限：超过上限时关闭并重新打开文档（同时丢弃pdfminer的对象缓存），再做一次垃圾回收；
+  重新打开后仍高于上限（内存不在pdfplumber缓存中）时，重新打开的最小间隔页数翻倍，不会每页都重建文档
+- 报告本次运行的峰值内存
+- 表格可改用 PyMuPDF find_tables 提取（见 pdf_tables），文本仍由 pdfplumber 提取
+- 文本和表格单元格经 glyphs 规范化（部首字形、乱码字体）
+- 逐页的文本和表格提取分别计入 instrument 的 text / tables 阶段
+"""
+
+import gc
+import sys
+import fitz  # PyMuPDF
+import pdfplumber
+from script_args import int_option
+from pdf_tables import DEFAULT_TABLE_BACKEND, pdfplumber_tables, pymupdf_tables
+from glyphs import normalize_page
+from instrument import current_rss_mb, peak_rss_mb, stage
+
+# 重新打开后内存仍高于上限时，两次重新打开之间的最小页数按倍增长到此为止
+MAX_REOPEN_INTERVAL = 256
+
+
+def memory_options(options):
+    """读取 --low-memory / --max-rss=MB 选项，指定上限时自动启用低内存模式"""
+    max_rss_mb = int_option(options, 'max-rss')
+    return bool(options.get('low-memory')) or max_rss_mb > 0, max_rss_mb
+
+
+class PlumberReader:
+    """
+    按页读取文本和表格的 pdfplumber 文档
+
+    table_backend 为已解析的表格后端（pdfplumber / pymupdf）；
+    传入 prefilter（pdf_tables.TablePrefilter）时没有框线的页跳过表格检测
+
+    用法:
+        with PlumberReader(pdf_path, low_memory=True, max_rss_mb=1024) as reader:
+            text, tables = reader.text_tables(1)
+    """
+
+    def __init__(self, pdf_path, low_memory=False, max_rss_mb=0, table_backend=DEFAULT_TABLE_BACKEND,
+                 prefilter=None):
+        self.pdf_path = pdf_path
+        self.low_memory = low_memory
+        self.max_rss_mb = max_rss_mb
+        self.table_backend = table_backend
+        self.prefilter = prefilter
+        self.reopens = 0
+        self.reopen_interval = 1
+        self.pages_since_reopen = 0
+        self._warned = False
+        self.pdf = pdfplumber.open(pdf_path)
+        self.page_count = len(self.pdf.pages)
+        self.fitz_doc = fitz.open(pdf_path) if table_backend == 'pymupdf' else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.close()
+            self.pdf = None
+        if self.fitz_doc is not None:
+            self.fitz_doc.close()
+            self.fitz_doc = None
+
+    def page(self, page_num):
+        """第 page_num 页（从1开始）"""
+        return self.pdf.pages[page_num - 1]
+
+    def text_tables(self, page_num):
+        """提取一页的 (text, tables)；低内存模式下随即释放该页缓存"""
+        page = self.page(page_num)
+        with stage('text', pages=1):
+            text = page.extract_text()
+        with stage('tables', pages=1) as s:
+            table_page = self.fitz_doc[page_num - 1] if self.fitz_doc is not None else page
+            if self.prefilter is not None:
+                tables = self.prefilter.tables(page_num, table_page, self.table_backend)
+            elif self.fitz_doc is not None:
+                tables = pymupdf_tables(table_page)
+            else:
+                tables = pdfplumber_tables(table_page)
+            s.count(tables=len(tables))
+        result = normalize_page(text, tables)
+
+        if self.low_memory:
+            page.close()
+            self._check_ceiling()
+
+        return result
+
+    def _check_ceiling(self):
+        self.pages_since_reopen += 1
+        if (not self.max_rss_mb or self.pages_since_reopen < self.reopen_interval
+                or current_rss_mb() <= self.max_rss_mb):
+            return
+
+        # 重新打开文档，丢弃已解析的页面和pdfminer对象缓存
+        self.pdf.close()
+        gc.collect()
+        self.pdf = pdfplumber.open(self.pdf_path)
+        if self.fitz_doc is not None:
+            self.fitz_doc.close()
+            self.fitz_doc = fitz.open(self.pdf_path)
+        self.reopens += 1
+        self.pages_since_reopen = 0
+
+        rss = current_rss_mb()
+        if rss <= self.max_rss_mb:
+            self.reopen_interval = 1
+            return
+
+        # 超出的内存不在文档缓存中，重新打开无济于事：退避，避免每页都重建文档（整体变为平方级）
+        self.reopen_interval = min(self.reopen_interval * 2, MAX_REOPEN_INTERVAL)
+        if not self._warned:
+            self._warned = True
+            print(f"⚠ 释放缓存后内存仍高于上限 {self.max_rss_mb}MB（当前 {rss:.0f}MB），"
+                  f"之后重新打开文档的间隔逐次加倍", file=sys.stderr)
+
+    def format_stats(self):
+        text = "低内存模式: 逐页释放缓存" if self.low_memory else "常规模式"
+        if self.max_rss_mb:
+            text += f"，内存上限 {self.max_rss_mb}MB，重新打开文档 {self.reopens} 次"
+            if self.reopen_interval > 1:
+                text += f"（仍高于上限，间隔已增至 {self.reopen_interval} 页）"
+        return text
+
+
+def format_peak_memory():
+    return f"峰值内存 {peak_rss_mb():.0f}MB"
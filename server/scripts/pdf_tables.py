@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+表格提取后端
+- pdfplumber: page.extract_tables()（原有实现，默认）
+- pymupdf: PyMuPDF 原生 page.find_tables()，速度快数倍
+- auto: PyMuPDF 支持 find_tables（>= 1.23）时用 pymupdf，否则退回 pdfplumber
+- TablePrefilter: 页面没有线条/矩形/边时跳过表格检测（--table-prefilter[=verify]）
+两种后端都返回 [[cell, ...], ...] 行列表，交给 table_to_markdown 生成相同格式的Markdown
+"""
+
+import fitz  # PyMuPDF
+
+TABLE_BACKENDS = ('pdfplumber', 'pymupdf', 'auto')
+
+DEFAULT_TABLE_BACKEND = 'pdfplumber'
+
+
+def pymupdf_tables_available():
+    """当前 PyMuPDF 版本是否提供 find_tables"""
+    return hasattr(fitz.Page, 'find_tables')
+
+
+def resolve_table_backend(name=None):
+    """
+    将后端名称解析为实际使用的后端（pdfplumber / pymupdf）
+
+    Raises:
+        ValueError: 未知的后端名称，或 PyMuPDF 版本不支持 find_tables
+    """
+    name = name or DEFAULT_TABLE_BACKEND
+    if name not in TABLE_BACKENDS:
+        raise ValueError(f"未知的表格提取后端: {name}（可选: {', '.join(TABLE_BACKENDS)}）")
+    if name == 'auto':
+        return 'pymupdf' if pymupdf_tables_available() else 'pdfplumber'
+    if name == 'pymupdf' and not pymupdf_tables_available():
+        raise ValueError(f"当前 PyMuPDF {fitz.VersionBind} 不支持 find_tables，请升级到 1.23 以上或使用 pdfplumber")
+    return name
+
+
+def table_backend_option(options):
+    """读取 --table-backend=NAME 选项，返回解析后的后端"""
+    value = options.get('table-backend')
+    return resolve_table_backend(value if isinstance(value, str) else None)
+
+
+def content_kind(table_backend):
+    """pdfplumber文本 + 指定后端表格 对应的页缓存种类（不同后端的结果分开缓存）"""
+    if table_backend == 'pdfplumber':
+        return 'pdfplumber'
+    return f'pdfplumber+{table_backend}-tables'
+
+
+def pdfplumber_tables(page):
+    """pdfplumber 页面的表格"""
+    return page.extract_tables()
+
+
+def pymupdf_tables(page):
+    """PyMuPDF 页面的表格"""
+    return [table.extract() for table in page.find_tables().tables]
+
+
+def pdfplumber_has_rulings(page):
+    """pdfplumber 页面是否有线条/矩形/曲线边（默认 lines 策略的表格检测只依赖这些边）"""
+    return bool(page.edges)
+
+
+def pymupdf_has_rulings(page):
+    """PyMuPDF 页面是否有直线/矩形矢量图形（find_tables 默认 lines 策略只依赖这些图形）"""
+    return any(item[0] in ('l', 're', 'qu') for path in page.get_drawings() for item in path['items'])
+
+
+class TablePrefilter:
+    """
+    表格检测前的几何预检：页面没有任何线条、矩形或边时直接跳过表格提取
+
+    verify=True 时仍对跳过的页提取表格，记录预检漏掉的页（应始终为0）
+
+    用法:
+        prefilter = TablePrefilter(verify=False)
+        tables = prefilter.tables(page_num, page, 'pdfplumber')
+    """
+
+    def __init__(self, verify=False):
+        self.verify = verify
+        self.checked = 0
+        self.skipped = 0
+        self.missed = []
+
+    def tables(self, page_num, page, table_backend):
+        """按后端提取一页的表格，页面没有框线时跳过"""
+        if table_backend == 'pymupdf':
+            has_rulings, extract = pymupdf_has_rulings, pymupdf_tables
+        else:
+            has_rulings, extract = pdfplumber_has_rulings, pdfplumber_tables
+
+        self.checked += 1
+        if has_rulings(page):
+            return extract(page)
+
+        self.skipped += 1
+        if not self.verify:
+            return []
+
+        tables = extract(page)
+        if tables:
+            self.missed.append(page_num)
+        return tables
+
+    def counts(self):
+        """可跨进程传递的统计"""
+        return self.checked, self.skipped, self.missed
+
+    def merge(self, counts):
+        checked, skipped, missed = counts
+        self.checked += checked
+        self.skipped += skipped
+        self.missed.extend(missed)
+
+    def format_stats(self):
+        text = f"表格预检: 检查 {self.checked} 页，跳过 {self.skipped} 页（无框线）"
+        if self.verify:
+            if self.missed:
+                pages = ', '.join(str(page_num) for page_num in sorted(self.missed))
+                text += f"，⚠ 校验发现跳过的页含表格: {pages}"
+            else:
+                text += "，校验通过：跳过的页均无表格"
+        return text
+
+
+def table_prefilter_option(options):
+    """
+    读取 --table-prefilter[=verify] 选项，未指定时返回 None
+
+    Raises:
+        ValueError: 未知的选项值
+    """
+    value = options.get('table-prefilter')
+    if not value:
+        return None
+    if value is True:
+        return TablePrefilter()
+    if value == 'verify':
+        return TablePrefilter(verify=True)
+    raise ValueError(f"未知的表格预检模式: {value}（可选: --table-prefilter 或 --table-prefilter=verify）")
@@ -4,16 +4,29 @@
 - 正确提取文字（避免编码问题）
 - 提取图片并保存
 - 智能匹配图片到章节
+- --checkpoint / --resume: 图片提取定期写检查点，中断后用 --resume 从检查点继续
+- --page-ir[=dir]: 缓存逐页解析结果和图片提取结果（page_ir），PDF未变时调整章节切分和图片放置
+  不再重新解析PDF、解码图片
+- --report=path / --no-report / --profile[=path] / --trace-memory: 分阶段耗时与内存的JSON报告（默认写到
+  图片目录的 .ingest_reports/）和可选的 cProfile 文件（见 instrument）
 """
 
+import sys
 import fitz  # PyMuPDF
 import sqlite3
 import os
 import hashlib
-import re
 from pathlib import Path
 from PIL import Image
 import io
+from pdf_images import candidate_images, new_scan_stats, format_scan_stats
+from headings import detect_headings
+from page_ir import open_page_ir
+from sections import SectionBuilder
+from image_anchors import find_anchors, render_with_images
+from checkpoint import open_checkpoint
+from script_args import split_args
+from instrument import open_instrument
 
 # 配置
 PDF_PATH = "/Users/Kine/Documents/Kinefinity/KineCore/Pool/qoder/Longhorn/input docs/卓曜科技_MAVO Edge 6K操作说明书(KineOS7.2)_C34-102-7200_2023.11.7.pdf"
@@ -23,19 +36,31 @@ IMAGE_OUTPUT_DIR = "/Users/Kine/Documents/Kinefinity/KineCore/Pool/qoder/Longhor
 # 确保图片目录存在
 Path(IMAGE_OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
 
-def extract_images_from_pdf(pdf_doc):
-    """提取PDF中的所有图片"""
+def extract_images_from_pdf(pdf_doc, checkpoint=None):
+    """提取PDF中的所有图片（传入 checkpoint 时定期记录进度，从上次完成的页继续）"""
     images = []
     extracted_hashes = set()
+    seen_xrefs = set()
+    scan_stats = new_scan_stats()
+    pages_done = 0
     
-    for page_num in range(pdf_doc.page_count):
+    if checkpoint is not None and checkpoint.get('pages_done'):
+        pages_done = checkpoint.get('pages_done')
+        images = checkpoint.get('images', [])
+        extracted_hashes.update(checkpoint.get('extracted_hashes', []))
+        seen_xrefs.update(checkpoint.get('seen_xrefs', []))
+        scan_stats.update(checkpoint.get('scan_stats', {}))
+        print(f"   从第 {pages_done + 1} 页继续（已提取 {len(images)} 张图片）")
+    
+    for page_num in range(pages_done, pdf_doc.page_count):
         page = pdf_doc[page_num]
-        image_list = page.get_images(full=True)
         
-        for img_index, img_info in enumerate(image_list):
+        # 解码前按xref去重、按元数据过滤小图
+        for img_info in candidate_images(page, seen_xrefs, scan_stats):
             xref = img_info[0]
             
             try:
+                scan_stats['decoded'] += 1
                 base_image = pdf_doc.extract_image(xref)
                 image_bytes = base_image["image"]
                 image_ext = base_image["ext"]
@@ -43,6 +68,7 @@ def extract_images_from_pdf(pdf_doc):
                 # 计算hash避免重复
                 img_hash = hashlib.md5(image_bytes).hexdigest()[:12]
                 if img_hash in extracted_hashes:
+                    scan_stats['skipped_duplicate'] += 1
                     continue
                 extracted_hashes.add(img_hash)
                 
@@ -80,71 +106,58 @@ def extract_images_from_pdf(pdf_doc):
             except Exception as e:
                 print(f"⚠ 第{page_num + 1}页图片提取失败: {e}")
                 continue
+        
+        if checkpoint is not None:
+            checkpoint.update(pages_done=page_num + 1, images=images, extracted_hashes=extracted_hashes,
+                              seen_xrefs=seen_xrefs, scan_stats=scan_stats,
+                              force=page_num + 1 == pdf_doc.page_count)
     
+    print(f"   {format_scan_stats(scan_stats)}")
     return images
 
-def extract_chapters_from_pdf(pdf_doc, images_map):
+def extract_chapters_from_pdf(page_ir, images_map):
     """
     提取PDF章节内容
+    page_ir: 逐页解析结果（见 page_ir.open_page_ir）
     images_map: {page_num: [image_info, ...]}
     """
     chapters = []
     current_chapter = None
     
-    # 章节标题模式（如 "3.3.2 自动白平衡"）
-    chapter_pattern = re.compile(r'^(\d+(?:\.\d+)*)\s+(.+)$')
+    # get_text("dict")的文本结构和字体（来自页面IR），标题（如 "3.3.2 自动白平衡"）按编号和字号/粗体判断
+    lines_by_page = {}
+    for page_num, line_text, heading in detect_headings(page_ir.lines()):
+        lines_by_page.setdefault(page_num, []).append((line_text, heading))
     
-    for page_num in range(pdf_doc.page_count):
-        page = pdf_doc[page_num]
-        
-        # 使用get_text("dict")获取更好的文本结构
-        text_dict = page.get_text("dict")
-        blocks = text_dict.get("blocks", [])
-        
-        for block in blocks:
-            if block.get("type") != 0:  # 只处理文本块
-                continue
-            
-            for line in block.get("lines", []):
-                line_text = ""
-                for span in line.get("spans", []):
-                    line_text += span.get("text", "")
+    for page_num in range(page_ir.page_count):
+        for line_text, heading in lines_by_page.get(page_num + 1, []):
+            # 检测章节标题
+            if heading:
+                # 保存前一章节
+                if current_chapter and current_chapter.has_content:
+                    chapters.append(current_chapter.finalize())
                 
-                line_text = line_text.strip()
-                if not line_text:
-                    continue
-                
-                # 检测章节标题
-                match = chapter_pattern.match(line_text)
-                if match:
-                    # 保存前一章节
-                    if current_chapter and current_chapter['content']:
-                        chapters.append(current_chapter)
-                    
-                    # 开始新章节
-                    chapter_num = match.group(1)
-                    chapter_title = match.group(2)
-                    current_chapter = {
-                        'number': chapter_num,
-                        'title': f"MAVO Edge 6K: {chapter_title}",
-                        'full_title': f"{chapter_num} {chapter_title}",
-                        'content': "",
-                        'page_start': page_num + 1,
-                        'images': []
-                    }
-                else:
-                    # 添加到当前章节
-                    if current_chapter:
-                        current_chapter['content'] += line_text + "\n"
+                # 开始新章节
+                chapter_num, chapter_title = heading
+                current_chapter = SectionBuilder(
+                    page_num=page_num + 1,
+                    track_images=True,
+                    number=chapter_num,
+                    title=f"MAVO Edge 6K: {chapter_title}",
+                    full_title=f"{chapter_num} {chapter_title}"
+                )
+            else:
+                # 添加到当前章节
+                if current_chapter:
+                    current_chapter.append(line_text + "\n", page_num=page_num + 1)
         
         # 添加该页的图片到当前章节
         if current_chapter and page_num + 1 in images_map:
-            for img_info in images_map[page_num + 1]:
-                current_chapter['images'].append(img_info)
+            current_chapter.add_images(images_map[page_num + 1])
     
     # 保存最后一章
-    if current_chapter and current_chapter['content']:
-        chapters.append(current_chapter)
+    if current_chapter and current_chapter.has_content:
+        chapters.append(current_chapter.finalize())
     
     return chapters
 
@@ -157,43 +170,59 @@ def insert_images_to_content(chapter):
         return content
     
     # 在"如右图所示"、"如图所示"等位置插入图片
+    # （"操作方式如右图所示" 必然同时匹配 "如右图所示" 且结尾相同，无需单独列出）
     patterns = [
         r'(如右图所示[。，]?)',
         r'(如图所示[。，]?)',
-        r'(操作方式如右图所示[。，]?)',
         r'(见右图[。，]?)'
     ]
     
-    # 为每个匹配位置插入图片
-    for i, img in enumerate(images):
-        for pattern in patterns:
-            if re.search(pattern, content):
-                # 在匹配位置后插入图片
-                replacement = f'\\1\n\n![操作示意图]({img["path"]})\n\n'
-                content = re.sub(pattern, replacement, content, count=1)
-                break
+    # 锚点文字插入图片后仍保留，所有图片都插在排在最前的模式的第一个锚点之后，
+    # 后面的图片紧挨锚点（即按倒序排列）
+    anchors = find_anchors(content, patterns)
+    if anchors:
+        _, end, _ = min(anchors, key=lambda anchor: (anchor[2], anchor[0]))
+        insertions = {end: [f'\n\n![操作示意图]({img["path"]})\n\n' for img in reversed(images)]}
+        return render_with_images(content, insertions)
     
     # 如果没有匹配位置，在内容末尾添加图片
+    parts = [content]
+    appended = set()
     for img in images:
-        if img['path'] not in content:
-            content += f'\n\n![参考图]({img["path"]})\n'
+        if img['path'] not in appended and img['path'] not in content:
+            parts.append(f'\n\n![参考图]({img["path"]})\n')
+            appended.add(img['path'])
     
-    return content
+    return ''.join(parts)
 
 def main():
+    args, options = split_args(sys.argv[1:])
+    
     print("=" * 60)
     print("重新导入 MAVO Edge 6K 操作说明书")
     print("=" * 60)
+    instrument = open_instrument(options, 'reimport_edge6k_manual', IMAGE_OUTPUT_DIR)
     
     # 1. 打开PDF
     print(f"\n📄 打开PDF: {PDF_PATH}")
-    pdf_doc = fitz.open(PDF_PATH)
+    with instrument.stage('open'):
+        pdf_doc = fitz.open(PDF_PATH)
+        checkpoint = open_checkpoint(options, PDF_PATH, IMAGE_OUTPUT_DIR, name='reimport_edge6k')
     print(f"   总页数: {pdf_doc.page_count}")
     
-    # 2. 提取图片
+    # 2. 逐页解析（--page-ir 时PDF未变直接读取缓存）
+    print(f"\n📖 解析页面...")
+    with instrument.stage('text', pages=pdf_doc.page_count):
+        page_ir = open_page_ir(options, PDF_PATH, IMAGE_OUTPUT_DIR, pdf_doc)
+    
+    # 3. 提取图片（缓存中有本方式的提取结果且图片文件都在时不再解码）
     print(f"\n📸 提取图片...")
-    images = extract_images_from_pdf(pdf_doc)
+    with instrument.stage('images', pages=pdf_doc.page_count) as s:
+        images = page_ir.images('reimport_edge6k_png', lambda: extract_images_from_pdf(pdf_doc, checkpoint),
+                                IMAGE_OUTPUT_DIR)
+        s.count(images=len(images))
     print(f"   共提取 {len(images)} 张图片")
+    print(f"   {page_ir.format_stats()}")
     
     # 创建页码到图片的映射
     images_by_page = {}
@@ -203,31 +232,34 @@ def main():
             images_by_page[page] = []
         images_by_page[page].append(img)
     
-    # 3. 提取章节
+    # 4. 提取章节
     print(f"\n📖 提取章节内容...")
-    chapters = extract_chapters_from_pdf(pdf_doc, images_by_page)
-    print(f"   共提取 {len(chapters)} 个章节")
+    with instrument.stage('sections') as s:
+        chapters = extract_chapters_from_pdf(page_ir, images_by_page)
+        s.count(sections=len(chapters))
+    print(f"   共提取 {len(chapters)} 个章节，{sum(ch['content_bytes'] for ch in chapters) / 1024:.1f}KB")
     
     pdf_doc.close()
     
-    # 4. 处理章节内容（插入图片）
+    # 5. 处理章节内容（插入图片）
     print(f"\n🖼️  处理章节内容...")
-    for chapter in chapters:
-        chapter['content_with_images'] = insert_images_to_content(chapter)
-        summary = chapter['content'][:200].replace('\n', ' ')
-        chapter['summary'] = summary
+    with instrument.stage('anchors', sections=len(chapters)):
+        for chapter in chapters:
+            chapter['content_with_images'] = insert_images_to_content(chapter)
+            summary = chapter['content'][:200].replace('\n', ' ')
+            chapter['summary'] = summary
     
-    # 5. 连接数据库
+    # 6. 连接数据库
     print(f"\n💾 连接数据库...")
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    # 6. 清空旧的Manual文章
+    # 7. 清空旧的Manual文章
     cursor.execute("DELETE FROM knowledge_articles WHERE category = 'Manual'")
     deleted = cursor.rowcount
     print(f"   已删除 {deleted} 篇旧的Manual文章")
     
-    # 7. 插入新文章
+    # 8. 插入新文章
     print(f"\n✍️  插入新文章...")
     
     # 获取admin用户ID（created_by字段需要）
@@ -242,27 +274,30 @@ def main():
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, datetime('now'))
     """
     
-    for i, chapter in enumerate(chapters):
-        # 使用章节号+序号生成唯一slug
-        slug = f"edge-6k-{chapter['number'].replace('.', '-')}-{i+1:03d}"
-        cursor.execute(insert_sql, (
-            chapter['title'],
-            slug,
-            chapter['summary'],
-            chapter['content_with_images'],
-            'Manual',
-            '操作手册',
-            'MAVO Edge',
-            'MAVO Edge 6K',
-            'Public',  # 操作手册默认公开
-            'Published',
-            admin_id
-        ))
-        print(f"   ✓ {chapter['title']}")
-    
-    conn.commit()
+    with instrument.stage('db_write', articles=len(chapters)):
+        for i, chapter in enumerate(chapters):
+            # 使用章节号+序号生成唯一slug
+            slug = f"edge-6k-{chapter['number'].replace('.', '-')}-{i+1:03d}"
+            cursor.execute(insert_sql, (
+                chapter['title'],
+                slug,
+                chapter['summary'],
+                chapter['content_with_images'],
+                'Manual',
+                '操作手册',
+                'MAVO Edge',
+                'MAVO Edge 6K',
+                'Public',  # 操作手册默认公开
+                'Published',
+                admin_id
+            ))
+            print(f"   ✓ {chapter['title']}")
+        
+        conn.commit()
+    if checkpoint is not None:
+        checkpoint.complete()
     
-    # 8. 验证
+    # 9. 验证
     count = cursor.execute("SELECT COUNT(*) FROM knowledge_articles WHERE category = 'Manual'").fetchone()[0]
     print(f"\n✅ 完成！共导入 {count} 篇文章")
     
@@ -280,6 +315,7 @@ def main():
         print(f"   内容: {test[1]}...")
     
     conn.close()
+    instrument.finish(pages=page_ir.page_count, images=len(images), articles=count)
     print("\n" + "=" * 60)
 
 if __name__ == '__main__':
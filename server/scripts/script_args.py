@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+脚本命令行参数的简单解析
+- 位置参数保持原有顺序
+- --flag 解析为 True，--key=value 解析为字符串
+"""
+
+
+def split_args(argv):
+    """
+    拆分命令行参数
+
+    Args:
+        argv: 参数列表（不含脚本名，通常为 sys.argv[1:]）
+
+    Returns:
+        (positional, options): 位置参数列表和选项字典
+    """
+    positional = []
+    options = {}
+
+    for arg in argv:
+        if arg.startswith('--'):
+            key, sep, value = arg[2:].partition('=')
+            options[key] = value if sep else True
+        else:
+            positional.append(arg)
+
+    return positional, options
+
+
+def int_option(options, name, default=0):
+    """读取整数选项，未指定或格式错误时返回默认值"""
+    value = options.get(name)
+    if value is None or value is True:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
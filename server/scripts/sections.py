@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+章节内容构建（各导入脚本共用）
+- 内容按块追加到列表，结束时一次性拼接，避免长章节逐行 += 造成的平方级复制
+- 页码范围、图片和内容字节数随追加增量统计，统计不必再扫描全文
+"""
+
+
+class SectionBuilder:
+    """
+    单个章节的增量构建器
+
+    用法:
+        section = SectionBuilder(page_num=3, title='3.1 开机', number='3.1')
+        section.append(line + '\\n', page_num=4)
+        section.add_image(img)
+        if section.has_content:
+            sections.append(section.finalize())
+
+    fields 原样写入 finalize() 的结果；创建时传入 page_num 才记录页码范围，
+    track_images=True 时结果中包含 images 列表
+    """
+
+    __slots__ = ('fields', 'chunks', 'size', 'has_content', 'page_start', 'page_end', 'images', 'track_images')
+
+    def __init__(self, content='', page_num=None, track_images=False, **fields):
+        self.fields = fields
+        self.chunks = []
+        self.size = 0
+        self.has_content = False
+        self.page_start = page_num
+        self.page_end = page_num
+        self.images = []
+        self.track_images = track_images
+        if content:
+            self.append(content)
+
+    def append(self, text, page_num=None):
+        """追加一段内容；传入 page_num 时同时扩展页码范围"""
+        self.chunks.append(text)
+        self.size += len(text.encode('utf-8'))
+        if not self.has_content and text.strip():
+            self.has_content = True
+        if page_num is not None:
+            self.add_page(page_num)
+
+    def add_page(self, page_num):
+        if self.page_start is None:
+            self.page_start = page_num
+        self.page_end = page_num
+
+    def add_image(self, img):
+        self.images.append(img)
+
+    def add_images(self, images):
+        self.images.extend(images)
+
+    @property
+    def content(self):
+        return ''.join(self.chunks)
+
+    def finalize(self, strip=False):
+        """
+        拼接内容，返回章节字典
+
+        Returns:
+            {**fields, 'content', ['page_start', 'page_end'], ['images'], 'content_bytes'}
+            （strip=True 时 content 去除首尾空白，content_bytes 为去除后的字节数）
+        """
+        content = ''.join(self.chunks)
+        size = self.size
+        if strip:
+            # 字节数按去除首尾空白后的内容计算，只编码被去掉的空白
+            stripped = content.strip()
+            start = len(content) - len(content.lstrip())
+            removed = content[:start] + content[start + len(stripped):]
+            size -= len(removed.encode('utf-8'))
+            content = stripped
+        section = dict(self.fields)
+        section['content'] = content
+        if self.page_start is not None:
+            section['page_start'] = self.page_start
+            section['page_end'] = self.page_end
+        if self.track_images:
+            section['images'] = self.images
+        section['content_bytes'] = size
+        return section
@@ -0,0 +1,152 @@
+/**
+ * Conversion Worker Client
+ * Keeps one long-lived scripts/conversion_worker.py process and talks to it
+ * with line-delimited JSON-RPC over stdin/stdout, instead of spawning a fresh
+ * python3 (and re-importing fitz / PIL / docx) for every conversion.
+ *
+ * convert_image runs in the worker's own image pool, so its timeout is not
+ * spent waiting behind DOCX/PDF conversions. A request that times out is
+ * cancelled in the worker if it has not started yet; a late result is ignored.
+ */
+
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+
+const WORKER_SCRIPT = path.join(__dirname, '../scripts/conversion_worker.py');
+
+class ConversionWorker {
+    constructor(options = {}) {
+        this.python = options.python || process.env.CONVERSION_PYTHON || '/usr/bin/python3';
+        this.workers = options.workers || parseInt(process.env.CONVERSION_WORKERS) || 2;
+        this.imageWorkers = options.imageWorkers || parseInt(process.env.CONVERSION_IMAGE_WORKERS) || 1;
+        this.proc = null;
+        this.nextId = 1;
+        this.pending = new Map(); // id -> { resolve, reject, method, timer }
+    }
+
+    // Start the Python process on first use (and again after it exits)
+    _start() {
+        if (this.proc) return this.proc;
+
+        const proc = spawn(this.python, [WORKER_SCRIPT, `--workers=${this.workers}`, `--image-workers=${this.imageWorkers}`], {
+            stdio: ['pipe', 'pipe', 'pipe'],
+            env: {
+                ...process.env,
+                PYTHONPATH: '/Users/admin/Library/Python/3.9/lib/python/site-packages',
+                PATH: process.env.PATH + ':/usr/bin:/usr/local/bin'
+            }
+        });
+
+        readline.createInterface({ input: proc.stdout }).on('line', line => this._onResponse(line));
+        readline.createInterface({ input: proc.stderr }).on('line', line => console.log(`[ConversionWorker] ${line}`));
+
+        proc.on('error', err => {
+            console.error('[ConversionWorker] Failed to start:', err.message);
+            this._exited(proc, 'WORKER_UNAVAILABLE', `转换进程无法启动: ${err.message}`);
+        });
+        proc.on('exit', (code, signal) => {
+            if (this.proc === proc) {
+                console.warn(`[ConversionWorker] Exited (code ${code}, signal ${signal})`);
+            }
+            this._exited(proc, 'WORKER_EXITED', `转换进程已退出 (code ${code})`);
+        });
+        proc.stdin.on('error', () => { }); // Reported through 'exit'
+
+        this.proc = proc;
+        return proc;
+    }
+
+    // Reject every request still waiting on a process that is gone
+    _exited(proc, code, message) {
+        if (this.proc !== proc) return;
+        this.proc = null;
+
+        for (const [id, call] of this.pending) {
+            clearTimeout(call.timer);
+            const err = new Error(message);
+            err.code = code;
+            call.reject(err);
+        }
+        this.pending.clear();
+    }
+
+    _onResponse(line) {
+        let response;
+        try {
+            response = JSON.parse(line);
+        } catch (e) {
+            console.warn('[ConversionWorker] Ignoring malformed response:', line.substring(0, 200));
+            return;
+        }
+
+        const call = this.pending.get(response.id);
+        if (!call) return; // Timed out earlier
+        this.pending.delete(response.id);
+        clearTimeout(call.timer);
+
+        if (response.error) {
+            console.warn(`[ConversionWorker] ${call.method} failed in ${response.elapsed_ms}ms: ${response.error.message}`);
+            const err = new Error(response.error.message);
+            err.code = 'CONVERSION_FAILED';
+            err.type = response.error.type;
+            call.reject(err);
+        } else {
+            const run = response.run_ms !== undefined ? ` (run ${response.run_ms}ms)` : '';
+            console.log(`[ConversionWorker] ${call.method} done in ${response.elapsed_ms}ms${run}`);
+            call.resolve(response.result);
+        }
+    }
+
+    /**
+     * Call a worker method
+     * @param {string} method - docx_to_html | extract_pdf_images | convert_image | cancel | ping | stats
+     * @param {object} params - Method parameters (see conversion_worker.py)
+     * @param {number} timeout - Milliseconds, 0 = no timeout
+     */
+    call(method, params = {}, timeout = 0) {
+        return new Promise((resolve, reject) => {
+            const proc = this._start();
+            const id = this.nextId++;
+            const call = { resolve, reject, method, timer: null };
+
+            if (timeout > 0) {
+                call.timer = setTimeout(() => {
+                    this.pending.delete(id);
+                    this._cancel(proc, id);
+                    const err = new Error(`${method} 超时 (${timeout}ms)`);
+                    err.code = 'TIMEOUT';
+                    reject(err);
+                }, timeout);
+            }
+
+            this.pending.set(id, call);
+            proc.stdin.write(JSON.stringify({ id, method, params }) + '\n');
+        });
+    }
+
+    // Ask the worker to drop a request that has not started yet (the response is not awaited)
+    _cancel(proc, id) {
+        if (this.proc !== proc) return;
+        proc.stdin.write(JSON.stringify({ id: this.nextId++, method: 'cancel', params: { id } }) + '\n');
+    }
+
+    // Close stdin; the worker finishes in-flight requests, then exits
+    stop() {
+        if (this.proc) {
+            this.proc.stdin.end();
+        }
+    }
+}
+
+let sharedWorker = null;
+
+// One worker process shared by all routes
+function getConversionWorker() {
+    if (!sharedWorker) {
+        sharedWorker = new ConversionWorker();
+    }
+    return sharedWorker;
+}
+
+module.exports = { ConversionWorker, getConversionWorker };
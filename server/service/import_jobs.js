@@ -0,0 +1,192 @@
+/**
+ * Import Job Queue
+ * Enqueues DOCX/PDF conversions into the import_jobs table and polls their
+ * progress. scripts/import_jobs.py runs the jobs in the background with a
+ * concurrency limit, so an import never blocks other API requests.
+ *
+ * A wait gives up (and fails the job) when the job exceeds its timeout, or
+ * when the runner cannot start or keeps exiting right after it starts.
+ *
+ * The runner's stdin is a pipe: when the server exits (or stop() is called)
+ * the runner stops claiming jobs and exits once its in-flight jobs finish.
+ */
+
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+
+const RUNNER_SCRIPT = path.join(__dirname, '../scripts/import_jobs.py');
+
+// Statuses after which the runner no longer touches the job
+const FINISHED_STATUSES = ['converted', 'failed'];
+
+// Default limit for one conversion, queue time included (IMPORT_JOB_TIMEOUT_MS overrides)
+const DEFAULT_JOB_TIMEOUT_MS = 30 * 60 * 1000;
+
+// A runner that exits within this time after starting counts as a failed start
+const RUNNER_MIN_UPTIME_MS = 10 * 1000;
+
+// Consecutive failed starts after which the runner is no longer respawned
+const MAX_RUNNER_FAILURES = 3;
+
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+class ImportJobQueue {
+    constructor(db, options = {}) {
+        this.db = db;
+        this.python = options.python || process.env.CONVERSION_PYTHON || '/usr/bin/python3';
+        this.concurrency = options.concurrency || parseInt(process.env.IMPORT_JOB_CONCURRENCY) || 1;
+        this.timeout = options.timeout || parseInt(process.env.IMPORT_JOB_TIMEOUT_MS) || DEFAULT_JOB_TIMEOUT_MS;
+        this.proc = null;
+        this.runnerFailures = 0;
+        this.runnerError = null;
+    }
+
+    // Start the Python runner if it is not running (first job, or after it exited)
+    ensureRunner() {
+        if (this.proc || this.runnerError) return;
+
+        const proc = spawn(this.python, [RUNNER_SCRIPT, this.db.name, `--concurrency=${this.concurrency}`], {
+            stdio: ['pipe', 'pipe', 'pipe'],
+            env: {
+                ...process.env,
+                PYTHONPATH: '/Users/admin/Library/Python/3.9/lib/python/site-packages',
+                PATH: process.env.PATH + ':/usr/bin:/usr/local/bin'
+            }
+        });
+
+        readline.createInterface({ input: proc.stdout }).on('line', line => console.log(`[ImportJobs] ${line}`));
+        readline.createInterface({ input: proc.stderr }).on('line', line => console.log(`[ImportJobs] ${line}`));
+
+        const startedAt = Date.now();
+        const exited = (reason) => {
+            if (this.proc !== proc) return;
+            this.proc = null;
+
+            // Exiting right after the start (missing interpreter, import error, no table) will not fix itself
+            if (Date.now() - startedAt < RUNNER_MIN_UPTIME_MS) {
+                this.runnerFailures += 1;
+            } else {
+                this.runnerFailures = 0;
+            }
+            if (this.runnerFailures >= MAX_RUNNER_FAILURES) {
+                this.runnerError = `导入任务执行器无法启动: ${reason}`;
+                console.error(`[ImportJobs] Runner failed ${this.runnerFailures} times in a row, giving up: ${reason}`);
+            }
+        };
+        proc.on('error', err => {
+            console.error('[ImportJobs] Failed to start runner:', err.message);
+            exited(err.message);
+        });
+        proc.on('exit', code => {
+            console.warn(`[ImportJobs] Runner exited (code ${code})`);
+            exited(`exit code ${code}`);
+        });
+        proc.stdin.on('error', () => { }); // Reported through 'exit'
+
+        this.proc = proc;
+    }
+
+    /**
+     * Add a job to the queue
+     * @param {string} jobType - docx_to_html | extract_pdf_images
+     * @param {object} params - Same parameters as the conversion_worker method
+     * @returns {number} Job id
+     */
+    enqueue(jobType, params, { sourceName = null, createdBy = null } = {}) {
+        const result = this.db.prepare(`
+            INSERT INTO import_jobs (job_type, params, source_name, created_by)
+            VALUES (?, ?, ?, ?)
+        `).run(jobType, JSON.stringify(params), sourceName, createdBy);
+
+        // A new job retries a runner that gave up earlier (the cause may have been fixed meanwhile)
+        if (this.runnerError && !this.proc) {
+            this.runnerError = null;
+            this.runnerFailures = 0;
+        }
+        this.ensureRunner();
+        return result.lastInsertRowid;
+    }
+
+    get(jobId) {
+        return this.db.prepare('SELECT * FROM import_jobs WHERE id = ?').get(jobId);
+    }
+
+    /**
+     * Poll until the runner has finished the conversion (without blocking the event loop)
+     * Fails the job and throws when it times out or the runner cannot be started
+     * @param {number} jobId
+     * @param {object} [options] - { interval, timeout } in ms
+     * @returns {object} Conversion result
+     */
+    async waitFor(jobId, { interval = 500, timeout = this.timeout } = {}) {
+        const deadline = Date.now() + timeout;
+        for (; ;) {
+            const job = this.get(jobId);
+            if (!job) throw new Error(`导入任务不存在: ${jobId}`);
+
+            if (job.status === 'failed') throw new Error(job.error || '导入任务失败');
+            if (FINISHED_STATUSES.includes(job.status)) return JSON.parse(job.result);
+
+            this.ensureRunner();
+            const error = this.runnerError
+                || (Date.now() >= deadline ? `导入任务超时（${Math.round(timeout / 1000)} 秒）` : null);
+            if (error) {
+                // The runner cancels the job if it has not started; a running conversion cannot be
+                // interrupted, so it keeps its concurrency slot until it finishes and its result is ignored
+                this.fail(jobId, error);
+                if (job.status === 'running') {
+                    console.warn(`[ImportJobs] Job ${jobId} abandoned (${error}), still running in the runner`);
+                }
+                throw new Error(error);
+            }
+            await sleep(interval);
+        }
+    }
+
+    // Article-writing progress, updated by the route after conversion
+    progress(jobId, fields) {
+        if (!jobId) return;
+        const columns = Object.keys(fields).filter(key => ['stage', 'articles_total', 'articles_written'].includes(key));
+        if (columns.length === 0) return;
+
+        this.db.prepare(`
+            UPDATE import_jobs SET ${columns.map(key => `${key} = @${key}`).join(', ')}, updated_at = datetime('now')
+            WHERE id = @id AND status = 'converted'
+        `).run({ ...fields, id: jobId });
+    }
+
+    finish(jobId) {
+        if (!jobId) return;
+        this.db.prepare(`
+            UPDATE import_jobs SET status = 'done', stage = '导入完成', updated_at = datetime('now')
+            WHERE id = ? AND status = 'converted'
+        `).run(jobId);
+    }
+
+    // Close the runner's stdin; it finishes in-flight jobs, then exits
+    stop() {
+        if (this.proc) {
+            this.proc.stdin.end();
+        }
+    }
+
+    fail(jobId, message) {
+        this.db.prepare(`
+            UPDATE import_jobs SET status = 'failed', error = ?, finished_at = datetime('now'), updated_at = datetime('now')
+            WHERE id = ? AND status NOT IN ('done', 'failed')
+        `).run(message, jobId);
+    }
+}
+
+const queues = new Map();
+
+// One queue (and one runner process) per database
+function getImportJobQueue(db) {
+    if (!queues.has(db)) {
+        queues.set(db, new ImportJobQueue(db));
+    }
+    return queues.get(db);
+}
+
+module.exports = { ImportJobQueue, getImportJobQueue };
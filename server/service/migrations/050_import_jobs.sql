@@ -0,0 +1,46 @@
+-- Migration 050: Import Jobs Table
+-- 后台导入任务队列 - 由 scripts/import_jobs.py 执行DOCX/PDF转换，服务端入队后轮询进度
+
+-- ============================================================
+-- 1. import_jobs 表
+-- ============================================================
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+    -- 任务类型与参数
+    job_type TEXT NOT NULL CHECK(job_type IN ('docx_to_html', 'extract_pdf_images')),
+    params TEXT NOT NULL,           -- JSON，与 conversion_worker 对应方法的参数相同
+    source_name TEXT,               -- 原始文件名（用于列表展示）
+
+    -- 状态
+    status TEXT DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'converted', 'done', 'failed')),
+    -- queued: 等待执行
+    -- running: 转换中
+    -- converted: 转换完成，服务端写入文章中
+    -- done: 文章已写入
+    -- failed: 失败（error 字段记录原因）
+    stage TEXT,                     -- 当前阶段说明
+    runner_pid INTEGER,             -- 取出任务的 import_jobs.py 进程（进程已不存在的 running 任务视为中断）
+
+    -- 阶段进度
+    pages_total INTEGER DEFAULT 0,
+    pages_done INTEGER DEFAULT 0,
+    images_encoded INTEGER DEFAULT 0,
+    articles_total INTEGER DEFAULT 0,
+    articles_written INTEGER DEFAULT 0,
+
+    result TEXT,                    -- 转换结果 JSON
+    error TEXT,
+
+    created_by INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    started_at TEXT,
+    finished_at TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (created_by) REFERENCES users(id)
+);
+
+-- 索引
+CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status, id);
+CREATE INDEX IF NOT EXISTS idx_import_jobs_created_by ON import_jobs(created_by, created_at);
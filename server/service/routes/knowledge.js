@@ -15,7 +15,8 @@ const { marked } = require('marked');
 const TurndownService = require('turndown');
 const { gfm } = require('turndown-plugin-gfm');
 const crypto = require('crypto');
-const { execSync } = require('child_process');
+const { getConversionWorker } = require('../conversion_worker');
+const { getImportJobQueue } = require('../import_jobs');
 const fsExtra = require('fs-extra');
 
 // Get knowledge base upload directory
@@ -80,6 +81,9 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
         return defaultPrompt;
     };
 
+    // 后台导入任务（DOCX/PDF转换由 scripts/import_jobs.py 执行）
+    const importJobs = getImportJobQueue(db);
+
     // 审计日志函数（从 knowledge_audit 路由注入）
     let logAudit = null;
     let generateBatchId = null;
@@ -385,11 +389,71 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
         }
     });
 
+    /**
+     * GET /api/v1/knowledge/import/jobs
+     * List the current user's recent import jobs with progress
+     */
+    router.get('/import/jobs', authenticate, (req, res) => {
+        try {
+            const { status, limit = 20 } = req.query;
+            const conditions = ['created_by = ?'];
+            const params = [req.user.id];
+            if (status) {
+                conditions.push('status = ?');
+                params.push(status);
+            }
+
+            const jobs = db.prepare(`
+                SELECT id, job_type, source_name, status, stage,
+                       pages_total, pages_done, images_encoded, articles_total, articles_written,
+                       error, created_at, started_at, finished_at, updated_at
+                FROM import_jobs
+                WHERE ${conditions.join(' AND ')}
+                ORDER BY id DESC
+                LIMIT ?
+            `).all(...params, Math.min(parseInt(limit) || 20, 100));
+
+            res.json({ success: true, data: jobs });
+        } catch (err) {
+            console.error('[Knowledge] Error listing import jobs:', err);
+            res.status(500).json({
+                success: false,
+                error: { code: 'SERVER_ERROR', message: err.message }
+            });
+        }
+    });
+
+    /**
+     * GET /api/v1/knowledge/import/jobs/:id
+     * Poll one import job's stage and progress counters
+     */
+    router.get('/import/jobs/:id', authenticate, (req, res) => {
+        try {
+            const job = importJobs.get(req.params.id);
+            if (!job || (job.created_by !== req.user.id && req.user.role !== 'Admin')) {
+                return res.status(404).json({
+                    success: false,
+                    error: { code: 'NOT_FOUND', message: '导入任务不存在' }
+                });
+            }
+
+            const { params, result, ...progress } = job;
+            res.json({ success: true, data: progress });
+        } catch (err) {
+            console.error('[Knowledge] Error fetching import job:', err);
+            res.status(500).json({
+                success: false,
+                error: { code: 'SERVER_ERROR', message: err.message }
+            });
+        }
+    });
+
     /**
      * POST /api/v1/knowledge/import/pdf
      * Import knowledge from PDF file
      */
     router.post('/import/pdf', authenticate, upload.single('pdf'), async (req, res) => {
+        let jobId = null;
         try {
             if (req.user.user_type !== 'Employee') {
                 return res.status(403).json({
@@ -427,7 +491,12 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
             }
 
             console.log('[Knowledge Import] Extracting images...');
-            const images = await extractPDFImages(req.file.path, imagesDir);
+            const extracted = await extractPDFImages(req.file.path, imagesDir, {
+                sourceName: req.file.originalname,
+                createdBy: req.user.id
+            });
+            const images = extracted.images;
+            jobId = extracted.jobId;
             console.log(`[Knowledge Import] Extracted ${images.length} images`);
 
             // Split content into sections (simple version - by page breaks or size)
@@ -471,6 +540,7 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
             let skipped_count = 0;
             let failed_count = 0;
             const article_ids = [];
+            importJobs.progress(jobId, { stage: '写入文章', articles_total: sections.length });
 
             for (const section of sections) {
                 try {
@@ -499,6 +569,7 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
 
                     article_ids.push(result.lastInsertRowid);
                     imported_count++;
+                    importJobs.progress(jobId, { articles_written: imported_count });
                 } catch (err) {
                     console.error(`[Knowledge Import] Failed to insert section: ${section.title}`, err);
                     failed_count++;
@@ -507,6 +578,7 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
 
             // Cleanup uploaded file
             fs.unlinkSync(req.file.path);
+            importJobs.finish(jobId);
 
             res.json({
                 success: true,
@@ -514,11 +586,13 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
                     imported_count,
                     skipped_count,
                     failed_count,
-                    article_ids
+                    article_ids,
+                    job_id: jobId
                 }
             });
         } catch (err) {
             console.error('[Knowledge Import] Error:', err);
+            if (jobId) importJobs.fail(jobId, err.message);
             // Cleanup uploaded file on error
             if (req.file && fs.existsSync(req.file.path)) {
                 fs.unlinkSync(req.file.path);
@@ -538,6 +612,7 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
      * 2. 分块上传后合并：form-data with 'mergedFilePath'
      */
     router.post('/import/docx', authenticate, docxUpload.single('docx'), async (req, res) => {
+        let jobId = null;
         try {
             if (req.user.role !== 'Admin' && req.user.role !== 'Lead' && req.user.role !== 'Editor') {
                 return res.status(403).json({
@@ -596,6 +671,7 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
             const timestamp = Date.now();
             const tempDir = `/tmp/docx_import_${timestamp}`;
             const htmlPath = path.join(tempDir, 'output.html');
+            const chaptersDir = path.join(tempDir, 'chapters');
             const imagesDir = '/Volumes/fileserver/Service/Knowledge/Images';
 
             // 创建临时目录
@@ -606,35 +682,25 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
 
             // 步骤1: 调用Python脚本转换DOCX→HTML
             console.log('[DOCX Import] Step 1: Converting DOCX to HTML...');
-            const convertScript = path.join(__dirname, '../../scripts/docx_to_html.py');
 
             let stats = { image_count: 0, table_count: 0, heading_count: 0 };
+            let manifestPath = null;
             try {
-                // 使用绝对路径python3，并设置环境变量
-                const convertOutput = execSync(
-                    `/usr/bin/python3 "${convertScript}" "${docxPath}" "${htmlPath}" "${imagesDir}"`,
-                    {
-                        encoding: 'utf-8',
-                        maxBuffer: 10 * 1024 * 1024,
-                        env: {
-                            ...process.env,
-                            PYTHONPATH: '/Users/admin/Library/Python/3.9/lib/python/site-packages',
-                            PATH: process.env.PATH + ':/usr/bin:/usr/local/bin'
-                        }
-                    }
-                );
-                console.log('[DOCX Import] Conversion output:', convertOutput);
-
-                // 解析转换统计数据
-                const imageMatch = convertOutput.match(/图片数[:|：]\s*(\d+)/);
-                const tableMatch = convertOutput.match(/表格数[:|：]\s*(\d+)/);
-                const headingMatch = convertOutput.match(/标题数[:|：]\s*(\d+)/);
+                // 后台任务执行 docx_to_html.py 的转换（不阻塞其他请求），转换时按章节拆分，直接返回统计数据
+                jobId = importJobs.enqueue('docx_to_html', {
+                    docx_path: docxPath,
+                    output_html_path: htmlPath,
+                    images_dir: imagesDir,
+                    options: { 'image-store': true, chapters: chaptersDir }
+                }, { sourceName: originalFilename, createdBy: req.user.id });
+                const result = await importJobs.waitFor(jobId);
 
                 stats = {
-                    image_count: imageMatch ? parseInt(imageMatch[1]) : 0,
-                    table_count: tableMatch ? parseInt(tableMatch[1]) : 0,
-                    heading_count: headingMatch ? parseInt(headingMatch[1]) : 0
+                    image_count: result.image_count,
+                    table_count: result.table_count,
+                    heading_count: result.heading_count
                 };
+                manifestPath = result.manifest;
 
                 console.log('[DOCX Import] Statistics:', stats);
 
@@ -643,20 +709,19 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
                 throw new Error(`DOCX转换失败: ${convertErr.message}`);
             }
 
-            // 步骤2: 读取HTML内容
-            if (!fs.existsSync(htmlPath)) {
-                throw new Error('HTML文件生成失败');
+            // 步骤2: 读取分章清单（转换时已按 h1~h3 分章，不再解析整篇HTML）
+            if (!manifestPath || !fs.existsSync(manifestPath)) {
+                throw new Error('分章结果生成失败');
             }
 
-            const htmlContent = fs.readFileSync(htmlPath, 'utf-8');
-            console.log(`[DOCX Import] Step 2: HTML generated (${htmlContent.length} chars)`);
+            const manifest = JSON.parse(fs.readFileSync(manifestPath, 'utf-8'));
+            console.log(`[DOCX Import] Step 2: ${manifest.chapter_count} chapters (${manifest.dropped} short sections dropped)`);
 
-            // 步骤3: 按章节分割
-            console.log('[DOCX Import] Step 3: Splitting into chapters...');
+            // 步骤3: 加上标题前缀
             const productModelsArray = product_models ? JSON.parse(product_models) : [];
             const userSelectedModel = productModelsArray.length > 0 ? productModelsArray[0] : null;
-            const chapters = splitHtmlIntoChapters(htmlContent, userSelectedModel, title_prefix);
-            console.log(`[DOCX Import] Found ${chapters.length} chapters`);
+            const chapters = loadManifestChapters(manifest, chaptersDir, userSelectedModel, title_prefix);
+            console.log(`[DOCX Import] Step 3: Found ${chapters.length} chapters`);
 
             // 检测文档标题与用户选择是否一致
             let titleMismatch = null;
@@ -708,9 +773,7 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
             let skipped_count = 0;
             let failed_count = 0;
             const article_ids = [];
-
-            let currentChapterNumber = 0;
-            let currentSectionNumber = 0;
+            importJobs.progress(jobId, { stage: '写入文章', articles_total: chapters.length });
 
             for (const chapter of chapters) {
                 try {
@@ -724,40 +787,16 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
                         continue;
                     }
 
+                    chapter.content = fs.readFileSync(chapter.fragmentPath, 'utf-8');
                     const summaryText = chapter.content
                         .replace(/<[^>]+>/g, '')
                         .replace(/\s+/g, ' ')
                         .trim()
                         .substring(0, 300);
 
-                    // 解析章节号（支持两种格式）
-                    let chapterMatch = chapter.title.match(/:\s*(\d+)(?:\.(\d+))?/);
-                    if (!chapterMatch) {
-                        // 尝试匹配不带前缀的格式
-                        const titleWithoutPrefix = chapter.title.includes(':') ? chapter.title.split(':').slice(1).join(':').trim() : chapter.title;
-                        chapterMatch = titleWithoutPrefix.match(/^(\d+)(?:\.(\d+))?(?:[.\s]+|$)/);
-                    }
-
-                    if (chapterMatch) {
-                        currentChapterNumber = parseInt(chapterMatch[1]);
-                        currentSectionNumber = chapterMatch[2] ? parseInt(chapterMatch[2]) : 0;
-                    } else {
-                        // 动态推演 Fallback
-                        if (chapter.level === 1) {
-                            currentChapterNumber += 1;
-                            currentSectionNumber = 0;
-                        } else if (chapter.level === 2) {
-                            if (currentChapterNumber === 0) currentChapterNumber = 1;
-                            currentSectionNumber += 1;
-                        } else if (chapter.level === 3) {
-                            if (currentChapterNumber === 0) currentChapterNumber = 1;
-                            if (currentSectionNumber === 0) currentSectionNumber = 1;
-                            // Level 3 就当做补充说明，不增加 sectionNumber 以免跳号
-                        }
-                    }
-
-                    const chapterNumberToSave = currentChapterNumber > 0 ? currentChapterNumber : null;
-                    const sectionNumberToSave = currentSectionNumber > 0 ? currentSectionNumber : null;
+                    // 章节号/小节号由 docx_to_html.py 分章时解析（标题开头的编号，没有编号时按级别顺延）
+                    const chapterNumberToSave = chapter.chapter_number;
+                    const sectionNumberToSave = chapter.section_number;
 
                     const result = insertStmt.run({
                         title: chapter.title,
@@ -783,6 +822,7 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
 
                     article_ids.push(result.lastInsertRowid);
                     imported_count++;
+                    importJobs.progress(jobId, { articles_written: imported_count });
                     console.log(`[DOCX Import] Imported: ${chapter.title} (ID: ${result.lastInsertRowid})`);
                 } catch (err) {
                     console.log(`[DOCX Import] Failed to insert: ${chapter.title}`, err);
@@ -801,6 +841,7 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
                 fs.rmSync(tempDir, { recursive: true, force: true });
             }
 
+            importJobs.finish(jobId);
             console.log(`[DOCX Import] Completed: ${imported_count} imported, ${skipped_count} skipped, ${failed_count} failed`);
 
             // 如果检测到标题不匹配,在响应中包含警告
@@ -814,7 +855,8 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
                     chapter_count: chapters.length,
                     image_count: stats.image_count,
                     table_count: stats.table_count,
-                    total_size: fileSize || 0
+                    total_size: fileSize || 0,
+                    job_id: jobId
                 }
             };
 
@@ -860,6 +902,7 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
             res.json(responseData);
         } catch (err) {
             console.error('[DOCX Import] Error:', err);
+            if (jobId) importJobs.fail(jobId, err.message);
             // 清理上传文件
             if (req.file && fs.existsSync(req.file.path)) {
                 fs.unlinkSync(req.file.path);
@@ -2010,27 +2053,22 @@ module.exports = function (db, authenticate, multerInstance, aiService) {
             }
 
             // Convert non-GIFs to WebP using Python script
+            let localName = filename;
             if (!isGif) {
                 const tempPngPath = filepath.replace('.webp', '.png');
                 fs.writeFileSync(tempPngPath, buffer);
 
                 try {
-                    execSync(`python3 -c "
-import sys
-from PIL import Image
-img = Image.open('${tempPngPath}')
-if img.mode in ('RGBA', 'LA', 'P'):
-    bg = Image.new('RGB', img.size, (255,255,255))
-    if img.mode == 'P': img = img.convert('RGBA')
-    if img.mode in ('RGBA', 'LA'): bg.paste(img, mask=img.split()[-1])
-    img = bg
-elif img.mode != 'RGB':
-    img = img.convert('RGB')
-img.save('${filepath}', 'WEBP', quality=85, method=6)
-"`, { encoding: 'utf8', timeout: 5000 });
+                    // Runs in the worker's image pool; the timeout does not wait behind DOCX/PDF conversions
+                    await getConversionWorker().call('convert_image', {
+                        input_path: tempPngPath,
+                        output_path: filepath
+                    }, 5000);
                     fs.unlinkSync(tempPngPath);
                 } catch (convertErr) {
-                    fs.renameSync(tempPngPath, filepath.replace('.webp', '.png'));
+                    // Keep the original bytes as the fallback (not renamed, so a late conversion cannot race it)
+                    console.log(`[Web Images] ⚠ WebP conversion failed, keeping original: ${convertErr.message}`);
+                    localName = path.basename(tempPngPath);
                 }
             } else {
                 // For GIFs, just write the original buffer
@@ -2039,7 +2077,7 @@ img.save('${filepath}', 'WEBP', quality=85, method=6)
 
             return {
                 original: src,
-                local: `/data/knowledge_images/${filename}`
+                local: `/data/knowledge_images/${localName}`
             };
         } catch (err) {
             console.log(`[Web Images] ⚠ Failed to download: ${src} - ${err.message}`);
@@ -2183,68 +2221,27 @@ img.save('${filepath}', 'WEBP', quality=85, method=6)
     }
 
     /**
-     * Split HTML content into chapters based on heading tags
-     * Used for DOCX imports that are now converted to HTML
+     * Load the chapters written by docx_to_html.py --chapters (see scripts/docx_chapters.py)
+     * Titles get the user's prefix; content is read from each chapter's fragment file when it is inserted
+     * Returns [{ title, level, fragmentPath, chapter_number, section_number, images }]
      */
-    function splitHtmlIntoChapters(html, userSelectedModel, customPrefix) {
-        const chapters = [];
+    function loadManifestChapters(manifest, chaptersDir, userSelectedModel, customPrefix) {
         const titlePrefix = customPrefix || userSelectedModel || null;
 
-        // 匹配 h1, h2, h3 标签作为章节分隔
-        const headingPattern = /<h([1-3])[^>]*>([^<]+)<\/h[1-3]>/gi;
-        const matches = [...html.matchAll(headingPattern)];
-
-        if (matches.length === 0) {
-            // 没有找到章节，将整个文档作为一章
-            if (html.trim().length > 50) {
-                chapters.push({
-                    title: titlePrefix ? `${titlePrefix}: Untitled Document` : 'Untitled Document',
-                    level: 1,
-                    content: html.trim()
-                });
-            }
-            return chapters;
-        }
-
-        // 分割内容
-        for (let i = 0; i < matches.length; i++) {
-            const match = matches[i];
-            const headingStart = match.index;
-            const headingEnd = headingStart + match[0].length;
-            const level = parseInt(match[1]);
-            let chapterTitle = match[2].trim();
-
-            // 清理章节标题中可能存在的产品型号前缀
-            const cleanedTitle = chapterTitle.replace(/^(MAVO\s+[^:]+|Eagle\s+[^:]+|Terra\s+[^:]+):\s*/i, '');
-            // 始终强制加上前缀以防止不同型号之间冲突
-            const fullTitle = titlePrefix ? `${titlePrefix}: ${cleanedTitle}` : cleanedTitle;
-
-            // 找到下一个章节的起始位置
-            const nextIndex = (i < matches.length - 1) ? matches[i + 1].index : html.length;
-            const content = html.substring(headingEnd, nextIndex).trim();
-
-            if (content.length > 50 || content.includes('<img') || level === 1) { // 放宽，有图片或h1则保留
-                chapters.push({
-                    title: fullTitle,
-                    level: level,
-                    content: content
-                });
-            } else if (level <= 3 && /^[\d\.]+/.test(cleanedTitle)) {
-                // Keep if it looks like a numbered section even if short, to be safe.
-                chapters.push({
-                    title: fullTitle,
-                    level: level,
-                    content: content
-                });
-            }
-        }
-
-        return chapters;
+        // 始终强制加上前缀以防止不同型号之间冲突（文档自带的型号前缀已在分章时去掉）
+        return manifest.chapters.map(chapter => ({
+            title: titlePrefix ? `${titlePrefix}: ${chapter.title}` : chapter.title,
+            level: chapter.level,
+            fragmentPath: path.join(chaptersDir, chapter.fragment),
+            chapter_number: chapter.chapter_number,
+            section_number: chapter.section_number,
+            images: chapter.images
+        }));
     }
 
     /**
      * Legacy function for Markdown chapter splitting
-     * @deprecated Use splitHtmlIntoChapters for new imports
+     * @deprecated DOCX imports use the chapter manifest from docx_to_html.py --chapters
      */
     function splitMarkdownIntoChapters(markdown, userSelectedModel, customPrefix) {
         const chapters = [];
@@ -2483,30 +2480,27 @@ img.save('${filepath}', 'WEBP', quality=85, method=6)
 
     /**
      * Extract images from PDF file using Python PyMuPDF
-     * Returns array of { filename, page, path }
+     * Runs as a background import job; returns { jobId, images: [{ filename, page, path }] }
      */
-    async function extractPDFImages(pdfPath, outputDir) {
+    async function extractPDFImages(pdfPath, outputDir, owner = {}) {
+        let jobId = null;
         try {
-            const scriptPath = path.join(__dirname, '../../scripts/extract_pdf_images.py');
-
-            // Call Python script
-            const result = execSync(
-                `python3 "${scriptPath}" "${pdfPath}" "${outputDir}"`,
-                { encoding: 'utf8', maxBuffer: 10 * 1024 * 1024 }
-            );
-
-            // Parse JSON output
-            const data = JSON.parse(result);
-
-            if (data.success && data.images) {
+            jobId = importJobs.enqueue('extract_pdf_images', {
+                pdf_path: pdfPath,
+                output_dir: outputDir,
+                options: { 'image-store': true }
+            }, owner);
+            const data = await importJobs.waitFor(jobId);
+
+            if (data.images) {
                 console.log(`[PDF Images] ✅ Extracted ${data.images.length} images`);
-                return data.images;
+                return { jobId, images: data.images };
             }
 
-            return [];
+            return { jobId, images: [] };
         } catch (err) {
             console.error('[PDF Images] Extraction error:', err.message);
-            return [];
+            return { jobId, images: [] };
         }
     }
 